@@ -1,36 +1,37 @@
 import importlib
 import sys
 import os
+import re
 import json
-import time
-import requests
 from PyQt5.QtGui import QIcon
 
-from osgeo import ogr  # for GeoJSON to WKT conversion
-
-from qgis.PyQt.QtWidgets import QAction
-from qgis.PyQt.QtCore import QVariant, QSettings
+from qgis.PyQt.QtWidgets import QAction, QMessageBox
+from qgis.PyQt.QtCore import QSettings, QCoreApplication
 from qgis.core import (
+    QgsMapLayerStyle,
     QgsProject,
     QgsVectorLayer,
-    QgsField,
-    QgsFeature,
-    QgsGeometry,
-    QgsWkbTypes,
     QgsApplication,
+    QgsTask,
 )
 
 from .settings_dialog import SettingsDialog
+from .http_client import close_clients
+from .metadata import close_metadata_cache
+from .live_sync import LiveSync, unsupported_reason
+from .cache_store import CacheStore
+from .engine import ImportJob, close_decode_pool, format_size, PREVIEW_ROWS
+from .detail_levels import build_detail_levels, copy_style, set_scale_ranges
+from .remote_provider import layer_uri, register_provider
+from .geometry import VALIDATE_BASIC
+from .filters import translate_expression
+from . import log
 
 
-def geojson_to_wkt(geojson_dict):
-    try:
-        geom = ogr.CreateGeometryFromJson(json.dumps(geojson_dict))
-        if geom is not None:
-            return geom.ExportToWkt()
-    except Exception as e:
-        print(f"Error converting GeoJSON to WKT: {e}")
-    return None
+def source_key(source):
+    # (file, options) of an OGR layer source, the same for every spelling of the path
+    path, _, options = source.partition("|")
+    return os.path.normcase(os.path.abspath(path)), options
 
 
 class DirectusImporter:
@@ -38,7 +39,7 @@ class DirectusImporter:
         self.debug_mode = True  # Set to False to hide Reload Plugin in production
         self.iface = iface
         self.plugin_dir = os.path.dirname(__file__)
-        self.cache_path = os.path.join(self.plugin_dir, ".directus_cache.json")
+        self.cache_path = os.path.join(QgsApplication.qgisSettingsDirPath(), "DirectusImporter", "cache.sqlite")
         self.cache_timeout_seconds = 3600  # 1 hour
 
         self.settings = QSettings()
@@ -47,8 +48,45 @@ class DirectusImporter:
         self.token = self.settings.value("DirectusImporter/token", "")
         self.geom_field = self.settings.value("DirectusImporter/geom_field", "geometry")
         self.selected_fields_json = self.settings.value("DirectusImporter/selected_fields", "[]")
+        # 0 means "auto": derived from the row count at import time
+        self.page_size = int(self.settings.value("DirectusImporter/page_size", 0))
+        self.max_workers = int(self.settings.value("DirectusImporter/max_workers", 0))
+        self.keyset_pagination = self.settings.value("DirectusImporter/keyset_pagination", True, type=bool)
+        self.field_schema_json = self.settings.value("DirectusImporter/field_schema", "{}")
+        self.cache_timeout_seconds = int(self.settings.value("DirectusImporter/cache_ttl", self.cache_timeout_seconds))
+        # Timestamp fields used to fetch only the rows changed since the last import
+        self.sync_fields = self.settings.value("DirectusImporter/sync_fields", "date_updated,date_created")
+        self.cache_size_mb = int(self.settings.value("DirectusImporter/cache_size_mb", 500))
+        self.debug_dump = self.settings.value("DirectusImporter/debug_dump", False, type=bool)
+        self.geometry_validation = self.settings.value("DirectusImporter/geometry_validation", VALIDATE_BASIC)
+        self.geometry_mode = self.settings.value("DirectusImporter/geometry_mode", "split")
+        self.log_level = self.settings.value("DirectusImporter/log_level", "info")
+        self.export_profile = self.settings.value("DirectusImporter/export_profile", False, type=bool)
+        # QGIS expression; the parts Directus understands are sent as a server-side filter
+        self.filter_expression = self.settings.value("DirectusImporter/filter_expression", "")
+        # "memory", or a file format written to output_folder and reused by later imports
+        self.output_format = self.settings.value("DirectusImporter/output_format", "memory")
+        self.output_folder = self.settings.value("DirectusImporter/output_folder", "")
+        # Saved imports: collection, geom_field, selected_fields, field_schema and filter_expression under a name
+        self.profiles_json = self.settings.value("DirectusImporter/profiles", "[]")
+        # Seconds between polls for changes to imported layers; 0 turns live sync off
+        self.live_sync_interval = int(self.settings.value("DirectusImporter/live_sync_interval", 0))
+        # Simplified copies of big line and polygon layers, drawn at overview scales
+        self.detail_levels = self.settings.value("DirectusImporter/detail_levels", False, type=bool)
+        # Rows imported by Preview import, and the estimated download size (MB) from which
+        # a full import asks for confirmation first; 0 never asks
+        self.preview_rows = int(self.settings.value("DirectusImporter/preview_rows", PREVIEW_ROWS))
+        self.confirm_size_mb = int(self.settings.value("DirectusImporter/confirm_size_mb", 100))
+        log.set_level(self.log_level)
+        self.cache_store = CacheStore(self.cache_path, self.cache_size_mb * 1024 * 1024)
+        self.tasks = []  # running ImportTasks, kept referenced until they finish
+        self.live_syncs = []  # LiveSyncs of imported layers still in the project
+        self.saved_styles = {}  # source_key -> (name, QgsMapLayerStyle) of layers on a replaced file
 
     def initGui(self):
+        # Registered up front so live layers saved in projects open too
+        register_provider()
+        QgsProject.instance().layersWillBeRemoved.connect(self.layers_removed)
         icon_path = os.path.join(self.plugin_dir, "icons")
 
         import_icon = QIcon(os.path.join(icon_path, "import.svg"))
@@ -63,10 +101,25 @@ class DirectusImporter:
 
         self.settings_action = QAction(settings_icon, "Settings", self.iface.mainWindow())
 
+        self.refresh_action = QAction(import_icon, "Import from Directus (ignore cache)", self.iface.mainWindow())
+        self.import_all_action = QAction(import_icon, "Import all saved imports", self.iface.mainWindow())
+        self.live_action = QAction(import_icon, "Add live Directus layer", self.iface.mainWindow())
+        self.preview_action = QAction(
+            import_icon, "Preview import (first rows and size estimate)", self.iface.mainWindow()
+        )
+
         self.import_action.triggered.connect(self.run)
+        self.refresh_action.triggered.connect(lambda: self.run(force_refresh=True))
+        self.import_all_action.triggered.connect(self.import_all)
+        self.live_action.triggered.connect(self.add_live_layer)
+        self.preview_action.triggered.connect(self.preview)
         self.settings_action.triggered.connect(self.open_settings)
 
         self.iface.addPluginToMenu("&DirectusImporter", self.import_action)
+        self.iface.addPluginToMenu("&DirectusImporter", self.refresh_action)
+        self.iface.addPluginToMenu("&DirectusImporter", self.preview_action)
+        self.iface.addPluginToMenu("&DirectusImporter", self.import_all_action)
+        self.iface.addPluginToMenu("&DirectusImporter", self.live_action)
         self.iface.addPluginToMenu("&DirectusImporter", self.settings_action)
 
         self.toolbar.addAction(self.import_action)
@@ -80,9 +133,22 @@ class DirectusImporter:
 
     def unload(self):
         self.iface.removePluginMenu("&DirectusImporter", self.import_action)
+        self.iface.removePluginMenu("&DirectusImporter", self.refresh_action)
+        self.iface.removePluginMenu("&DirectusImporter", self.preview_action)
+        self.iface.removePluginMenu("&DirectusImporter", self.import_all_action)
+        self.iface.removePluginMenu("&DirectusImporter", self.live_action)
         self.iface.removePluginMenu("&DirectusImporter", self.settings_action)
         if self.debug_mode:
             self.iface.removePluginMenu("&DirectusImporter", self.reload_action)
+        for task in self.tasks:
+            task.cancel()
+        QgsProject.instance().layersWillBeRemoved.disconnect(self.layers_removed)
+        for sync in self.live_syncs:
+            sync.stop()
+        self.live_syncs = []
+        close_metadata_cache()
+        close_decode_pool()
+        close_clients()
 
     def reload_plugin(self):
         try:
@@ -93,7 +159,7 @@ class DirectusImporter:
 
             plugin_name = "DirectusImporter"
 
-            print("🔁 Reloading plugin manually (QGIS 3.x method)...")
+            log.info("🔁 Reloading plugin manually (QGIS 3.x method)...")
 
             if plugin_name in plugins:
                 plugins[plugin_name].unload()
@@ -126,7 +192,27 @@ class DirectusImporter:
           self.collection,
           self.token,
           self.selected_fields_json,
-          self.geom_field
+          self.geom_field,
+          self.page_size,
+          self.max_workers,
+          self.keyset_pagination,
+          self.field_schema_json,
+          self.cache_timeout_seconds,
+          self.sync_fields,
+          self.cache_size_mb,
+          self.debug_dump,
+          self.geometry_validation,
+          self.geometry_mode,
+          self.log_level,
+          self.export_profile,
+          self.filter_expression,
+          self.output_format,
+          self.output_folder,
+          self.profiles_json,
+          self.live_sync_interval,
+          self.detail_levels,
+          self.preview_rows,
+          self.confirm_size_mb
       )
       if dlg.exec_():
           self.instance_url = dlg.url_input.text()
@@ -134,177 +220,364 @@ class DirectusImporter:
           self.token = dlg.token_input.text()
           self.geom_field = dlg.geom_field_dropdown.currentText()
           self.selected_fields_json = dlg.get_selected_fields_json()
+          self.page_size = dlg.page_size_input.value()
+          self.max_workers = dlg.max_workers_input.value()
+          self.keyset_pagination = dlg.keyset_checkbox.isChecked()
+          self.field_schema_json = dlg.get_field_schema_json()
+          self.cache_timeout_seconds = dlg.cache_ttl_input.value() * 60
+          self.sync_fields = dlg.sync_fields_input.text()
+          self.cache_size_mb = dlg.cache_size_input.value()
+          self.debug_dump = dlg.debug_dump_checkbox.isChecked()
+          self.geometry_validation = dlg.validation_dropdown.currentData()
+          self.geometry_mode = dlg.geometry_mode_dropdown.currentData()
+          self.log_level = dlg.log_level_dropdown.currentData()
+          self.export_profile = dlg.export_profile_checkbox.isChecked()
+          self.filter_expression = dlg.filter_input.text().strip()
+          self.output_format = dlg.output_format_dropdown.currentData()
+          self.output_folder = dlg.output_folder_input.text().strip()
+          self.profiles_json = dlg.get_profiles_json()
+          self.live_sync_interval = dlg.live_sync_input.value()
+          self.detail_levels = dlg.detail_levels_checkbox.isChecked()
+          self.preview_rows = dlg.preview_rows_input.value()
+          self.confirm_size_mb = dlg.confirm_size_input.value()
+          log.set_level(self.log_level)
+          self.cache_store.max_bytes = self.cache_size_mb * 1024 * 1024
 
           self.settings.setValue("DirectusImporter/instance_url", self.instance_url)
           self.settings.setValue("DirectusImporter/collection", self.collection)
           self.settings.setValue("DirectusImporter/token", self.token)
           self.settings.setValue("DirectusImporter/geom_field", self.geom_field)
           self.settings.setValue("DirectusImporter/selected_fields", self.selected_fields_json)
+          self.settings.setValue("DirectusImporter/page_size", self.page_size)
+          self.settings.setValue("DirectusImporter/max_workers", self.max_workers)
+          self.settings.setValue("DirectusImporter/keyset_pagination", self.keyset_pagination)
+          self.settings.setValue("DirectusImporter/field_schema", self.field_schema_json)
+          self.settings.setValue("DirectusImporter/cache_ttl", self.cache_timeout_seconds)
+          self.settings.setValue("DirectusImporter/sync_fields", self.sync_fields)
+          self.settings.setValue("DirectusImporter/cache_size_mb", self.cache_size_mb)
+          self.settings.setValue("DirectusImporter/debug_dump", self.debug_dump)
+          self.settings.setValue("DirectusImporter/geometry_validation", self.geometry_validation)
+          self.settings.setValue("DirectusImporter/geometry_mode", self.geometry_mode)
+          self.settings.setValue("DirectusImporter/log_level", self.log_level)
+          self.settings.setValue("DirectusImporter/export_profile", self.export_profile)
+          self.settings.setValue("DirectusImporter/filter_expression", self.filter_expression)
+          self.settings.setValue("DirectusImporter/output_format", self.output_format)
+          self.settings.setValue("DirectusImporter/output_folder", self.output_folder)
+          self.settings.setValue("DirectusImporter/profiles", self.profiles_json)
+          self.settings.setValue("DirectusImporter/live_sync_interval", self.live_sync_interval)
+          self.settings.setValue("DirectusImporter/detail_levels", self.detail_levels)
+          self.settings.setValue("DirectusImporter/preview_rows", self.preview_rows)
+          self.settings.setValue("DirectusImporter/confirm_size_mb", self.confirm_size_mb)
+
+    def run(self, force_refresh=False):
+        if not self.check_settings():
+            return
+        # Network paging, decoding and layer building run on the task manager;
+        # the layers are added to the project in import_finished, on the main thread
+        self.confirm_and_start(self.create_job(), force_refresh)
+
+    def confirm_and_start(self, job, force_refresh=False):
+        if self.confirm_size_mb:
+            # Downloads above the size limit are confirmed first, see estimate_finished
+            task = EstimateTask(self, job, force_refresh)
+            self.tasks.append(task)
+            QgsApplication.taskManager().addTask(task)
+        else:
+            self.start_task(job, force_refresh)
+
+    def preview(self):
+        if self.check_settings():
+            self.start_task(self.create_job(preview=True))
+
+    def check_settings(self):
+        if not self.instance_url or not self.collection:
+            self.iface.messageBar().pushWarning(
+                "Directus Importer", "Missing API URL or collection."
+            )
+            return False
+        try:
+            translate_expression(self.filter_expression)
+        except ValueError as e:
+            self.iface.messageBar().pushWarning("Directus Importer", f"Invalid filter expression: {e}")
+            return False
+        return True
+
+    def import_all(self, force_refresh=False):
+        profiles = json.loads(self.profiles_json or "[]")
+        if not self.instance_url or not profiles:
+            self.iface.messageBar().pushWarning(
+                "Directus Importer", "No saved imports: save some in the settings first."
+            )
+            return
+        # The tasks run side by side and share one connection pool; each one adds
+        # its layers as soon as it is done. Large downloads are confirmed one by one.
+        for profile in profiles:
+            self.confirm_and_start(self.create_job(profile), force_refresh)
+
+    def start_task(self, job, force_refresh=False):
+        if job.replaces_output(force_refresh):
+            self.unload_outputs(job)
+        task = ImportTask(self, job, force_refresh)
+        self.tasks.append(task)
+        QgsApplication.taskManager().addTask(task)
+
+    def unload_outputs(self, job):
+        # Layers on a file that the import replaces are removed before it starts: replacing a
+        # file QGIS holds open fails on Windows and can leave its -wal/-shm files behind. Their
+        # names and styles go to the layers the import adds on the new file, see add_layer.
+        files = job.output_files()
+        if not files:
+            return
+        project = QgsProject.instance()
+        root = project.layerTreeRoot()
+        layers = [
+            layer for layer in project.mapLayers().values()
+            if layer.providerType() == "ogr" and source_key(layer.source())[0] in files
+        ]
+        for layer in layers:
+            style = QgsMapLayerStyle()
+            style.readFromLayer(layer)
+            self.saved_styles[source_key(layer.source())] = (layer.name(), style)
+        groups = [node.parent() for node in (root.findLayer(layer.id()) for layer in layers) if node]
+        project.removeMapLayers([layer.id() for layer in layers])
+        for group in groups:
+            # The group of a layer with simplified copies, see add_layer
+            if group is not root and group.parent() and not group.children():
+                group.parent().removeChildNode(group)
+
+    def project_layer(self, source):
+        key = source_key(source)
+        return next(
+            (layer for layer in QgsProject.instance().mapLayers().values()
+             if layer.providerType() == "ogr" and source_key(layer.source()) == key),
+            None
+        )
 
-    def fetch_data(self, force_refresh=False):
-      if not self.instance_url or not self.collection:
-          self.iface.messageBar().pushWarning(
-              "Directus Importer", "Missing API URL or collection."
-          )
-          return None
-
-      selected_fields = json.loads(self.selected_fields_json)
-      fields_query = f"&fields={','.join(selected_fields)}" if selected_fields else ""
-      headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
-
-      all_data = []
-      limit = 100  # items per page
-      offset = 0
-
-      try:
-          while True:
-              url = f"{self.instance_url.rstrip('/')}/items/{self.collection}?limit={limit}&offset={offset}{fields_query}"
-              response = requests.get(url, headers=headers)
-              response.raise_for_status()
-              data = response.json()
-
-              page_data = data.get("data", [])
-              all_data.extend(page_data)
-
-              total = data.get("meta", {}).get("pagination", {}).get("total", None)
-              count = len(all_data)
-
-              if total is not None and count >= total:
-                  break
-              if not page_data:
-                  break
-
-              offset += limit
-
-          # Cache the full dataset
-          with open(os.path.join(self.plugin_dir, "api_debug_dump.json"), "w", encoding="utf-8") as f:
-              json.dump({"data": all_data}, f, indent=2)
-          with open(self.cache_path, "w", encoding="utf-8") as f:
-              json.dump({"data": all_data}, f)
-
-          return {"data": all_data}
-
-      except Exception as e:
-          self.iface.messageBar().pushWarning(
-              "Directus Importer", f"Failed to fetch data: {e}"
-          )
-          return None
-
-    def get_qgis_geom_type(self, features_data, geom_field):
-        for item in features_data:
-            wkt = None
-            raw_geom = item.get(geom_field, "")
-            try:
-                if isinstance(raw_geom, dict) and "type" in raw_geom and "coordinates" in raw_geom:
-                    wkt = geojson_to_wkt(raw_geom)
-                elif isinstance(raw_geom, list) and len(raw_geom) == 2:
-                    lon = float(raw_geom[0])
-                    lat = float(raw_geom[1])
-                    wkt = f"POINT({lon} {lat})"
-                elif isinstance(raw_geom, str):
-                    wkt = raw_geom
-            except Exception:
-                continue
-            if wkt:
-                try:
-                    geom = QgsGeometry.fromWkt(wkt)
-                    if geom and geom.isGeosValid():
-                        wkb_type = geom.wkbType()
-                        qgis_geom_type = QgsWkbTypes.displayString(wkb_type)
-                        valid_types = {
-                            "Point",
-                            "MultiPoint",
-                            "LineString",
-                            "MultiLineString",
-                            "Polygon",
-                            "MultiPolygon",
-                        }
-                        if qgis_geom_type in valid_types:
-                            return qgis_geom_type
-                except Exception:
-                    continue
-        return "None"
+    def create_job(self, profile=None, preview=False):
+        # Snapshot of the current settings, so editing them does not affect a running import.
+        # A saved import replaces the collection, fields, geometry field and filter.
+        folder = os.path.dirname(self.cache_path)
+        profile = profile or {
+            "collection": self.collection,
+            "geom_field": self.geom_field,
+            "selected_fields": json.loads(self.selected_fields_json),
+            "field_schema": json.loads(self.field_schema_json or "{}"),
+            "filter_expression": self.filter_expression,
+        }
+        # Saved imports of the same collection must not share an output file
+        output_name = re.sub(r"[^\w.-]+", "_", profile["name"]) if "name" in profile else None
+        return ImportJob(
+            self.instance_url,
+            profile["collection"],
+            self.cache_store,
+            token=self.token,
+            geom_field=profile["geom_field"],
+            selected_fields=profile["selected_fields"],
+            field_schema=profile["field_schema"],
+            page_size=self.page_size,
+            max_workers=self.max_workers,
+            keyset_pagination=self.keyset_pagination,
+            cache_timeout_seconds=self.cache_timeout_seconds,
+            sync_fields=self.sync_fields,
+            geometry_validation=self.geometry_validation,
+            geometry_mode=self.geometry_mode,
+            filter_expression=profile.get("filter_expression", ""),
+            output_format=self.output_format,
+            output_folder=self.output_folder or os.path.join(folder, "layers"),
+            output_name=output_name,
+            debug_dump_path=os.path.join(self.plugin_dir, "api_debug_dump.json") if self.debug_dump else None,
+            profile_folder=os.path.join(folder, "import_profiles") if self.export_profile else None,
+            keep_primary_key=self.live_sync_interval > 0 and not preview,
+            preview_rows=self.preview_rows if preview else 0,
+        )
 
-    def run(self):
-        data = self.fetch_data()
-        if data is None:
+    def add_live_layer(self):
+        # Features are read on demand for the visible extent instead of imported up front
+        if not self.instance_url or not self.collection:
+            self.iface.messageBar().pushWarning(
+                "Directus Importer", "Missing API URL or collection."
+            )
             return
-
-        features_data = data.get("data", [])
-        if not features_data:
+        if not register_provider():
+            self.iface.messageBar().pushWarning("Directus Importer", "Could not register the Directus data provider.")
+            return
+        selected_fields = json.loads(self.selected_fields_json)
+        uri = layer_uri(self.instance_url, self.collection, self.geom_field, selected_fields, self.filter_expression)
+        layer = QgsVectorLayer(uri, f"Directus: {self.collection} (live)", "directus")
+        if not layer.isValid():
             self.iface.messageBar().pushWarning(
-                "Directus Importer", "No data found in collection."
+                "Directus Importer", f"Could not open a live layer for {self.collection}, see the log for details."
             )
             return
+        QgsProject.instance().addMapLayer(layer)
+
+    def import_finished(self, task, result):
+        if task in self.tasks:
+            self.tasks.remove(task)
+
+        # Several imports can finish in any order, so every message names its collection
+        title = f"Directus Importer: {task.job.collection}"
+        if not result:
+            if task.error is not None:
+                self.iface.messageBar().pushWarning(
+                    title, f"Failed to fetch data: {task.error}"
+                )
+            elif task.isCanceled():
+                self.iface.messageBar().pushMessage(
+                    title, "Import canceled.", level=0, duration=4
+                )
+            return
 
-        use_geometry = self.geom_field and self.geom_field in features_data[0]
-        crs = "EPSG:4326"
-        selected_fields = json.loads(self.selected_fields_json)
+        layers = task.layers
+        if layers is None:
+            self.iface.messageBar().pushWarning(
+                title, "No data found in collection."
+            )
+            return
 
-        geom_type = "None"
-        if use_geometry:
-            geom_type = self.get_qgis_geom_type(features_data, self.geom_field)
-
-        layer_def = f"{geom_type}?crs={crs}"
-        layer = QgsVectorLayer(layer_def, f"Directus: {self.collection}", "memory")
-        provider = layer.dataProvider()
-
-        # Add only selected attribute fields excluding geometry field
-        for field_name in selected_fields:
-            if not use_geometry or field_name != self.geom_field:
-                provider.addAttributes([QgsField(field_name, QVariant.String)])
-        layer.updateFields()
-
-        print("✅ Checking geometry values...")
-        print("Feature keys:", features_data[0].keys())
-
-        features = []
-        for i, item in enumerate(features_data):
-            print(f"▶ Feature #{i+1}")
-            feat = QgsFeature()
-            attr_values = []
-            for f in provider.fields():
-                val = item.get(f.name(), "")
-                attr_values.append(str(val) if val is not None else "")
-            feat.setAttributes(attr_values)
-
-            if use_geometry:
-                raw_geom = item.get(self.geom_field, "")
-                print(f"→ Raw geometry value: {raw_geom}")
-
-                if raw_geom is None:
-                    print("⚠️ Missing coordinates for feature; skipping.")
-                    continue
-
-                geom = None
-                try:
-                    if isinstance(raw_geom, dict) and "type" in raw_geom and "coordinates" in raw_geom:
-                        wkt = geojson_to_wkt(raw_geom)
-                        if wkt:
-                            geom = QgsGeometry.fromWkt(wkt)
-                    elif isinstance(raw_geom, list) and len(raw_geom) == 2:
-                        lon = float(raw_geom[0])
-                        lat = float(raw_geom[1])
-                        wkt = f"POINT({lon} {lat})"
-                        geom = QgsGeometry.fromWkt(wkt)
-                    elif isinstance(raw_geom, str):
-                        geom = QgsGeometry.fromWkt(raw_geom)
-                    else:
-                        print("Unsupported geometry format:", type(raw_geom))
-                except Exception as e:
-                    print(f"Geometry parse error: {e}")
-
-                if geom and geom.isGeosValid():
-                    print(f"Parsed geometry: {geom.asWkt()}")
-                    feat.setGeometry(geom)
-                else:
-                    print(f"Invalid geometry skipped: {raw_geom}")
-
-            features.append(feat)
-
-        provider.addFeatures(features)
-        layer.updateExtents()
+        new_layers = [entry[0] for entry in layers.layers.values()]
+        message = f"Imported {layers.imported} features."
+        if task.job.preview_rows:
+            message = f"Preview of {layers.imported} features. Full import: {task.job.estimate.summary()}."
+        elif layers.reopened:
+            message = "Opened the layers of the previous import, still within the cache lifetime."
+        elif len(new_layers) > 1:
+            message = f"Imported {layers.imported} features into {len(new_layers)} layers."
+        if layers.dropped:
+            message += f" {layers.dropped} geometries of another type were dropped."
+        for key, (layer, _, wkb_type) in list(layers.layers.items()):
+            layer = self.add_layer(layer, layers.detail_levels.get(key))
+            layers.layers[key] = (layer, layer.dataProvider(), wkb_type)
+        if layers.detail_levels:
+            message += " Simplified copies are drawn at overview scales."
+        if self.live_sync_interval and not task.job.preview_rows:
+            message += self.start_live_sync(task.job, layers)
         self.iface.messageBar().pushMessage(
-            "Directus Importer", f"Imported {len(features)} features.", level=0, duration=4
+            title, message, level=0, duration=4
         )
-        QgsProject.instance().addMapLayer(layer)
\ No newline at end of file
+
+    def estimate_finished(self, task, result):
+        if task in self.tasks:
+            self.tasks.remove(task)
+        if task.isCanceled():
+            return
+        if not result:
+            # The import itself reports connection problems
+            log.warning(f"{task.job.collection}: could not estimate the download size: {task.error}")
+        elif task.estimate is not None and task.estimate.bytes > self.confirm_size_mb * 1024 * 1024:
+            answer = QMessageBox.question(
+                self.iface.mainWindow(),
+                "Directus Importer",
+                f"{task.job.collection}: {task.estimate.summary()}, more than "
+                f"{format_size(self.confirm_size_mb * 1024 * 1024)}.\n\n"
+                "Import anyway? Preview import shows the first rows only.",
+            )
+            if answer != QMessageBox.Yes:
+                return
+        self.start_task(task.job, task.force_refresh)
+
+    def add_layer(self, layer, levels=None):
+        # Returns the layer that is in the project afterwards
+        existing = self.project_layer(layer.source()) if layer.providerType() == "ogr" else None
+        if existing is not None:
+            # A file reopened or updated in place: the layer the user set up (style, labels,
+            # forms) stays and reads the new rows
+            for map_layer in [existing] + [self.project_layer(copy.source()) for copy, _ in levels or []]:
+                if map_layer is not None:
+                    map_layer.reload()
+                    map_layer.updateExtents()
+                    map_layer.triggerRepaint()
+            return existing
+        saved = self.saved_styles.pop(source_key(layer.source()), None)
+        if saved is not None:
+            name, style = saved
+            style.writeToLayer(layer)
+            layer.setName(name)
+        for copy, _ in levels or []:
+            self.saved_styles.pop(source_key(copy.source()), None)  # copies follow the full layer
+        if not levels:
+            QgsProject.instance().addMapLayer(layer)
+            return layer
+        # The full resolution layer and its simplified copies share a group, each
+        # drawn in its own scale range
+        set_scale_ranges(layer, levels)
+        copy_style(layer, levels)
+        layer.rendererChanged.connect(lambda: copy_style(layer, levels))
+        group = QgsProject.instance().layerTreeRoot().insertGroup(0, layer.name())
+        for map_layer in [layer] + [copy for copy, _ in levels]:
+            QgsProject.instance().addMapLayer(map_layer, False)
+            group.addLayer(map_layer)
+        return layer
+
+    def start_live_sync(self, job, layers):
+        # Returns a note for the import message
+        reason = unsupported_reason(job, layers)
+        if reason:
+            log.info(f"{job.collection}: no live sync, {reason}")
+            return f" No live sync: {reason}."
+        sync = LiveSync(job, layers, self.live_sync_interval)
+        self.live_syncs.append(sync)
+        sync.start()
+        return f" Kept in sync every {self.live_sync_interval}s."
+
+    def layers_removed(self, layer_ids):
+        self.live_syncs = [sync for sync in self.live_syncs if sync.remove_layers(layer_ids)]
+
+
+class EstimateTask(QgsTask):
+    """Estimates the download of an import before it starts; imports served
+    from the cache or by a delta sync are not estimated."""
+
+    def __init__(self, importer, job, force_refresh=False):
+        super().__init__(f"Directus import size: {job.collection}", QgsTask.CanCancel)
+        self.importer = importer
+        self.job = job
+        self.force_refresh = force_refresh
+        self.estimate = None
+        self.error = None
+
+    def run(self):
+        try:
+            if self.job.needs_full_download(self.force_refresh):
+                self.estimate, _ = self.job.estimate_size()
+        except Exception as e:
+            self.error = e
+            return False
+        return not self.isCanceled()
+
+    def finished(self, result):
+        self.importer.estimate_finished(self, result)
+
+
+class ImportTask(QgsTask):
+    def __init__(self, importer, job, force_refresh=False):
+        super().__init__(f"Directus import: {job.collection}", QgsTask.CanCancel)
+        self.importer = importer
+        self.job = job
+        self.force_refresh = force_refresh
+        self.detail_levels = importer.detail_levels
+        self.layers = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.layers = self.job.build_layers(self.force_refresh, self)
+            if self.layers is not None and self.detail_levels:
+                build_detail_levels(self.layers, self)
+        except Exception as e:
+            self.error = e
+            return False
+        if self.isCanceled():
+            return False
+        if self.layers is not None:
+            # Layers built here belong to this worker thread until handed over
+            main_thread = QCoreApplication.instance().thread()
+            for layer, _, _ in self.layers.layers.values():
+                layer.moveToThread(main_thread)
+            for levels in self.layers.detail_levels.values():
+                for copy, _ in levels:
+                    copy.moveToThread(main_thread)
+        return True
+
+    def finished(self, result):
+        self.importer.import_finished(self, result)
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+
+from .columns import ColumnPage
+
+
+SCHEMA_VERSION = 3
+PARTIAL_MAX_AGE = 24 * 3600  # seconds after which an unfinished download is assumed abandoned
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    instance_url TEXT,
+    collection TEXT,
+    fields TEXT,
+    columns TEXT,
+    filter TEXT,
+    fetched_at REAL,
+    synced_to TEXT,
+    accessed_at REAL,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS rows (
+    entry_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    pk TEXT,
+    data BLOB,
+    PRIMARY KEY (entry_id, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rows_pk ON rows (entry_id, pk);
+"""
+
+
+def cache_key(instance_url, collection, fields, filter_query=""):
+    # Field order does not change the result, so it must not change the key either
+    parts = [instance_url.rstrip("/"), collection, ",".join(sorted(fields)), filter_query or ""]
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def encode_row(values):
+    return json.dumps(values, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def row_pks(page, primary_key):
+    # Primary keys of the rows of a ColumnPage, as text
+    if not primary_key:
+        return [None] * len(page)
+    return [None if value is None else str(value) for value in page.column(primary_key)]
+
+
+class CacheStore:
+    """SQLite store with one entry per (instance, collection, fields, filter) query.
+
+    Rows are kept as compact JSON arrays of values, in the order of the
+    entry's columns, written and read page by page (as ColumnPages) so a
+    cached import never has to fit in memory at once. When the file grows
+    past max_bytes the least recently used entries are evicted.
+    """
+
+    def __init__(self, path, max_bytes=500 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self.connect()) as conn:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                # Cached data is disposable: an older layout is simply dropped
+                conn.executescript("DROP TABLE IF EXISTS rows; DROP TABLE IF EXISTS entries;")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.executescript(SCHEMA)
+            self.purge_partials(conn)
+
+    def connect(self):
+        # One short-lived connection per call keeps the store usable from worker threads
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def entry(self, key):
+        with closing(self.connect()) as conn:
+            entry = conn.execute(
+                "SELECT id, fetched_at, synced_to FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if entry is None:
+                return None
+            count = conn.execute("SELECT COUNT(*) FROM rows WHERE entry_id = ?", (entry[0],)).fetchone()[0]
+        return {"fetched_at": entry[1], "synced_to": entry[2], "count": count}
+
+    def iter_rows(self, key, batch_size=1000):
+        with closing(self.connect()) as conn:
+            entry = conn.execute("SELECT id, columns FROM entries WHERE key = ?", (key,)).fetchone()
+            if entry is None:
+                return
+            names = json.loads(entry[1] or "[]")
+            with conn:
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE id = ?", (time.time(), entry[0]))
+            cursor = conn.execute("SELECT data FROM rows WHERE entry_id = ? ORDER BY seq", (entry[0],))
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield ColumnPage.from_arrays(names, [json.loads(data) for (data,) in batch])
+
+    def writer(self, key, instance_url, collection, fields, filter_query="", primary_key=None):
+        return CacheWriter(self, key, instance_url, collection, fields, filter_query, primary_key)
+
+    def upsert(self, key, page, primary_key):
+        with closing(self.connect()) as conn:
+            with conn:
+                entry_id, columns = conn.execute("SELECT id, columns FROM entries WHERE key = ?", (key,)).fetchone()
+                # Columns are only ever appended, so the arrays of older rows stay valid
+                names = json.loads(columns or "[]")
+                names += [name for name in page.names if name not in names]
+                conn.execute("UPDATE entries SET columns = ? WHERE id = ?", (json.dumps(names), entry_id))
+                seq = conn.execute(
+                    "SELECT COALESCE(MAX(seq), -1) FROM rows WHERE entry_id = ?", (entry_id,)
+                ).fetchone()[0]
+                for pk, values in zip(row_pks(page, primary_key), page.arrays(names)):
+                    blob = encode_row(values)
+                    updated = conn.execute(
+                        "UPDATE rows SET data = ? WHERE entry_id = ? AND pk = ?", (blob, entry_id, pk)
+                    ).rowcount
+                    if not updated:
+                        seq += 1
+                        conn.execute(
+                            "INSERT INTO rows (entry_id, seq, pk, data) VALUES (?, ?, ?, ?)",
+                            (entry_id, seq, pk, blob),
+                        )
+                self.update_size(conn, entry_id)
+
+    def delete_missing(self, key, keep_pks):
+        keep_pks = {str(pk) for pk in keep_pks}
+        with closing(self.connect()) as conn:
+            with conn:
+                entry_id = conn.execute("SELECT id FROM entries WHERE key = ?", (key,)).fetchone()[0]
+                stale = [
+                    (entry_id, pk)
+                    for (pk,) in conn.execute("SELECT pk FROM rows WHERE entry_id = ?", (entry_id,))
+                    if pk not in keep_pks
+                ]
+                conn.executemany("DELETE FROM rows WHERE entry_id = ? AND pk = ?", stale)
+                self.update_size(conn, entry_id)
+        return len(stale)
+
+    def touch(self, key, synced_to):
+        now = time.time()
+        with closing(self.connect()) as conn:
+            with conn:
+                conn.execute(
+                    "UPDATE entries SET fetched_at = ?, accessed_at = ?, synced_to = ? WHERE key = ?",
+                    (now, now, synced_to, key),
+                )
+
+    def update_size(self, conn, entry_id):
+        conn.execute(
+            "UPDATE entries SET size = (SELECT COALESCE(SUM(LENGTH(data)), 0) FROM rows WHERE entry_id = ?) WHERE id = ?",
+            (entry_id, entry_id),
+        )
+
+    def purge_partials(self, conn):
+        # Downloads left unfinished by a crashed import; running ones are younger than the cutoff
+        stale = conn.execute(
+            "SELECT id FROM entries WHERE key LIKE 'partial:%' AND COALESCE(accessed_at, 0) < ?",
+            (time.time() - PARTIAL_MAX_AGE,),
+        ).fetchall()
+        if stale:
+            with conn:
+                conn.executemany("DELETE FROM rows WHERE entry_id = ?", stale)
+                conn.executemany("DELETE FROM entries WHERE id = ?", stale)
+
+    def evict(self, conn, keep=None):
+        # Downloads still being written by other imports are never evicted
+        entries = conn.execute(
+            "SELECT id, key, size FROM entries WHERE key NOT LIKE 'partial:%' ORDER BY accessed_at DESC"
+        ).fetchall()
+        total = 0
+        stale = []
+        for entry_id, key, size in entries:
+            total += size or 0
+            if total > self.max_bytes and key != keep:
+                stale.append((entry_id,))
+        if stale:
+            with conn:
+                conn.executemany("DELETE FROM rows WHERE entry_id = ?", stale)
+                conn.executemany("DELETE FROM entries WHERE id = ?", stale)
+            conn.execute("VACUUM")
+
+    def clear(self):
+        with closing(self.connect()) as conn:
+            with conn:
+                conn.execute("DELETE FROM rows")
+                conn.execute("DELETE FROM entries")
+            conn.execute("VACUUM")
+
+
+class CacheWriter:
+    """Writes a full download page by page; the previous entry for the key is
+    only replaced when finish() is called, so an aborted import leaves it intact."""
+
+    def __init__(self, store, key, instance_url, collection, fields, filter_query, primary_key):
+        self.store = store
+        self.key = key
+        self.primary_key = primary_key
+        self.seq = 0
+        self.size = 0
+        self.columns = []  # names of the values in the row arrays, grown as pages add fields
+        self.conn = store.connect()
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO entries (key, instance_url, collection, fields, filter, accessed_at, size)"
+                " VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (
+                    f"partial:{uuid.uuid4().hex}", instance_url, collection, json.dumps(fields), filter_query or "",
+                    time.time(),
+                ),
+            )
+        self.entry_id = cursor.lastrowid
+
+    def write(self, page):
+        self.columns += [name for name in page.names if name not in self.columns]
+        values = []
+        for pk, row in zip(row_pks(page, self.primary_key), page.arrays(self.columns)):
+            blob = encode_row(row)
+            self.size += len(blob)
+            values.append((self.entry_id, self.seq, pk, blob))
+            self.seq += 1
+        with self.conn:
+            self.conn.executemany("INSERT INTO rows (entry_id, seq, pk, data) VALUES (?, ?, ?, ?)", values)
+
+    def finish(self, synced_to):
+        now = time.time()
+        with self.conn:
+            old = self.conn.execute("SELECT id FROM entries WHERE key = ?", (self.key,)).fetchone()
+            if old:
+                self.conn.execute("DELETE FROM rows WHERE entry_id = ?", old)
+                self.conn.execute("DELETE FROM entries WHERE id = ?", old)
+            self.conn.execute(
+                "UPDATE entries SET key = ?, columns = ?, fetched_at = ?, synced_to = ?, accessed_at = ?, size = ?"
+                " WHERE id = ?",
+                (self.key, json.dumps(self.columns), now, synced_to, now, self.size, self.entry_id),
+            )
+        self.store.evict(self.conn, keep=self.key)
+        self.conn.close()
+
+    def abort(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM rows WHERE entry_id = ?", (self.entry_id,))
+            self.conn.execute("DELETE FROM entries WHERE id = ?", (self.entry_id,))
+        self.conn.close()
@@ -0,0 +1,138 @@
+import argparse
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from qgis.core import QgsApplication
+
+from .cache_store import CacheStore
+from .engine import ImportJob, add_related_fields, close_decode_pool, field_schema_from
+from .file_output import FORMATS
+from .geometry import VALIDATE_BASIC, VALIDATE_GEOS, VALIDATE_NONE
+from .http_client import close_clients, get_client
+from . import log
+
+# Headless batch export, sharing the plugin's import engine:
+#   python -m DirectusImporter.cli --url https://example.org --collection sites --out sites.gpkg
+# Several --collection options are exported in parallel; --out is then a folder.
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "DirectusImporter", "cache.sqlite")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m DirectusImporter.cli", description="Export Directus collections to GeoPackage or FlatGeobuf files"
+    )
+    parser.add_argument("--url", required=True, help="Directus instance URL")
+    parser.add_argument("--collection", required=True, action="append", help="collection to export (repeatable)")
+    parser.add_argument("--out", required=True, help="output file, or folder when exporting several collections")
+    parser.add_argument("--token", default=os.environ.get("DIRECTUS_TOKEN", ""),
+                        help="access token (default: $DIRECTUS_TOKEN)")
+    parser.add_argument("--format", choices=sorted(FORMATS), help="output format (default: from --out, else gpkg)")
+    parser.add_argument("--geometry-field", default="geometry")
+    parser.add_argument("--fields", default="",
+                        help="comma separated fields to export, related ones as field.related_field (default: all)")
+    parser.add_argument("--filter", default="", help="QGIS expression selecting the rows to export")
+    parser.add_argument("--geometry-mode", choices=["split", "promote", "single"], default="split")
+    parser.add_argument("--validation", choices=[VALIDATE_NONE, VALIDATE_BASIC, VALIDATE_GEOS], default=VALIDATE_BASIC)
+    parser.add_argument("--page-size", type=int, default=0, help="rows per request (default: auto)")
+    parser.add_argument("--max-workers", type=int, default=0, help="parallel requests per collection (default: auto)")
+    parser.add_argument("--jobs", type=int, default=4, help="collections exported at once")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help=f"SQLite cache file (default: {DEFAULT_CACHE})")
+    parser.add_argument("--cache-size-mb", type=int, default=500)
+    parser.add_argument("--max-age", type=int, default=0,
+                        help="seconds during which an existing output is reused without asking the server")
+    parser.add_argument("--refresh", action="store_true", help="ignore the cache and earlier outputs")
+    parser.add_argument("--log-level", choices=sorted(log.LEVELS), default="info")
+    args = parser.parse_args(argv)
+    # sites.gpkg --format fgb would otherwise write sites.gpkg.fgb
+    formats = {ext: key for key, (_, ext) in FORMATS.items()}
+    out_format = formats.get(os.path.splitext(args.out)[1].lower())
+    if args.format and out_format and out_format != args.format and len(args.collection) == 1:
+        parser.error(f"--out {args.out} names a {out_format} file, which does not match --format {args.format}")
+    return args
+
+
+def output_target(out, collection, output_format, several):
+    # (folder, file name without extension) for one collection
+    if several or os.path.isdir(out):
+        return out, collection
+    folder, name = os.path.split(os.path.abspath(out))
+    base, ext = os.path.splitext(name)
+    return folder, base if ext.lower() == FORMATS[output_format][1] else name
+
+
+def export(args, collection, cache_store):
+    output_format = args.format
+    if output_format is None:
+        ext = os.path.splitext(args.out)[1].lower()
+        output_format = next((key for key, (_, e) in FORMATS.items() if e == ext), "gpkg")
+    folder, name = output_target(args.out, collection, output_format, len(args.collection) > 1)
+
+    client = get_client(args.url, args.token)
+    fields = client.get_json(f"/fields/{collection}").get("data", [])
+    field_schema = field_schema_from(fields)
+    # Alias fields (one-to-many and the like) have no column of their own
+    selected_fields = [f for f in args.fields.split(",") if f] or [
+        name for name, info in field_schema.items() if info["type"] != "alias"
+    ]
+    if any("." in f for f in selected_fields):
+        # "region.name" style fields are joined from the related collection
+        add_related_fields(client, collection, field_schema)
+    job = ImportJob(
+        args.url,
+        collection,
+        cache_store,
+        token=args.token,
+        geom_field=args.geometry_field,
+        selected_fields=selected_fields,
+        field_schema=field_schema,
+        page_size=args.page_size,
+        max_workers=args.max_workers,
+        cache_timeout_seconds=args.max_age,
+        geometry_validation=args.validation,
+        geometry_mode=args.geometry_mode,
+        filter_expression=args.filter,
+        output_format=output_format,
+        output_folder=folder,
+        output_name=name,
+    )
+    layers = job.build_layers(force_refresh=args.refresh)
+    if layers is None:
+        log.warning(f"{collection}: no data")
+        return 0
+    return layers.imported
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s")
+    logging.getLogger(log.TAG).setLevel(log.LEVELS[args.log_level])
+    log.use_python_logging()
+    log.set_level(args.log_level)
+
+    app = QgsApplication([], False)
+    app.initQgis()
+    cache_store = CacheStore(args.cache, args.cache_size_mb * 1024 * 1024)
+    failed = 0
+    try:
+        # One shared connection pool per instance; each collection runs its own paging workers
+        with ThreadPoolExecutor(max_workers=max(args.jobs, 1)) as executor:
+            futures = {executor.submit(export, args, c, cache_store): c for c in args.collection}
+            for future in as_completed(futures):
+                collection = futures[future]
+                try:
+                    log.info(f"{collection}: {future.result()} features written")
+                except Exception as e:
+                    failed += 1
+                    log.error(f"{collection}: export failed: {e}")
+    finally:
+        close_decode_pool()
+        close_clients()
+        app.exitQgis()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+import sys
+from itertools import zip_longest
+
+# Pages of rows are handed from the download and the cache to the layer writers
+# column by column: one list per field instead of one dict per row.
+
+INTERN_MAX_LENGTH = 64  # longer strings (descriptions, WKT) are rarely repeated
+
+
+def intern_strings(values):
+    # Short strings repeated across rows and pages (categories, statuses, codes) are stored once
+    return [sys.intern(v) if type(v) is str and len(v) <= INTERN_MAX_LENGTH else v for v in values]
+
+
+class ColumnPage:
+    """A page of rows stored as one list of values per field.
+
+    Directus returns every row as a JSON object, so a page of rows costs a
+    dict per row on top of the values. Pages are converted once, as they come
+    from the server, and the cache stores and reads rows as plain value arrays
+    so cached imports never build the dicts at all. After
+    ImportJob.parse_page, `geometries` holds the decoded geometry of each row.
+
+    Iterating a page yields its rows as dicts, for the code that works row by
+    row.
+    """
+
+    __slots__ = ("names", "index", "columns", "length", "geometries")
+
+    def __init__(self, names, columns, length, geometries=None):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.columns = columns
+        self.length = length
+        self.geometries = geometries
+
+    @classmethod
+    def from_rows(cls, rows):
+        # Fields in order of appearance; rows missing one get None
+        names = list(rows[0]) if rows else []
+        if any(row.keys() != rows[0].keys() for row in rows):
+            seen = dict.fromkeys(names)
+            for row in rows:
+                seen.update(dict.fromkeys(row))
+            names = list(seen)
+        columns = [intern_strings([row.get(name) for row in rows]) for name in names]
+        return cls(names, columns, len(rows))
+
+    @classmethod
+    def from_arrays(cls, names, arrays):
+        # Rows as value arrays in the order of names; shorter arrays end with None values
+        columns = [intern_strings(values) for values in zip_longest(*arrays)]
+        columns += [[None] * len(arrays) for _ in range(len(names) - len(columns))]
+        return cls(names, columns, len(arrays))
+
+    @classmethod
+    def concat(cls, pages):
+        names = list(dict.fromkeys(name for page in pages for name in page.names))
+        columns = [[value for page in pages for value in page.column(name)] for name in names]
+        return cls(names, columns, sum(len(page) for page in pages))
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        rows = zip(*self.columns) if self.columns else [()] * self.length
+        for values in rows:
+            yield dict(zip(self.names, values))
+
+    def column(self, name):
+        i = self.index.get(name)
+        return self.columns[i] if i is not None else [None] * self.length
+
+    def set_column(self, name, values):
+        if name in self.index:
+            self.columns[self.index[name]] = values
+        else:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+            self.columns.append(values)
+
+    def arrays(self, names):
+        # Value arrays of the rows, fields in the order of names
+        return list(zip(*[self.column(name) for name in names])) if names else [()] * self.length
+
+    def take(self, indices, geometries=None):
+        # A page of the rows at these positions
+        columns = [[values[i] for i in indices] for values in self.columns]
+        if geometries is None and self.geometries is not None:
+            geometries = [self.geometries[i] for i in indices]
+        return ColumnPage(self.names, columns, len(indices), geometries)
@@ -0,0 +1,120 @@
+from qgis.core import QgsFeatureRequest, QgsWkbTypes
+
+from . import log
+
+# Level of detail for big line and polygon layers: simplified copies of a layer
+# are drawn at overview scales, the full resolution layer when zoomed in, so
+# identify and editing always work on the original geometries.
+
+DETAIL_SCALES = [50000, 500000, 5000000]  # scale denominators from which each simplified copy is drawn
+PIXEL_DEGREES = 0.0254 / 96 / 111320  # degrees covered by one 96 dpi screen pixel at a 1:1 scale
+MIN_VERTICES = 200000  # smaller layers draw fast enough as they are
+MIN_REDUCTION = 0.5  # a copy must drop at least this share of the vertices to be kept
+BATCH_SIZE = 5000  # simplified features written at a time
+
+
+def tolerance(scale):
+    # About one screen pixel at the scale the copy is first drawn, so outlines look unchanged
+    return scale * PIXEL_DEGREES
+
+
+def vertex_count(layer):
+    request = QgsFeatureRequest().setNoAttributes()
+    return sum(feature.geometry().constGet().nCoordinates() for feature in layer.getFeatures(request)
+               if feature.hasGeometry())
+
+
+def build_detail_levels(import_layers, task=None):
+    """Simplified copies of the line and polygon layers of an import.
+
+    Fills import_layers.detail_levels with layer key -> [(copy, scale from
+    which it is drawn)], coarsest last. Geometries are simplified with GEOS'
+    topology preserving simplifier (QgsGeometry.simplify), each level from the
+    previous one, and carry all attributes of the original features. Features
+    are streamed from one layer into the next, so no level is held in a list.
+
+    The copies are memory layers next to memory layers and tables of the
+    GeoPackage next to GeoPackage layers, so saved projects keep drawing them
+    (see ImportLayers.create_detail_level). Copies stored by an earlier
+    import are reused as long as the full layer has not changed.
+    """
+    for key, (layer, _, wkb_type) in import_layers.layers.items():
+        if wkb_type is None or QgsWkbTypes.geometryType(wkb_type) not in (
+            QgsWkbTypes.LineGeometry, QgsWkbTypes.PolygonGeometry
+        ):
+            continue
+        stored = import_layers.stored_detail_levels(key)
+        if stored is not None:
+            if stored:
+                import_layers.detail_levels[key] = stored
+            continue
+        vertices = vertex_count(layer)
+        if vertices < MIN_VERTICES:
+            for scale in DETAIL_SCALES:
+                import_layers.remove_detail_level(key, scale)  # left by an import of more rows
+            import_layers.store_detail_levels(key, [])
+            continue
+        levels = []
+        source = layer
+        for scale in DETAIL_SCALES:
+            copy = import_layers.create_detail_level(key, scale)
+            if copy is None:
+                break  # output without room for the copies
+            count = write_level(source, copy, wkb_type, scale, task)
+            if count is None:
+                return
+            if count > vertices * (1 - MIN_REDUCTION):
+                del copy  # closes the copy before its table is dropped
+                import_layers.remove_detail_level(key, scale)
+                continue  # not worth a layer; the next level simplifies more
+            levels.append((copy, scale))
+            log.debug(f"{layer.name()}: {count} of {vertices} vertices from 1:{scale}")
+            source, vertices = copy, count
+        import_layers.store_detail_levels(key, [scale for _, scale in levels])
+        if levels:
+            import_layers.detail_levels[key] = levels
+
+
+def write_level(source, copy, wkb_type, scale, task=None):
+    # Simplified features of source into copy; returns their vertex count, None once canceled
+    provider = copy.dataProvider()
+    batch, count = [], 0
+    for feature in source.getFeatures(QgsFeatureRequest()):
+        if feature.hasGeometry():
+            geom = feature.geometry().simplify(tolerance(scale))
+            if not geom.isNull() and not geom.isEmpty():
+                if QgsWkbTypes.isMultiType(wkb_type) and not geom.isMultipart():
+                    geom.convertToMultiType()
+                feature.setGeometry(geom)
+            count += feature.geometry().constGet().nCoordinates()
+        batch.append(feature)
+        if len(batch) >= BATCH_SIZE:
+            provider.addFeatures(batch)
+            batch = []
+            if task and task.isCanceled():
+                return None
+    provider.addFeatures(batch)
+    copy.updateExtents()
+    return count
+
+
+def set_scale_ranges(layer, levels):
+    # Each layer is drawn from its own scale up to the scale of the next, coarser one (0: no limit)
+    scales = [scale for _, scale in levels]
+    layer.setScaleBasedVisibility(True)
+    layer.setMaximumScale(0)
+    layer.setMinimumScale(scales[0])
+    for i, (copy, scale) in enumerate(levels):
+        copy.setScaleBasedVisibility(True)
+        copy.setMaximumScale(scale)
+        copy.setMinimumScale(scales[i + 1] if i + 1 < len(scales) else 0)
+
+
+def copy_style(layer, levels):
+    # The copies follow the symbology of the full resolution layer
+    for copy, _ in levels:
+        try:
+            copy.setRenderer(layer.renderer().clone())
+            copy.triggerRepaint()
+        except RuntimeError:
+            pass  # removed from the project
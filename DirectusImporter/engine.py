@@ -0,0 +1,1254 @@
+import json
+import math
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from qgis.PyQt.QtCore import Qt, QVariant, QDate, QDateTime, QTime
+from qgis.core import (
+    QgsVectorLayer,
+    QgsField,
+    QgsFeature,
+    QgsGeometry,
+    QgsWkbTypes,
+    QgsExpression,
+    QgsExpressionContext,
+    QgsFields,
+)
+
+from .http_client import get_client, transfer_size
+from .cache_store import cache_key
+from .columns import ColumnPage
+from .geometry import (
+    GeometryError, count_positions, decode, decode_many, decode_points, VALIDATE_NONE, VALIDATE_BASIC, VALIDATE_GEOS
+)
+from .profiler import Profiler
+from .field_types import PYTHON_CONVERTERS, field_kinds
+from .filters import translate_expression, filter_query
+from . import log
+
+# Fetching, decoding and layer building, independent of the QGIS interface:
+# used by the plugin and by the command line tool (cli.py).
+
+DEFAULT_MAX_WORKERS = 6  # parallel page requests when not set in the settings
+
+# Directus field types that can be used as a keyset pagination cursor
+SORTABLE_KEY_TYPES = {"integer", "bigInteger", "float", "decimal", "string", "uuid", "date", "dateTime", "timestamp"}
+# Keys of these types can also be split into ranges walked in parallel
+INTEGER_KEY_TYPES = {"integer", "bigInteger"}
+
+# Geometries are decoded on all cores once an import holds this many coordinate
+# positions; below it, shipping them to the workers costs more than it saves
+PARALLEL_DECODE_MIN_POSITIONS = 1000000
+DECODE_CHUNK_ROWS = 50  # smallest chunk of a page sent to one worker
+
+_decode_pool = None
+_decode_pool_lock = threading.Lock()
+
+PREVIEW_ROWS = 200  # rows of a preview import, also the sample page of a size estimate
+
+
+def field_schema_from(fields):
+    # {name: {"type", "primary_key"}} from the items returned by /fields/<collection>
+    field_schema = {}
+    for f in fields:
+        schema = f.get("schema") or {}
+        field_schema[f["field"]] = {"type": f.get("type"), "primary_key": bool(schema.get("is_primary_key"))}
+    return field_schema
+
+
+def add_related_fields(client, collection, field_schema, timeout=None, max_retries=None):
+    """Add the fields of many-to-one related collections to field_schema.
+
+    Read from /relations, they are named "<field>.<related field>" and joined
+    on the client by RelatedLookup. The foreign key field keeps the related
+    collection and its primary key. Returns the names of the added fields.
+    """
+    relations = client.get_json(f"/relations/{collection}", timeout=timeout, max_retries=max_retries).get("data", [])
+    added = []
+    for relation in relations:
+        field, related = relation.get("field"), relation.get("related_collection")
+        # Many-to-any relations have no single related collection
+        if relation.get("collection") != collection or not related or field not in field_schema:
+            continue
+        related_schema = field_schema_from(
+            client.get_json(f"/fields/{related}", timeout=timeout, max_retries=max_retries).get("data", [])
+        )
+        related_key = next((name for name, info in related_schema.items() if info["primary_key"]), "id")
+        field_schema[field]["relation"] = {"collection": related, "primary_key": related_key}
+        for name, info in related_schema.items():
+            if info["type"] != "alias" and name != related_key:
+                field_schema[f"{field}.{name}"] = {"type": info["type"], "primary_key": False}
+                added.append(f"{field}.{name}")
+    return added
+
+
+class RelatedLookup:
+    """Joins the values of many-to-one related items into rows on the client.
+
+    Directus can expand "region.name" inline, but then repeats the related
+    item in every row referencing it. Here only the foreign key is requested
+    and each related item is fetched once, into an id-keyed lookup shared by
+    all the pages of the import.
+    """
+
+    BATCH_SIZE = 100  # ids per request, kept well below URL length limits
+
+    def __init__(self, fields, field_schema):
+        # foreign key field -> (related collection, related primary key, [related fields])
+        self.relations = {}
+        for name in fields:
+            base, _, related_field = name.partition(".")
+            relation = (field_schema.get(base) or {}).get("relation")
+            if related_field and relation:
+                entry = self.relations.setdefault(base, (relation["collection"], relation["primary_key"], []))
+                entry[2].append(related_field)
+        self.items = {base: {} for base in self.relations}
+
+    def request_fields(self, fields):
+        # Joined fields are replaced by their foreign key in the request
+        request = []
+        for name in fields:
+            base = name.partition(".")[0] if name.partition(".")[0] in self.relations else name
+            if base not in request:
+                request.append(base)
+        return request
+
+    def join(self, page, fetch_page, client):
+        # Adds a "base.field" column to the ColumnPage for every joined field
+        for base, (related, related_key, related_fields) in self.relations.items():
+            lookup = self.items[base]
+            keys = page.column(base)
+            missing = list({k for k in keys if k is not None} - lookup.keys())
+            fields = ",".join([related_key] + related_fields)
+            for i in range(0, len(missing), self.BATCH_SIZE):
+                batch = missing[i:i + self.BATCH_SIZE]
+                condition = {related_key: {"_in": batch}}
+                url = f"/items/{related}?limit={len(batch)}&fields={fields}{filter_query(condition)}"
+                for item in fetch_page(client, url):
+                    lookup[item.get(related_key)] = item
+                # Ids the server did not return (deleted, or not readable) are not asked for again
+                for value in batch:
+                    lookup.setdefault(value, None)
+            items = [lookup.get(k) or {} for k in keys]
+            for name in related_fields:
+                page.set_column(f"{base}.{name}", [item.get(name) for item in items])
+
+
+def build_geometry(raw_geom, validation=VALIDATE_BASIC):
+    # GeoJSON and [lon, lat] values are encoded straight to WKB; only WKT strings are parsed by QGIS
+    return wrap_geometry(decode(raw_geom, check=validation != VALIDATE_NONE), validation)
+
+
+def build_many(raw_geoms, validation):
+    # Thread pool counterpart of geometry.decode_many, building the QgsGeometry objects too
+    results = []
+    for raw_geom in raw_geoms:
+        try:
+            results.append(("geometry", build_geometry(raw_geom, validation)))
+        except GeometryError as e:
+            results.append(("error", str(e)))
+    return results
+
+
+def wrap_geometry(decoded, validation=VALIDATE_BASIC):
+    # QgsGeometry from the result of decode()/decode_many(); raises GeometryError for decoding errors
+    if decoded is None:
+        return None
+    kind, value = decoded
+    if kind == "error":
+        raise GeometryError(value)
+    if kind == "geometry":
+        return value
+    if kind == "wkb":
+        geom = QgsGeometry()
+        geom.fromWkb(value)
+    else:
+        geom = QgsGeometry.fromWkt(value)
+    if geom is None or geom.isNull():
+        return None
+    if validation == VALIDATE_GEOS and not geom.isGeosValid():
+        return None
+    return geom
+
+
+def python_executable():
+    # Interpreter to start decode worker processes with. Inside QGIS, sys.executable
+    # is usually the QGIS binary itself, which cannot run them.
+    version = f"python{sys.version_info[0]}.{sys.version_info[1]}"
+    candidates = [sys.executable, getattr(sys, "_base_executable", None)]
+    names = ("python.exe", "pythonw.exe", version, "python3", "python")
+    for folder in (sys.exec_prefix, os.path.join(sys.exec_prefix, "bin")):
+        candidates += [os.path.join(folder, name) for name in names]
+    for path in candidates:
+        if path and os.path.basename(path).lower().startswith("python") and os.path.isfile(path) \
+                and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def decode_pool():
+    # (executor, runs processes, workers), shared by every import of the session. Processes
+    # give one core each to the pure-Python encoder; threads are the fallback when no
+    # interpreter can be found.
+    global _decode_pool
+    with _decode_pool_lock:
+        if _decode_pool is None:
+            workers = max((os.cpu_count() or 1) - 1, 1)
+            executable = python_executable()
+            if executable:
+                try:
+                    # Never fork: the QGIS process is full of threads
+                    context = multiprocessing.get_context("spawn")
+                    context.set_executable(executable)
+                    _decode_pool = (ProcessPoolExecutor(workers, mp_context=context), True, workers)
+                except (OSError, ValueError) as e:
+                    log.warning(f"Could not start geometry decoding processes, using threads: {e}")
+            if _decode_pool is None:
+                _decode_pool = (ThreadPoolExecutor(workers), False, workers)
+            log.debug(f"Parallel geometry decoding on {workers} {'processes' if _decode_pool[1] else 'threads'}")
+        return _decode_pool
+
+
+def close_decode_pool():
+    global _decode_pool
+    with _decode_pool_lock:
+        if _decode_pool is not None:
+            _decode_pool[0].shutdown(wait=False)
+            _decode_pool = None
+
+
+def format_size(nbytes):
+    for unit in ("bytes", "kB", "MB"):
+        if nbytes < 1024:
+            return f"{nbytes:.0f} {unit}"
+        nbytes /= 1024
+    return f"{nbytes:.1f} GB"
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{max(seconds, 1):.0f} s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
+
+class SizeEstimate:
+    """Expected size and download time of a full import, from the row count and one sampled page.
+
+    The time to transfer and decode the payload is scaled from the sample,
+    which shares the bandwidth and the CPU with nothing else; parallel
+    requests only hide the latency of the count request, paid once per page.
+    Sizes are bytes on the wire, so compressed responses count compressed.
+    """
+
+    def __init__(self, count, sample_rows, sample_bytes, sample_seconds, latency, pages, workers):
+        self.count = count
+        self.bytes = sample_bytes / sample_rows * count if sample_rows else 0
+        throughput = sample_bytes / max(sample_seconds - latency, 0.001)
+        self.seconds = pages * latency / max(workers, 1) + self.bytes / throughput if sample_rows else latency
+
+    def summary(self):
+        return (
+            f"{self.count:,} rows, about {format_size(self.bytes)}, "
+            f"about {format_duration(self.seconds)} to download"
+        )
+
+
+def ordered_map(executor, fn, items, window):
+    # Like executor.map, but never more than `window` results are pending at once
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def concurrent_chain(generators, buffer_pages=2):
+    # Runs every generator on its own thread and yields their items as they come, in
+    # no particular order. The threads share one queue of buffer_pages items per
+    # generator, so memory stays bounded without one generator waiting for another.
+    done = object()
+    stop = threading.Event()
+    q = queue.Queue(maxsize=buffer_pages * len(generators))
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def drain(generator):
+        try:
+            for item in generator:
+                if not put(item):
+                    return
+            put(done)
+        except Exception as e:
+            put(e)
+        finally:
+            # Closed on this thread, so resources the generator holds are released where they were opened
+            if hasattr(generator, "close"):
+                generator.close()
+
+    threads = [threading.Thread(target=drain, args=(g,), daemon=True) for g in generators]
+    for thread in threads:
+        thread.start()
+    try:
+        running = len(threads)
+        while running:
+            item = q.get()
+            if item is done:
+                running -= 1
+                continue
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+QVARIANT_TYPES = {
+    "int": QVariant.Int,
+    "int64": QVariant.LongLong,
+    "double": QVariant.Double,
+    "bool": QVariant.Bool,
+    "date": QVariant.Date,
+    "datetime": QVariant.DateTime,
+    "time": QVariant.Time,
+    "json": QVariant.String,
+    "string": QVariant.String,
+}
+
+QT_CONVERTERS = {
+    "date": lambda value: QDate.fromString(value[:10], Qt.ISODate),
+    "datetime": lambda value: QDateTime.fromString(value, Qt.ISODateWithMs),
+    "time": lambda value: QTime.fromString(value, Qt.ISODateWithMs),
+}
+
+
+def attribute_columns(names, field_schema):
+    # (name, QVariant type, converter) per column, looked up once per import instead of per cell
+    columns = []
+    for name, kind in zip(names, field_kinds(names, field_schema)):
+        columns.append((name, QVARIANT_TYPES[kind], QT_CONVERTERS.get(kind, PYTHON_CONVERTERS[kind])))
+    return columns
+
+
+def convert_row(row, columns):
+    values = []
+    for name, _, convert in columns:
+        value = row.get(name)
+        if value is not None:
+            try:
+                value = convert(value)
+            except (TypeError, ValueError):
+                value = None
+        values.append(value)
+    return values
+
+
+def convert_column(values, convert):
+    converted = []
+    for value in values:
+        if value is not None:
+            try:
+                value = convert(value)
+            except (TypeError, ValueError):
+                value = None
+        converted.append(value)
+    return converted
+
+
+def convert_page(page, columns):
+    # convert_row for every row of a ColumnPage, a column at a time
+    if not columns:
+        return [[] for _ in range(len(page))]
+    converted = [convert_column(page.column(name), convert) for name, _, convert in columns]
+    return [list(values) for values in zip(*converted)]
+
+
+class ClientFilter:
+    """Evaluates a QGIS expression on parsed rows, for the parts Directus could not filter."""
+
+    def __init__(self, text, field_schema, geom_field=None):
+        self.expression = QgsExpression(text)
+        names = sorted(n for n in self.expression.referencedColumns() if n != "*" and n != geom_field)
+        self.columns = attribute_columns(names, field_schema)
+        self.fields = QgsFields()
+        for name, qvariant_type, _ in self.columns:
+            self.fields.append(QgsField(name, qvariant_type))
+        self.feature = QgsFeature(self.fields)
+        self.context = QgsExpressionContext()
+        self.context.setFields(self.fields)
+        self.expression.prepare(self.context)
+
+    def apply(self, page):
+        # The rows of a parsed ColumnPage that match the expression
+        kept = []
+        for i, (values, geom) in enumerate(zip(convert_page(page, self.columns), page.geometries)):
+            self.feature.setAttributes(values)
+            if geom is not None:
+                self.feature.setGeometry(geom)
+            else:
+                self.feature.clearGeometry()
+            self.context.setFeature(self.feature)
+            if self.expression.evaluate(self.context):
+                kept.append(i)
+        return page if len(kept) == len(page) else page.take(kept)
+
+
+GEOMETRY_FAMILY_NAMES = {
+    QgsWkbTypes.PointGeometry: "points",
+    QgsWkbTypes.LineGeometry: "lines",
+    QgsWkbTypes.PolygonGeometry: "polygons",
+}
+
+
+class ImportLayers:
+    """Memory layers filled by one import, created as the geometry types show up.
+
+    Modes for collections mixing geometry types:
+    - "single": one layer typed after the first geometry, other types are dropped
+    - "promote": one layer of the Multi* type of the first geometry's family
+    - "split": one Multi* layer per geometry family, plus one for rows without geometry
+    """
+
+    def __init__(self, name, attribute_fields, use_geometry, mode="split", profiler=None, field_schema=None):
+        self.name = name
+        self.attribute_fields = attribute_fields
+        self.columns = attribute_columns(attribute_fields, field_schema or {})
+        self.use_geometry = use_geometry
+        self.mode = mode
+        self.profiler = profiler or Profiler(name)
+        self.layers = {}  # family (or None) -> (layer, provider, wkb type)
+        self.pending = []  # pages held back until the layer type is known
+        self.imported = 0
+        self.dropped = 0
+        self.reopened = False  # True when an earlier output file was opened as is
+        self.detail_levels = {}  # layer key -> simplified copies for overview scales, see detail_levels.py
+
+    def create(self, key, wkb_type, suffix=""):
+        crs = "EPSG:4326"
+        geom_type = QgsWkbTypes.displayString(wkb_type) if wkb_type is not None else "None"
+        layer_def = f"{geom_type}?crs={crs}"
+        layer = QgsVectorLayer(layer_def, f"Directus: {self.name}{suffix}", "memory")
+        provider = layer.dataProvider()
+        provider.addAttributes([QgsField(name, variant_type) for name, variant_type, _ in self.columns])
+        layer.updateFields()
+        self.layers[key] = (layer, provider, wkb_type)
+        return self.layers[key]
+
+    def create_detail_level(self, key, scale):
+        # Empty layer for a simplified copy of layer key, see detail_levels.py
+        layer, _, wkb_type = self.layers[key]
+        copy = QgsVectorLayer(
+            f"{QgsWkbTypes.displayString(wkb_type)}?crs=EPSG:4326", f"{layer.name()} (1:{scale})", "memory"
+        )
+        copy.dataProvider().addAttributes(layer.fields().toList())
+        copy.updateFields()
+        return copy
+
+    def remove_detail_level(self, key, scale):
+        pass  # memory copies go away with the last reference
+
+    def stored_detail_levels(self, key):
+        # [(copy, scale)] of copies kept from an earlier import of an unchanged layer, else None
+        return None
+
+    def store_detail_levels(self, key, scales):
+        pass  # memory layers are built again by every import
+
+    def add(self, page):
+        # page: ColumnPage from parse_page, each geometry decoded once upstream
+        if not self.use_geometry:
+            entry = self.layers.get(None) or self.create(None, None)
+            self.insert(entry, page)
+        elif self.mode == "split":
+            groups = {}
+            for i, geom in enumerate(page.geometries):
+                groups.setdefault(geometry_family(geom), []).append(i)
+            for family, indices in groups.items():
+                entry = self.layers.get(family)
+                if entry is None:
+                    if family is None:
+                        entry = self.create(None, None, " (no geometry)")
+                    else:
+                        wkb_type = QgsWkbTypes.multiType(page.geometries[indices[0]].wkbType())
+                        entry = self.create(family, wkb_type, f" ({GEOMETRY_FAMILY_NAMES[family]})")
+                self.insert(entry, page if len(groups) == 1 else page.take(indices))
+        else:
+            if not self.layers:
+                self.pending.append(page)
+                first = next((geom for geom in page.geometries if geometry_family(geom) is not None), None)
+                if first is None:
+                    return
+                wkb_type = first.wkbType()
+                if self.mode == "promote":
+                    wkb_type = QgsWkbTypes.multiType(wkb_type)
+                self.create(geometry_family(first), wkb_type)
+                pages, self.pending = self.pending, []
+                for pending in pages[:-1]:
+                    self.insert(next(iter(self.layers.values())), pending)
+            self.insert(next(iter(self.layers.values())), page)
+
+    def insert(self, entry, page):
+        layer, provider, wkb_type = entry
+        fields = provider.fields()
+        features = []
+        with self.profiler.phase("attribute_conversion"):
+            for values, geom in zip(convert_page(page, self.columns), page.geometries):
+                feat = QgsFeature(fields)
+                feat.setAttributes(values)
+                if geom is not None and wkb_type is not None:
+                    if QgsWkbTypes.geometryType(geom.wkbType()) != QgsWkbTypes.geometryType(wkb_type):
+                        self.dropped += 1
+                    elif self.mode == "single" and geom.wkbType() != wkb_type:
+                        self.dropped += 1
+                    else:
+                        if QgsWkbTypes.isMultiType(wkb_type) and not geom.isMultipart():
+                            geom.convertToMultiType()
+                        feat.setGeometry(geom)
+                features.append(feat)
+        with self.profiler.phase("provider_insert"):
+            provider.addFeatures(features)
+        self.imported += len(features)
+
+    def finish(self):
+        if self.pending:
+            # No valid geometry anywhere in the collection
+            entry = self.create(None, None)
+            for page in self.pending:
+                self.insert(entry, page)
+            self.pending = []
+        layers = [entry[0] for entry in self.layers.values()]
+        if len(layers) == 1:
+            layers[0].setName(f"Directus: {self.name}")
+        for layer in layers:
+            layer.updateExtents()
+        return layers
+
+
+def geometry_family(geom):
+    if geom is None:
+        return None
+    family = QgsWkbTypes.geometryType(geom.wkbType())
+    return family if family in GEOMETRY_FAMILY_NAMES else None
+
+
+class ImportJob:
+    """One import of one Directus collection.
+
+    Holds the settings of the import and its profiler, so several jobs can
+    run at once. build_layers() streams the collection into memory layers or
+    into a file (see file_output.py).
+    """
+
+    def __init__(self, instance_url, collection, cache_store, token="", geom_field="geometry",
+                 selected_fields=None, field_schema=None, page_size=0, max_workers=0, keyset_pagination=True,
+                 cache_timeout_seconds=3600, sync_fields="date_updated,date_created",
+                 geometry_validation=VALIDATE_BASIC, geometry_mode="split", filter_expression="",
+                 output_format="memory", output_folder="", output_name=None, debug_dump_path=None,
+                 profile_folder=None, keep_primary_key=False, preview_rows=0):
+        self.instance_url = instance_url
+        self.collection = collection
+        self.cache_store = cache_store
+        self.token = token
+        self.geom_field = geom_field
+        self.selected_fields = selected_fields or []
+        self.field_schema = field_schema or {}
+        # 0 means "auto": derived from the row count at import time
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.keyset_pagination = keyset_pagination
+        self.cache_timeout_seconds = cache_timeout_seconds
+        # Timestamp fields used to fetch only the rows changed since the last import
+        self.sync_fields = sync_fields
+        self.geometry_validation = geometry_validation
+        self.geometry_mode = geometry_mode
+        # QGIS expression; the parts Directus understands are sent as a server-side filter
+        self.filter_expression = filter_expression
+        # "memory", or a file format written to output_folder and reused by later imports
+        self.output_format = output_format
+        self.output_folder = output_folder
+        self.output_name = output_name or collection  # file name, without extension
+        self.debug_dump_path = debug_dump_path
+        self.profile_folder = profile_folder
+        # Memory layers get a primary key column too, so rows can be matched to features later (live sync)
+        self.keep_primary_key = keep_primary_key
+        # A preview imports only the first rows into memory layers, and estimates the full import
+        self.preview_rows = preview_rows
+        self.estimate = None  # SizeEstimate of the full import, set by a preview
+        self.profiler = Profiler(collection)
+        # Server timestamp of the newest row in the layers, set by build_layers()
+        self.synced_to = None
+        # Server timestamp up to which the data yielded by fetch_data() is complete
+        self.fetch_cursor = None
+
+    def fetch_data(self, force_refresh=False, on_total=None):
+      # Generator of pages (lists of rows), read from the cache or the server as they arrive.
+      # on_total is called with the expected row count once it is known.
+      on_total = on_total or (lambda total: None)
+      self.load_field_schema()
+      client = get_client(self.instance_url, self.token)
+      items_path = f"/items/{self.collection}"
+      primary_key, key_type = self.get_primary_key()
+      sync_fields = self.get_sync_fields()
+      request_fields, fields_query, server_filter, filter_key, key = self.get_query(primary_key, sync_fields)
+      self.fetch_cursor = None
+      if self.preview_rows:
+          # The sampled page of the estimate is all a preview shows; it is never cached
+          self.estimate, rows = self.estimate_size(self.preview_rows)
+          log.info(f"{self.collection}: preview of {len(rows)} rows, full import {self.estimate.summary()}")
+          on_total(len(rows))
+          if rows:
+              yield ColumnPage.from_rows(rows)
+          return
+      cache = None if force_refresh else self.cache_store.entry(key)
+      if cache and time.time() - cache["fetched_at"] < self.cache_timeout_seconds:
+          log.info(f"{self.collection}: using cached data ({cache['count']} rows)")
+          self.fetch_cursor = cache["synced_to"]
+          on_total(cache["count"])
+          yield from self.read_cache(key)
+          return
+
+      if cache and self.sync_cache(client, items_path, fields_query, key, cache, primary_key, key_type, sync_fields, server_filter):
+          entry = self.cache_store.entry(key)
+          self.fetch_cursor = entry["synced_to"]
+          on_total(entry["count"])
+          yield from self.read_cache(key)
+          return
+
+      synced_to = self.fetch_sync_cursor(client, items_path, sync_fields, server_filter)
+      total = self.fetch_total_count(client, items_path, server_filter)
+      on_total(total)
+      if self.keyset_pagination and primary_key:
+          pages = self.fetch_pages_keyset(client, items_path, fields_query, primary_key, key_type, total, server_filter)
+      elif total is None:
+          pages = self.fetch_pages_sequential(client, items_path, fields_query, server_filter)
+      else:
+          pages = self.fetch_pages_parallel(client, items_path, fields_query, total, server_filter)
+
+      # Cache the dataset page by page while it is passed on
+      writer = self.cache_store.writer(key, self.instance_url, self.collection, request_fields, filter_key, primary_key)
+      dump = open(self.debug_dump_path, "w", encoding="utf-8") if self.debug_dump_path else None
+      try:
+          if dump:
+              dump.write('{"data": [')
+          for page_data in pages:
+              page_data = ColumnPage.from_rows(page_data)
+              if dump:
+                  dump.write(("," if writer.seq else "") + ",".join(json.dumps(row, indent=2) for row in page_data))
+              writer.write(page_data)
+              yield page_data
+          if dump:
+              dump.write("]}")
+      except BaseException:
+          writer.abort()
+          raise
+      finally:
+          if dump:
+              dump.close()
+      writer.finish(synced_to)
+      self.fetch_cursor = synced_to
+
+    def get_query(self, primary_key, sync_fields):
+        # Fields, filter and cache key of the request for the current settings
+        selected_fields = list(self.selected_fields)
+        server_filter, exact = translate_expression(self.filter_expression)
+        field_schema = self.field_schema
+        filter_fields = [] if exact else sorted(QgsExpression(self.filter_expression).referencedColumns())
+
+        # The key and timestamps are needed for paging and delta sync, and the columns of
+        # a client-side filter to evaluate it, even if they are not imported
+        related = self.get_related_lookup()
+        request_fields = related.request_fields(selected_fields)
+        if request_fields:
+            extra_fields = [primary_key] + sync_fields + related.request_fields([f for f in filter_fields if f in field_schema])
+            request_fields += [f for f in extra_fields if f and f not in request_fields]
+        fields_query = f"&fields={','.join(request_fields)}" if request_fields else ""
+
+        filter_key = json.dumps(server_filter, sort_keys=True) if server_filter else ""
+        key = cache_key(self.instance_url, self.collection, request_fields, filter_key)
+        return request_fields, fields_query, server_filter, filter_key, key
+
+    def get_related_lookup(self):
+        # Related values are joined for the imported fields and those a client-side filter reads
+        fields = list(self.selected_fields)
+        if not translate_expression(self.filter_expression)[1]:
+            fields += sorted(QgsExpression(self.filter_expression).referencedColumns())
+        return RelatedLookup(fields, self.field_schema)
+
+    def get_sync_fields(self):
+        # Only timestamp fields that exist in the collection can drive the delta sync
+        field_schema = self.field_schema
+        names = [f.strip() for f in self.sync_fields.split(",") if f.strip()]
+        return [f for f in names if f in field_schema]
+
+    def fetch_sync_cursor(self, client, items_path, sync_fields, base_filter=None):
+        # Newest change timestamp on the server, taken from the server's own clock. Read before
+        # a download starts: rows changed while it runs are newer, so the next delta sync gets
+        # them whatever page they were on
+        values = []
+        for f in sync_fields:
+            url = f"{items_path}?limit=1&sort=-{f}&fields={f}{filter_query(base_filter, {f: {'_nnull': True}})}"
+            rows = client.get_json(url).get("data", [])
+            if rows and rows[0].get(f):
+                values.append(rows[0][f])
+        return max(values) if values else None
+
+    def sync_cache(self, client, items_path, fields_query, key, cache, primary_key, key_type, sync_fields,
+                   server_filter=None):
+        # Brings the cache entry up to date in place; False when a full download is needed instead
+        since = cache.get("synced_to")
+        if not primary_key or not sync_fields or not since:
+            return False
+
+        changed = 0
+        cursor = self.fetch_sync_cursor(client, items_path, sync_fields, server_filter)
+        for page_data in self.fetch_changes(client, items_path, fields_query, since, sync_fields, server_filter):
+            self.cache_store.upsert(key, page_data, primary_key)
+            changed += len(page_data)
+        since = max(since, cursor or since)
+
+        total = self.fetch_total_count(client, items_path, server_filter)
+        if total is None:
+            return False
+        count = self.cache_store.entry(key)["count"]
+        if count != total:
+            # Some rows were deleted on the server: keep only the ids that still exist
+            ids = self.fetch_ids(client, items_path, primary_key, key_type, total, server_filter)
+            count -= self.cache_store.delete_missing(key, ids)
+            if count != total:
+                return False
+
+        self.cache_store.touch(key, since)
+        log.info(f"{self.collection}: delta sync, {changed} changed rows, {count} rows in total")
+        return True
+
+    def fetch_changes(self, client, items_path, fields_query, since, sync_fields, server_filter=None):
+        # ColumnPages of the rows created or updated since the given server timestamp
+        changes_filter = {"_or": [{f: {"_gte": since}} for f in sync_fields]}
+        if len(sync_fields) == 1:
+            changes_filter = changes_filter["_or"][0]
+        if server_filter:
+            changes_filter = {"_and": [server_filter, changes_filter]}
+        for page_data in self.fetch_pages_sequential(client, items_path, fields_query, changes_filter):
+            yield ColumnPage.from_rows(page_data)
+
+    def fetch_ids(self, client, items_path, primary_key, key_type, total, server_filter=None):
+        ids = set()
+        id_pages = self.fetch_pages_keyset(
+            client, items_path, f"&fields={primary_key}", primary_key, key_type, total, server_filter
+        )
+        for page_data in id_pages:
+            ids.update(row.get(primary_key) for row in page_data)
+        return ids
+
+    def fetch_total_count(self, client, items_path, base_filter=None):
+        # One cheap request for the row count: no items, only the meta block
+        try:
+            data = client.get_json(f"{items_path}?limit=0&meta=filter_count{filter_query(base_filter)}")
+            total = data.get("meta", {}).get("filter_count")
+            return int(total) if total is not None else None
+        except Exception as e:
+            log.warning(f"Could not read row count, falling back to sequential paging: {e}")
+            return None
+
+    def fetch_row_count(self, client, items_path, base_filter=None):
+        # Row count through the aggregate endpoint, falling back to the meta block
+        try:
+            data = client.get_json(f"{items_path}?aggregate[count]=*{filter_query(base_filter)}").get("data") or [{}]
+            count = data[0].get("count")
+            if isinstance(count, dict):
+                count = next(iter(count.values()), None)  # {"count": {"*": n}} on some versions
+            if count is not None:
+                return int(count)
+        except Exception as e:
+            log.debug(f"aggregate[count] failed: {e}")
+        return self.fetch_total_count(client, items_path, base_filter)
+
+    def estimate_size(self, sample_rows=PREVIEW_ROWS):
+        # (SizeEstimate, first rows) from two requests: the row count and one page of sample_rows
+        self.load_field_schema()
+        client = get_client(self.instance_url, self.token)
+        items_path = f"/items/{self.collection}"
+        primary_key, _ = self.get_primary_key()
+        _, fields_query, server_filter, _, _ = self.get_query(primary_key, self.get_sync_fields())
+        start = time.perf_counter()
+        count = self.fetch_row_count(client, items_path, server_filter) or 0
+        latency = time.perf_counter() - start
+
+        sort = f"&sort={primary_key}" if primary_key else ""
+        url = f"{items_path}?limit={sample_rows}{sort}{fields_query}{filter_query(server_filter)}"
+        start = time.perf_counter()
+        response = client.get(url)
+        rows = response.json().get("data", [])
+        seconds = time.perf_counter() - start
+        count = max(count, len(rows))
+        _, pages, workers = self.get_paging_params(count)
+        estimate = SizeEstimate(count, len(rows), transfer_size(response), seconds, latency, pages, workers)
+        return estimate, rows
+
+    def needs_full_download(self, force_refresh=False):
+        # False when an import would be served from the cache, or only bring it up to date
+        if force_refresh:
+            return True
+        self.load_field_schema()
+        primary_key, _ = self.get_primary_key()
+        sync_fields = self.get_sync_fields()
+        entry = self.cache_store.entry(self.get_query(primary_key, sync_fields)[4])
+        if entry is None:
+            return True
+        if time.time() - entry["fetched_at"] < self.cache_timeout_seconds:
+            return False
+        return not (entry["synced_to"] and primary_key and sync_fields)
+
+    def get_primary_key(self):
+        field_schema = self.field_schema
+        for name, info in field_schema.items():
+            if info.get("primary_key") and info.get("type") in SORTABLE_KEY_TYPES:
+                return name, info.get("type")
+        return None, None
+
+    def get_paging_params(self, total):
+        page_size = self.page_size or min(max(total // (DEFAULT_MAX_WORKERS * 4), 100), 1000)
+        pages = max(math.ceil(total / page_size), 1)
+        max_workers = self.max_workers or min(DEFAULT_MAX_WORKERS, pages)
+        return page_size, pages, max_workers
+
+    def fetch_page(self, client, url):
+        start = time.perf_counter()
+        response = client.get(url)
+        size = len(response.content)
+        self.profiler.add("http_wait", time.perf_counter() - start, size)
+        with self.profiler.phase("json_decode", size):
+            return response.json().get("data", [])
+
+    def read_cache(self, key):
+        rows = self.cache_store.iter_rows(key)
+        while True:
+            start = time.perf_counter()
+            page_data = next(rows, None)
+            if page_data is None:
+                break
+            self.profiler.add("cache_read", time.perf_counter() - start)
+            yield page_data
+
+    def fetch_window(self, client, items_path, fields_query, offset, size, base_filter=None):
+        # The server may cap the page size below what was asked (QUERY_LIMIT_MAX),
+        # so keep reading until the window is full or the collection ends
+        rows = []
+        while len(rows) < size:
+            url = f"{items_path}?limit={size - len(rows)}&offset={offset + len(rows)}{fields_query}{filter_query(base_filter)}"
+            page_data = self.fetch_page(client, url)
+            if not page_data:
+                break
+            rows.extend(page_data)
+        return rows
+
+    def fetch_pages_parallel(self, client, items_path, fields_query, total, base_filter=None):
+        page_size, pages, max_workers = self.get_paging_params(total)
+
+        def fetch(page):
+            return self.fetch_window(client, items_path, fields_query, page * page_size, page_size, base_filter)
+
+        # Pages are yielded in offset order, with at most two pages per worker held in memory
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from ordered_map(executor, fetch, range(pages), max_workers * 2)
+
+    def fetch_key_bounds(self, client, items_path, primary_key, base_filter=None):
+        try:
+            url = f"{items_path}?aggregate[min]={primary_key}&aggregate[max]={primary_key}{filter_query(base_filter)}"
+            bounds = client.get_json(url).get("data", [{}])[0]
+            low = bounds.get("min", {}).get(primary_key)
+            high = bounds.get("max", {}).get(primary_key)
+            if low is None or high is None:
+                return None
+            return int(low), int(high)
+        except Exception as e:
+            log.warning(f"Could not read key range, using a single cursor: {e}")
+            return None
+
+    def fetch_key_range(self, client, items_path, fields_query, primary_key, after, until, limit, base_filter=None):
+        # Walk (after, until] in key order; every page is an index seek past the last key seen
+        last_key = after
+        until_filter = {primary_key: {"_lte": until}} if until is not None else None
+        while True:
+            after_filter = {primary_key: {"_gt": last_key}} if last_key is not None else None
+            url = f"{items_path}?limit={limit}&sort={primary_key}{fields_query}"
+            url += filter_query(base_filter, after_filter, until_filter)
+            page_data = self.fetch_page(client, url)
+            if not page_data:
+                break
+            yield page_data
+            last_key = page_data[-1].get(primary_key)
+
+    def fetch_pages_keyset(self, client, items_path, fields_query, primary_key, key_type, total, base_filter=None):
+        if total is not None:
+            limit, _, max_workers = self.get_paging_params(total)
+        else:
+            limit, max_workers = self.page_size or 100, self.max_workers or DEFAULT_MAX_WORKERS
+
+        ranges = [(None, None)]
+        bounds = self.fetch_key_bounds(client, items_path, primary_key, base_filter) if key_type in INTEGER_KEY_TYPES else None
+        if bounds and max_workers > 1:
+            low, high = bounds[0] - 1, bounds[1]
+            step = max(math.ceil((high - low) / max_workers), 1)
+            edges = list(range(low, high, step)) + [None]  # open-ended last range catches new rows
+            ranges = list(zip(edges[:-1], edges[1:]))
+
+        range_pages = [
+            self.fetch_key_range(client, items_path, fields_query, primary_key, after, until, limit, base_filter)
+            for after, until in ranges
+        ]
+        if len(range_pages) == 1:
+            yield from range_pages[0]
+        else:
+            # Ranges finish in any order; layer building does not depend on page order
+            yield from concurrent_chain(range_pages)
+
+    def fetch_pages_sequential(self, client, items_path, fields_query, base_filter=None):
+        limit = self.page_size or 100  # items per page
+        offset = 0
+
+        while True:
+            url = f"{items_path}?limit={limit}&offset={offset}{fields_query}{filter_query(base_filter)}"
+            page_data = self.fetch_page(client, url)
+            if not page_data:
+                break
+            yield page_data
+            offset += len(page_data)
+
+    def decode_pages(self, pages, expected_rows):
+        # Yields (page, decoded geometries). Big imports are decoded ahead on the decode
+        # pool, page by page in order; otherwise decoded is None and parse_page decodes
+        try:
+            first = next(pages, None)
+            if first is None:
+                return
+            if not self.use_parallel_decode(first, expected_rows() or len(first)):
+                yield first, None
+                for page_data in pages:
+                    yield page_data, None
+                return
+            yield from self.decode_parallel(first, pages)
+        finally:
+            pages.close()
+
+    def use_parallel_decode(self, first_page, expected_rows):
+        if not self.geom_field or self.geom_field not in first_page.index or (os.cpu_count() or 1) < 3:
+            return False
+        sample = first_page.column(self.geom_field)[:50]
+        positions = sum(count_positions(raw_geom) for raw_geom in sample) / len(sample)
+        return positions * expected_rows >= PARALLEL_DECODE_MIN_POSITIONS
+
+    def decode_parallel(self, first, pages):
+        executor, processes, workers = decode_pool()
+        check = self.geometry_validation != VALIDATE_NONE
+        pending = deque()  # (page, [(geometry values, future)])
+
+        def submit(page_data):
+            size = max(math.ceil(len(page_data) / workers), DECODE_CHUNK_ROWS)
+            raw_geoms = page_data.column(self.geom_field)
+            chunks = []
+            for start in range(0, len(page_data), size):
+                values = raw_geoms[start:start + size]
+                if processes:
+                    chunks.append((values, executor.submit(decode_many, values, check)))
+                else:
+                    chunks.append((values, executor.submit(build_many, values, self.geometry_validation)))
+            pending.append((page_data, chunks))
+
+        def collect():
+            page_data, chunks = pending.popleft()
+            decoded = []
+            with self.profiler.phase("geometry_decode"):
+                for values, future in chunks:
+                    try:
+                        decoded.extend(future.result())
+                    except Exception as e:
+                        # A worker that died (or could not start) does not fail the import
+                        log.warning(f"Parallel geometry decoding failed, decoding here: {e}")
+                        decoded.extend(decode_many(values, check))
+            return page_data, decoded
+
+        try:
+            submit(first)
+            for page_data in pages:
+                submit(page_data)
+                # Enough chunks stay queued to keep every worker busy, and no more
+                while len(pending) > 1 and sum(len(chunks) for _, chunks in pending) > workers * 2:
+                    yield collect()
+            while pending:
+                yield collect()
+        finally:
+            for _, chunks in pending:
+                for _, future in chunks:
+                    future.cancel()
+
+    def parse_page(self, page_data, use_geometry, first_index=0, stats=None, decoded=None):
+        # Every geometry is decoded exactly once; layer typing and features reuse the result.
+        # decoded holds the output of the parallel decode stage, when it ran, or of the bulk
+        # point path. Returns the ColumnPage of the rows kept, with their geometries.
+        stats = stats if stats is not None else {"missing": 0, "invalid": 0}
+        if not use_geometry:
+            page_data.geometries = [None] * len(page_data)
+            return page_data
+        kept = []
+        geometries = []
+        raw_geoms = page_data.column(self.geom_field) if self.geom_field in page_data.index else [""] * len(page_data)
+        with self.profiler.phase("geometry_decode"):
+            if decoded is None:
+                decoded = decode_points(raw_geoms)  # None unless the column holds plain points
+            for i, raw_geom in enumerate(raw_geoms, start=first_index):
+                if raw_geom is None:
+                    # Rows without coordinates are skipped
+                    stats["missing"] += 1
+                    continue
+
+                geom = None
+                try:
+                    if decoded is not None:
+                        geom = wrap_geometry(decoded[i - first_index], self.geometry_validation)
+                    else:
+                        geom = build_geometry(raw_geom, self.geometry_validation)
+                except GeometryError as e:
+                    if log.enabled(log.DEBUG):
+                        log.debug(f"Row {i + 1}: geometry parse error: {e}")
+
+                if not geom:
+                    geom = None
+                    stats["invalid"] += 1
+                    if log.enabled(log.DEBUG):
+                        log.debug(f"Row {i + 1}: invalid or unsupported geometry skipped: {str(raw_geom)[:200]}")
+
+                kept.append(i - first_index)
+                geometries.append(geom)
+        if len(kept) == len(page_data):
+            page_data.geometries = geometries
+            return page_data
+        return page_data.take(kept, geometries)
+
+    def load_field_schema(self):
+        # Settings saved before the schema was stored (or while it failed to load) have none;
+        # without it there is no keyset paging, typed columns or delta sync, so read it here
+        if self.field_schema:
+            return
+        client = get_client(self.instance_url, self.token)
+        fields = client.get_json(f"/fields/{self.collection}").get("data", [])
+        self.field_schema = field_schema_from(fields)
+        if any("." in f for f in self.selected_fields):
+            add_related_fields(client, self.collection, self.field_schema)
+        log.info(f"{self.collection}: read the schema of {len(fields)} fields")
+
+    def build_layers(self, force_refresh=False, task=None):
+        self.load_field_schema()
+        selected_fields = list(self.selected_fields)
+        layers = None
+        use_geometry = False
+        rows_read = 0
+        total = [None]
+        stats = {"missing": 0, "invalid": 0}
+        self.profiler = Profiler(self.collection)
+        field_schema = self.field_schema
+        client_filter = None
+        if not translate_expression(self.filter_expression)[1]:
+            # Directus only filtered a superset; the full expression decides
+            client_filter = ClientFilter(self.filter_expression, field_schema, self.geom_field)
+        primary_key, key_type = self.get_primary_key()
+        sync_fields = self.get_sync_fields()
+        synced_to = None
+        related = self.get_related_lookup()
+
+        def on_total(count):
+            total[0] = count
+
+        output = None
+        if self.output_format != "memory" and not self.preview_rows:
+            from .file_output import FileLayers, output_path, read_sync_metadata
+            output = output_path(self.get_output_folder(), self.output_name, self.output_format)
+            output_key = self.get_output_key(primary_key, sync_fields)
+
+        def make_layers(use_geometry):
+            # Add only selected attribute fields excluding geometry field
+            attribute_fields = [f for f in selected_fields if not use_geometry or f != self.geom_field]
+            # Files keep the primary key, so later imports can update them in place
+            keep_primary_key = output is not None or self.keep_primary_key
+            if keep_primary_key and primary_key and primary_key not in attribute_fields:
+                attribute_fields.append(primary_key)
+            if output is None:
+                name = f"{self.collection} (preview)" if self.preview_rows else self.collection
+                return ImportLayers(
+                    name, attribute_fields, use_geometry, self.geometry_mode, self.profiler, field_schema
+                )
+            return FileLayers(
+                self.collection, attribute_fields, use_geometry, self.geometry_mode, self.profiler,
+                field_schema, output, self.output_format, primary_key
+            )
+
+        pages = None
+        metadata = None if output is None or force_refresh else read_sync_metadata(output)
+        plan = self.output_plan(metadata, output_key, primary_key, sync_fields) if output else None
+        if plan == "reopen":
+            log.info(f"{self.collection}: opening {output}")
+            layers = make_layers(metadata.get("use_geometry", False))
+            layers.reopen(metadata)
+            self.synced_to = metadata.get("synced_to")
+            return layers
+        if plan == "update":
+            # Update the GeoPackage in place with the rows changed since the last import
+            log.info(f"{self.collection}: updating {output} with the changes since {metadata['synced_to']}")
+            use_geometry = metadata.get("use_geometry", False)
+            layers = make_layers(use_geometry)
+            layers.resume(metadata)
+            since = metadata["synced_to"]
+            client = get_client(self.instance_url, self.token)
+            _, fields_query, server_filter, _, _ = self.get_query(primary_key, sync_fields)
+            cursor = self.fetch_sync_cursor(client, f"/items/{self.collection}", sync_fields, server_filter)
+            synced_to = max(since, cursor or since)
+            pages = self.fetch_changes(
+                client, f"/items/{self.collection}", fields_query, since, sync_fields, server_filter
+            )
+
+        # Pages are converted and added to the layers as they arrive, so only a
+        # few pages are ever held in memory
+        from_fetch_data = pages is None
+        if from_fetch_data:
+            pages = self.fetch_data(force_refresh=force_refresh, on_total=on_total)
+        staged = self.decode_pages(pages, lambda: total[0])
+        try:
+            for page_data, decoded in staged:
+                if task and task.isCanceled():
+                    if output and layers is not None:
+                        layers.abort()
+                    return None
+                if layers is None:
+                    use_geometry = bool(self.geom_field) and self.geom_field in page_data.index
+                    log.debug(f"Row keys: {', '.join(page_data.names)}")
+                    layers = make_layers(use_geometry)
+
+                if output:
+                    if layers.append:
+                        layers.delete_keys(page_data.column(primary_key))
+                if related.relations:
+                    related.join(page_data, self.fetch_page, get_client(self.instance_url, self.token))
+                parsed = self.parse_page(page_data, use_geometry, rows_read, stats, decoded)
+                if client_filter:
+                    parsed = client_filter.apply(parsed)
+                layers.add(parsed)
+                rows_read += len(page_data)
+                log.debug(f"Imported page of {len(page_data)} rows ({rows_read} so far)")
+                if task and total[0]:
+                    task.setProgress(min(100.0, 100.0 * rows_read / total[0]))
+
+            if output and layers is not None and layers.append:
+                # Rows deleted on the server are only found by comparing ids, read (as in
+                # sync_cache) only when the row counts differ
+                client = get_client(self.instance_url, self.token)
+                server_filter = self.get_query(primary_key, sync_fields)[2]
+                total_count = self.fetch_total_count(client, f"/items/{self.collection}", server_filter)
+                deleted = 0
+                if total_count is None or layers.row_count() != total_count:
+                    ids = self.fetch_ids(
+                        client, f"/items/{self.collection}", primary_key, key_type, total_count, server_filter
+                    )
+                    deleted = layers.delete_missing(ids)
+                log.info(f"{self.collection}: {rows_read} changed rows, {deleted} deleted")
+        except BaseException:
+            if output and layers is not None:
+                layers.abort()
+            raise
+        finally:
+            staged.close()
+            pages.close()
+
+        if from_fetch_data:
+            synced_to = self.fetch_cursor
+        self.synced_to = synced_to
+        if layers is not None:
+            if output:
+                layers.finish(output_key, synced_to)
+            else:
+                layers.finish()
+        if stats["missing"] or stats["invalid"]:
+            log.info(
+                f"{self.collection}: {stats['missing']} rows without geometry skipped, "
+                f"{stats['invalid']} invalid or unsupported geometries imported without geometry"
+            )
+        self.report_profile(rows_read)
+        return layers
+
+    def get_output_folder(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        return self.output_folder
+
+    def output_files(self):
+        # Files written by a file output, as normalized paths: the output and those of its last import
+        if self.output_format == "memory" or self.preview_rows:
+            return set()
+        from .file_output import output_path, read_sync_metadata
+        output = output_path(self.get_output_folder(), self.output_name, self.output_format)
+        metadata = read_sync_metadata(output) or {}
+        files = [output] + [entry["file"] for entry in metadata.get("layers", [])]
+        return {os.path.normcase(os.path.abspath(f)) for f in files}
+
+    def output_plan(self, metadata, output_key, primary_key, sync_fields):
+        # What build_layers does with an existing output: "reopen" it as is, "update" it in
+        # place or "replace" it with a new file
+        if not metadata or metadata.get("key") != output_key:
+            return "replace"
+        if time.time() - metadata["fetched_at"] < self.cache_timeout_seconds:
+            return "reopen"
+        if self.output_format == "gpkg" and metadata.get("synced_to") and primary_key and sync_fields:
+            return "update"
+        return "replace"
+
+    def replaces_output(self, force_refresh=False):
+        # True when an import writes a new output file over the existing one. Decided from
+        # the files and the stored schema, without requests; without a schema it may.
+        if self.output_format == "memory" or self.preview_rows:
+            return False
+        if force_refresh or not self.field_schema:
+            return True
+        from .file_output import output_path, read_sync_metadata
+        metadata = read_sync_metadata(output_path(self.get_output_folder(), self.output_name, self.output_format))
+        primary_key, _ = self.get_primary_key()
+        sync_fields = self.get_sync_fields()
+        plan = self.output_plan(metadata, self.get_output_key(primary_key, sync_fields), primary_key, sync_fields)
+        return plan == "replace"
+
+    def get_output_key(self, primary_key, sync_fields):
+        # A file can only be reused when it was written with the same query and layer settings
+        request_fields, _, _, _, query_key = self.get_query(primary_key, sync_fields)
+        settings = [query_key, self.filter_expression, self.geom_field, self.geometry_mode, self.geometry_validation]
+        # Joined related fields are not part of the request, but they are columns of the file
+        joined = [f for f in self.selected_fields if f not in request_fields]
+        if joined:
+            settings.append(joined)
+        return cache_key(self.instance_url, self.collection, [], json.dumps(settings))
+
+    def report_profile(self, rows):
+        self.profiler.stop(rows)
+        log.info(self.profiler.summary())
+        if self.profile_folder:
+            folder = self.profile_folder
+            os.makedirs(folder, exist_ok=True)
+            name = f"{self.collection}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+            self.profiler.export_json(os.path.join(folder, name))
+            log.info(f"Import profile saved to {os.path.join(folder, name)}")
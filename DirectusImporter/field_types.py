@@ -0,0 +1,55 @@
+import json
+
+# Directus field types grouped by the kind of column they become
+FIELD_KINDS = {
+    "integer": "int",
+    "bigInteger": "int64",
+    "float": "double",
+    "decimal": "double",
+    "boolean": "bool",
+    "date": "date",
+    "dateTime": "datetime",
+    "timestamp": "datetime",
+    "time": "time",
+    "json": "json",
+    "csv": "json",
+}
+
+
+def field_kind(directus_type):
+    return FIELD_KINDS.get(directus_type, "string")
+
+
+def to_text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "1", "yes")
+    return bool(value)
+
+
+# Plain Python converters; date and time kinds stay ISO strings here and are
+# turned into Qt or OGR values by the caller
+PYTHON_CONVERTERS = {
+    "int": int,
+    "int64": int,
+    "double": float,
+    "bool": to_bool,
+    "json": to_text,
+    "string": to_text,
+    "date": to_text,
+    "datetime": to_text,
+    "time": to_text,
+}
+
+
+def field_kinds(names, field_schema):
+    return [field_kind((field_schema.get(name) or {}).get("type")) for name in names]
@@ -0,0 +1,369 @@
+import json
+import os
+import time
+
+from osgeo import ogr, osr
+from qgis.core import QgsVectorLayer, QgsWkbTypes
+
+from .engine import ImportLayers, GEOMETRY_FAMILY_NAMES
+from .field_types import PYTHON_CONVERTERS, field_kinds
+from . import log
+
+ogr.UseExceptions()
+
+# Output targets: OGR driver and file extension
+FORMATS = {
+    "gpkg": ("GPKG", ".gpkg"),
+    "fgb": ("FlatGeobuf", ".fgb"),
+}
+
+OGR_FIELD_TYPES = {
+    "int": (ogr.OFTInteger, ogr.OFSTNone),
+    "int64": (ogr.OFTInteger64, ogr.OFSTNone),
+    "double": (ogr.OFTReal, ogr.OFSTNone),
+    "bool": (ogr.OFTInteger, ogr.OFSTBoolean),
+    "date": (ogr.OFTDate, ogr.OFSTNone),
+    "datetime": (ogr.OFTDateTime, ogr.OFSTNone),
+    "time": (ogr.OFTTime, ogr.OFSTNone),
+    "json": (ogr.OFTString, getattr(ogr, "OFSTJSON", ogr.OFSTNone)),  # GDAL >= 3.3
+    "string": (ogr.OFTString, ogr.OFSTNone),
+}
+GEOMETRY_COLUMN = "geom"
+DETAIL_LEVELS_ITEM = "DIRECTUS_DETAIL_LEVELS"  # layer metadata: scales of the copies and the state they were built from
+
+
+def output_path(folder, collection, output_format):
+    return os.path.join(folder, collection + FORMATS[output_format][1])
+
+
+def partial_path(path):
+    # Keeps the extension, which OGR drivers use to pick the file layout
+    base, ext = os.path.splitext(path)
+    return f"{base}.partial{ext}"
+
+
+def metadata_path(path):
+    return path + ".sync.json"
+
+
+def read_sync_metadata(path):
+    # Written next to the output after every successful import; files without it are not reused
+    try:
+        with open(metadata_path(path), encoding="utf-8") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    files = {entry["file"] for entry in metadata.get("layers", [])}
+    if not files or not all(os.path.exists(f) for f in files):
+        return None
+    return metadata
+
+
+def ogr_value(value, kind):
+    value = PYTHON_CONVERTERS[kind](value)
+    return int(value) if kind == "bool" else value
+
+
+class FileLayers(ImportLayers):
+    """ImportLayers written to a GeoPackage or FlatGeobuf file through OGR.
+
+    Each page is written in one transaction and the spatial index is built once
+    the data is loaded. A full import is written to a temporary file that only
+    replaces the previous output in finish(). After resume() an existing
+    GeoPackage is updated in place instead, rows being replaced by primary key.
+    """
+
+    def __init__(self, name, attribute_fields, use_geometry, mode, profiler, field_schema,
+                 path, output_format, primary_key=None):
+        super().__init__(name, attribute_fields, use_geometry, mode, profiler, field_schema)
+        self.path = path
+        self.output_format = output_format
+        self.driver = ogr.GetDriverByName(FORMATS[output_format][0])
+        self.primary_key = primary_key
+        self.kinds = list(zip(attribute_fields, field_kinds(attribute_fields, field_schema or {})))
+        self.srs = osr.SpatialReference()
+        self.srs.ImportFromEPSG(4326)
+        self.srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        self.append = False
+        self.datasets = {}  # file -> OGR dataset
+        self.outputs = {}  # layer key -> output description saved in the sync metadata
+        self.new_layers = []
+
+    def resume(self, metadata):
+        # Continue writing into the layers of a previous import
+        self.append = True
+        for entry in metadata["layers"]:
+            ds = self.open_dataset(entry["file"])
+            self.outputs[entry["key"]] = entry
+            self.layers[entry["key"]] = (ds.GetLayerByName(entry["name"]), entry["file"], entry["wkb_type"])
+
+    def reopen(self, metadata):
+        # An up-to-date output is used as is, without touching the network
+        self.outputs = {entry["key"]: entry for entry in metadata["layers"]}
+        self.reopened = True
+        return self.open_layers()
+
+    def target_file(self, suffix):
+        # GeoPackage holds every layer, FlatGeobuf has one file per layer
+        if self.output_format == "gpkg":
+            return self.path
+        base, ext = os.path.splitext(self.path)
+        return f"{base}{suffix}{ext}"
+
+    def open_dataset(self, filename):
+        ds = self.datasets.get(filename)
+        if ds is None:
+            if os.path.exists(filename) and self.append:
+                ds = ogr.Open(filename, update=1)
+            else:
+                # A full import starts from an empty file, never from the partial file of a crashed one
+                if os.path.exists(filename):
+                    self.driver.DeleteDataSource(filename)
+                for leftover in (filename + "-wal", filename + "-shm"):
+                    if os.path.exists(leftover):
+                        os.remove(leftover)
+                ds = self.driver.CreateDataSource(filename)
+            self.datasets[filename] = ds
+        return ds
+
+    def create(self, key, wkb_type, suffix=""):
+        family = GEOMETRY_FAMILY_NAMES.get(key)
+        name_suffix = f"_{family}" if family else ("_no_geometry" if suffix else "")
+        layer_name = f"{self.name}{name_suffix}"
+        final_file = self.target_file(name_suffix)
+        filename = final_file if self.append else partial_path(final_file)
+        ds = self.open_dataset(filename)
+        options = ["SPATIAL_INDEX=NO", f"GEOMETRY_NAME={GEOMETRY_COLUMN}"] if self.output_format == "gpkg" else []
+        ogr_layer = ds.CreateLayer(
+            layer_name, self.srs if wkb_type is not None else None,
+            int(wkb_type) if wkb_type is not None else ogr.wkbNone, options
+        )
+        for name, kind in self.kinds:
+            field_type, subtype = OGR_FIELD_TYPES[kind]
+            field = ogr.FieldDefn(name, field_type)
+            field.SetSubType(subtype)
+            ogr_layer.CreateField(field)
+
+        self.outputs[key] = {
+            "key": key, "name": layer_name, "file": final_file, "suffix": suffix,
+            "wkb_type": int(wkb_type) if wkb_type is not None else None,
+        }
+        self.new_layers.append(key)
+        self.layers[key] = (ogr_layer, filename, wkb_type)
+        return self.layers[key]
+
+    def detail_level_name(self, key, scale):
+        return f"{self.outputs[key]['name']}_{scale}"
+
+    def create_detail_level(self, key, scale):
+        # Simplified copies are tables of the GeoPackage, so projects saved with them keep drawing
+        # them; FlatGeobuf holds one layer per file and gets no copies
+        if self.output_format != "gpkg":
+            return None
+        entry = self.outputs[key]
+        name = self.detail_level_name(key, scale)
+        ds = ogr.Open(entry["file"], update=1)
+        source = ds.GetLayerByName(entry["name"])
+        ogr_layer = ds.CreateLayer(
+            name, source.GetSpatialRef(), source.GetGeomType(), ["OVERWRITE=YES", f"GEOMETRY_NAME={GEOMETRY_COLUMN}"]
+        )
+        definition = source.GetLayerDefn()
+        for i in range(definition.GetFieldCount()):
+            ogr_layer.CreateField(definition.GetFieldDefn(i))
+        del source, ogr_layer, ds  # closes the file before QGIS opens the table
+        layer = self.layers[key][0]
+        return QgsVectorLayer(f"{entry['file']}|layername={name}", f"{layer.name()} (1:{scale})", "ogr")
+
+    def remove_detail_level(self, key, scale):
+        # Also drops a copy left by an earlier import
+        ds = ogr.Open(self.outputs[key]["file"], update=1)
+        name = self.detail_level_name(key, scale)
+        for i in range(ds.GetLayerCount()):
+            if ds.GetLayerByIndex(i).GetName() == name:
+                ds.DeleteLayer(i)
+                break
+
+    def source_state(self, ds, name):
+        # Row count and highest fid; rows written by an in-place update get new fids
+        fid_column = ds.GetLayerByName(name).GetFIDColumn() or "fid"
+        result = ds.ExecuteSQL(f'SELECT COUNT(*), MAX("{fid_column}") FROM "{name}"')
+        feature = result.GetNextFeature()
+        state = [feature.GetField(0), feature.GetField(1)]
+        ds.ReleaseResultSet(result)
+        return state
+
+    def stored_detail_levels(self, key):
+        # Copies built from the same rows by an earlier import or reopen are used as they are
+        if self.output_format != "gpkg":
+            return None
+        entry = self.outputs[key]
+        ds = ogr.Open(entry["file"])
+        try:
+            stored = json.loads(ds.GetLayerByName(entry["name"]).GetMetadataItem(DETAIL_LEVELS_ITEM) or "null")
+        except ValueError:
+            stored = None
+        if not stored or stored.get("source") != self.source_state(ds, entry["name"]):
+            return None
+        if any(ds.GetLayerByName(self.detail_level_name(key, scale)) is None for scale in stored["scales"]):
+            return None
+        del ds
+        name = self.layers[key][0].name()
+        return [
+            (QgsVectorLayer(f"{entry['file']}|layername={self.detail_level_name(key, scale)}",
+                            f"{name} (1:{scale})", "ogr"), scale)
+            for scale in stored["scales"]
+        ]
+
+    def store_detail_levels(self, key, scales):
+        if self.output_format != "gpkg":
+            return
+        entry = self.outputs[key]
+        ds = ogr.Open(entry["file"], update=1)
+        stored = {"source": self.source_state(ds, entry["name"]), "scales": scales}
+        ds.GetLayerByName(entry["name"]).SetMetadataItem(DETAIL_LEVELS_ITEM, json.dumps(stored))
+
+    def insert(self, entry, page):
+        ogr_layer, filename, wkb_type = entry
+        ds = self.datasets[filename]
+        definition = ogr_layer.GetLayerDefn()
+        transaction = ds.TestCapability(ogr.ODsCTransactions)
+        with self.profiler.phase("provider_insert"):
+            if transaction:
+                ds.StartTransaction()
+            columns = [(page.column(name), kind) for name, kind in self.kinds]
+            for r, geom in enumerate(page.geometries):
+                feature = ogr.Feature(definition)
+                for i, (values, kind) in enumerate(columns):
+                    value = values[r]
+                    if value is not None:
+                        try:
+                            feature.SetField(i, ogr_value(value, kind))
+                        except (TypeError, ValueError):
+                            pass
+                if geom is not None and wkb_type is not None:
+                    if self.accepts(geom, wkb_type):
+                        if QgsWkbTypes.isMultiType(wkb_type) and not geom.isMultipart():
+                            geom.convertToMultiType()
+                        feature.SetGeometryDirectly(ogr.CreateGeometryFromWkb(bytes(geom.asWkb())))
+                    else:
+                        self.dropped += 1
+                ogr_layer.CreateFeature(feature)
+            if transaction:
+                ds.CommitTransaction()
+        self.imported += len(page)
+
+    def accepts(self, geom, wkb_type):
+        if QgsWkbTypes.geometryType(geom.wkbType()) != QgsWkbTypes.geometryType(wkb_type):
+            return False
+        return self.mode != "single" or geom.wkbType() == wkb_type
+
+    def delete_keys(self, keys):
+        # Rows about to be written again (or gone from the server) are removed first
+        keys = [k for k in keys if k is not None]
+        if not keys or not self.primary_key:
+            return
+        for ogr_layer, filename, _ in self.layers.values():
+            ds = self.datasets[filename]
+            transaction = ds.TestCapability(ogr.ODsCTransactions)
+            if transaction:
+                ds.StartTransaction()
+            for i in range(0, len(keys), 500):
+                values = ",".join(
+                    str(k) if isinstance(k, (int, float)) else "'" + str(k).replace("'", "''") + "'"
+                    for k in keys[i:i + 500]
+                )
+                ogr_layer.SetAttributeFilter(f'"{self.primary_key}" IN ({values})')
+                fids = [feature.GetFID() for feature in ogr_layer]
+                for fid in fids:
+                    ogr_layer.DeleteFeature(fid)
+            ogr_layer.SetAttributeFilter(None)
+            if transaction:
+                ds.CommitTransaction()
+
+    def row_count(self):
+        return sum(ogr_layer.GetFeatureCount() for ogr_layer, _, _ in self.layers.values())
+
+    def delete_missing(self, keep_keys):
+        keep_keys = {str(k) for k in keep_keys}
+        stale = []
+        for ogr_layer, _, _ in self.layers.values():
+            ogr_layer.ResetReading()
+            for feature in ogr_layer:
+                value = feature.GetField(self.primary_key)
+                if value is not None and str(value) not in keep_keys:
+                    stale.append(value)
+        self.delete_keys(stale)
+        return len(stale)
+
+    def finish(self, key=None, synced_to=None):
+        if self.pending:
+            entry = self.create(None, None)
+            for page in self.pending:
+                self.insert(entry, page)
+            self.pending = []
+
+        # Index once the data is in: much faster than maintaining it row by row
+        if self.output_format == "gpkg":
+            for layer_key in self.new_layers:
+                ogr_layer, filename, wkb_type = self.layers[layer_key]
+                if wkb_type is not None:
+                    ds = self.datasets[filename]
+                    result = ds.ExecuteSQL(f"SELECT CreateSpatialIndex('{ogr_layer.GetName()}', '{GEOMETRY_COLUMN}')")
+                    if result is not None:
+                        ds.ReleaseResultSet(result)
+        self.close()
+        if not self.append:
+            for filename in {entry["file"] for entry in self.outputs.values()}:
+                os.replace(partial_path(filename), filename)
+
+        metadata = {
+            "key": key,
+            "synced_to": synced_to,
+            "fetched_at": time.time(),
+            "use_geometry": self.use_geometry,
+            "layers": list(self.outputs.values()),
+        }
+        with open(metadata_path(self.path), "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        return self.open_layers()
+
+    def open_layers(self):
+        # Swap the OGR handles for QGIS layers on the written files
+        entries = list(self.outputs.values())
+        self.layers = {}
+        for entry in entries:
+            source = entry["file"]
+            if self.output_format == "gpkg":
+                source += f"|layername={entry['name']}"
+            suffix = entry["suffix"] if len(entries) > 1 else ""
+            layer = QgsVectorLayer(source, f"Directus: {self.name}{suffix}", "ogr")
+            if not layer.isValid():
+                log.warning(f"Could not open {source}")
+                continue
+            self.layers[entry["key"]] = (layer, layer.dataProvider(), entry["wkb_type"])
+        return [entry[0] for entry in self.layers.values()]
+
+    def close(self):
+        # OGR layers keep their dataset open; drop them first so the files are
+        # complete (FlatGeobuf writes its index on close) before they are moved
+        self.layers = {}
+        for ds in self.datasets.values():
+            ds.FlushCache()
+        self.datasets = {}
+
+    def abort(self):
+        for ds in self.datasets.values():
+            if ds.TestCapability(ogr.ODsCTransactions):
+                try:
+                    ds.RollbackTransaction()
+                except RuntimeError:
+                    pass
+        partial = [] if self.append else list(self.datasets)
+        self.datasets = {}
+        self.layers = {}
+        for filename in partial:
+            try:
+                self.driver.DeleteDataSource(filename)
+            except RuntimeError:
+                pass
+
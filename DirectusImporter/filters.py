@@ -0,0 +1,234 @@
+import json
+from urllib.parse import quote
+
+from qgis.PyQt.QtCore import QDate, QDateTime, QTime
+from qgis.core import (
+    QgsExpression,
+    QgsExpressionNode,
+    QgsExpressionNodeBinaryOperator,
+    QgsExpressionNodeUnaryOperator,
+)
+
+# Translates the parts of a QGIS expression that Directus can evaluate into a
+# Directus filter object. Whatever cannot be translated is left to the client.
+
+COMPARISONS = {
+    QgsExpressionNodeBinaryOperator.boEQ: "_eq",
+    QgsExpressionNodeBinaryOperator.boNE: "_neq",
+    QgsExpressionNodeBinaryOperator.boLT: "_lt",
+    QgsExpressionNodeBinaryOperator.boLE: "_lte",
+    QgsExpressionNodeBinaryOperator.boGT: "_gt",
+    QgsExpressionNodeBinaryOperator.boGE: "_gte",
+}
+# Same comparison with the operands swapped: 5 < "x"  ->  "x" > 5
+FLIPPED = {"_eq": "_eq", "_neq": "_neq", "_lt": "_gt", "_lte": "_gte", "_gt": "_lt", "_gte": "_lte"}
+NEGATED = {
+    "_eq": "_neq", "_neq": "_eq", "_lt": "_gte", "_lte": "_gt", "_gt": "_lte", "_gte": "_lt",
+    "_in": "_nin", "_nin": "_in", "_null": "_nnull", "_nnull": "_null",
+    "_contains": "_ncontains", "_ncontains": "_contains",
+    "_icontains": "_nicontains", "_nicontains": "_icontains",
+    "_between": "_nbetween", "_nbetween": "_between",
+}
+# Functions whose single literal argument can be sent as is (dates are ISO strings for Directus)
+PASSTHROUGH_FUNCTIONS = {"to_date", "to_datetime", "to_time", "to_int", "to_real", "to_string", "to_decimal"}
+
+
+class Untranslatable(Exception):
+    pass
+
+
+def translate_expression(text):
+    """Split a QGIS expression into a Directus filter and a client-side remainder.
+
+    Returns (filter, exact): filter is a Directus filter dict (or None when
+    nothing could be pushed down) and exact tells whether it selects exactly
+    the rows of the expression. When it is not exact the server filter is a
+    superset and the full expression still has to be evaluated on the client.
+    """
+    text = (text or "").strip()
+    if not text:
+        return None, True
+    expression = QgsExpression(text)
+    if expression.hasParserError() or expression.rootNode() is None:
+        raise ValueError(expression.parserErrorString() or "Invalid expression")
+    conditions, exact = _split_and(expression.rootNode())
+    if not conditions:
+        return None, False
+    conditions = [_nest(c) for c in conditions]
+    server_filter = conditions[0] if len(conditions) == 1 else {"_and": conditions}
+    return server_filter, exact
+
+
+def filter_query(*conditions):
+    # All filters of a request are merged into one JSON filter parameter
+    conditions = [c for c in conditions if c]
+    if not conditions:
+        return ""
+    combined = conditions[0] if len(conditions) == 1 else {"_and": conditions}
+    return "&filter=" + quote(json.dumps(combined, separators=(",", ":")))
+
+
+def _split_and(node):
+    # Top-level AND terms are pushed down one by one, so a single untranslatable
+    # term does not keep the others from narrowing the download
+    if _is_binary(node, QgsExpressionNodeBinaryOperator.boAnd):
+        left, left_exact = _split_and(node.opLeft())
+        right, right_exact = _split_and(node.opRight())
+        return left + right, left_exact and right_exact
+    try:
+        return [_translate(node)], True
+    except Untranslatable:
+        return [], False
+
+
+def _is_binary(node, op):
+    return node.nodeType() == QgsExpressionNode.ntBinaryOperator and node.op() == op
+
+
+def _translate(node):
+    node_type = node.nodeType()
+
+    if node_type == QgsExpressionNode.ntBinaryOperator:
+        op = node.op()
+        if op == QgsExpressionNodeBinaryOperator.boAnd:
+            return {"_and": [_translate(node.opLeft()), _translate(node.opRight())]}
+        if op == QgsExpressionNodeBinaryOperator.boOr:
+            return {"_or": [_translate(node.opLeft()), _translate(node.opRight())]}
+        if op in COMPARISONS:
+            return _comparison(node.opLeft(), node.opRight(), COMPARISONS[op])
+        if op in (QgsExpressionNodeBinaryOperator.boIs, QgsExpressionNodeBinaryOperator.boIsNot):
+            field = _column(node.opLeft())
+            if _literal(node.opRight()) is not None:
+                raise Untranslatable()
+            null_op = "_null" if op == QgsExpressionNodeBinaryOperator.boIs else "_nnull"
+            return {field: {null_op: True}}
+        if op in (
+            QgsExpressionNodeBinaryOperator.boLike,
+            QgsExpressionNodeBinaryOperator.boNotLike,
+            QgsExpressionNodeBinaryOperator.boILike,
+            QgsExpressionNodeBinaryOperator.boNotILike,
+        ):
+            return _like(node.opLeft(), node.opRight(), op)
+        raise Untranslatable()
+
+    if node_type == QgsExpressionNode.ntUnaryOperator:
+        if node.op() != QgsExpressionNodeUnaryOperator.uoNot:
+            raise Untranslatable()
+        return _negate(_translate(node.operand()))
+
+    if node_type == QgsExpressionNode.ntInOperator:
+        field = _column(node.node())
+        values = [_literal(item) for item in node.list().list()]
+        return {field: {"_nin" if node.isNotIn() else "_in": values}}
+
+    if node_type == getattr(QgsExpressionNode, "ntBetweenOperator", None):
+        field = _column(node.node())
+        between = "_nbetween" if node.negate() else "_between"
+        return {field: {between: [_literal(node.lowerBound()), _literal(node.higherBound())]}}
+
+    raise Untranslatable()
+
+
+def _comparison(left, right, op):
+    if left.nodeType() == QgsExpressionNode.ntColumnRef:
+        field, value = _column(left), _literal(right)
+    elif right.nodeType() == QgsExpressionNode.ntColumnRef:
+        field, value, op = _column(right), _literal(left), FLIPPED[op]
+    else:
+        raise Untranslatable()
+    if value is None:
+        # Comparing with NULL is never true in QGIS; let the client decide
+        raise Untranslatable()
+    return {field: {op: value}}
+
+
+def _like(left, right, op):
+    field = _column(left)
+    pattern = _literal(right)
+    if not isinstance(pattern, str):
+        raise Untranslatable()
+    insensitive = op in (QgsExpressionNodeBinaryOperator.boILike, QgsExpressionNodeBinaryOperator.boNotILike)
+    negated = op in (QgsExpressionNodeBinaryOperator.boNotLike, QgsExpressionNodeBinaryOperator.boNotILike)
+
+    inner = pattern
+    starts = inner.startswith("%")
+    ends = inner.endswith("%") and len(inner) > 1
+    inner = inner[1 if starts else 0:len(inner) - (1 if ends else 0)]
+    if "%" in inner or "_" in inner or "\\" in inner:
+        raise Untranslatable()
+
+    if starts and ends:
+        condition = {"_icontains" if insensitive else "_contains": inner}
+    elif not insensitive and ends:
+        condition = {"_starts_with": inner}
+    elif not insensitive and starts:
+        condition = {"_ends_with": inner}
+    elif not insensitive:
+        condition = {"_eq": inner}
+    else:
+        raise Untranslatable()
+    result = {field: condition}
+    return _negate(result) if negated else result
+
+
+def _negate(condition):
+    if "_and" in condition:
+        return {"_or": [_negate(c) for c in condition["_and"]]}
+    if "_or" in condition:
+        return {"_and": [_negate(c) for c in condition["_or"]]}
+    (field, ops), = condition.items()
+    (op, value), = ops.items()
+    if op not in NEGATED:
+        raise Untranslatable()
+    return {field: {NEGATED[op]: value}}
+
+
+def _nest(condition):
+    # Related fields ("region.name") are filtered through nested objects: {"region": {"name": ...}}
+    nested = {}
+    for key, value in condition.items():
+        if key in ("_and", "_or"):
+            nested[key] = [_nest(c) for c in value]
+        elif "." in key:
+            for part in reversed(key.split(".")[1:]):
+                value = {part: value}
+            nested[key.split(".")[0]] = value
+        else:
+            nested[key] = value
+    return nested
+
+
+def _column(node):
+    if node.nodeType() != QgsExpressionNode.ntColumnRef:
+        raise Untranslatable()
+    return node.name()
+
+
+def _literal(node):
+    node_type = node.nodeType()
+    if node_type == QgsExpressionNode.ntLiteral:
+        return _json_value(node.value())
+    if node_type == QgsExpressionNode.ntUnaryOperator and node.op() == QgsExpressionNodeUnaryOperator.uoMinus:
+        value = _literal(node.operand())
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return -value
+    if node_type == QgsExpressionNode.ntFunction:
+        name = QgsExpression.Functions()[node.fnIndex()].name()
+        args = node.args().list() if node.args() else []
+        if name in PASSTHROUGH_FUNCTIONS and len(args) == 1:
+            return _literal(args[0])
+    raise Untranslatable()
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, QDateTime):
+        return value.toString("yyyy-MM-ddTHH:mm:ss")
+    if isinstance(value, QDate):
+        return value.toString("yyyy-MM-dd")
+    if isinstance(value, QTime):
+        return value.toString("HH:mm:ss")
+    if hasattr(value, "isNull") and value.isNull():
+        return None
+    raise Untranslatable()
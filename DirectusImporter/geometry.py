@@ -0,0 +1,329 @@
+import re
+import struct
+
+# Pure-Python GeoJSON -> WKB encoder. Building the WKB directly avoids the
+# json.dumps -> OGR -> WKT -> QgsGeometry.fromWkt round trip for every feature.
+
+WKB_TYPES = {
+    "Point": 1,
+    "LineString": 2,
+    "Polygon": 3,
+    "MultiPoint": 4,
+    "MultiLineString": 5,
+    "MultiPolygon": 6,
+    "GeometryCollection": 7,
+}
+Z_OFFSET = 1000  # ISO WKB: PointZ = 1001, ...
+
+# Validation levels, from cheapest to most thorough
+VALIDATE_NONE = "none"  # accept whatever decodes
+VALIDATE_BASIC = "basic"  # structural checks done while encoding (closed rings, enough vertices)
+VALIDATE_GEOS = "geos"  # full GEOS validity check on the built geometry
+
+_header = struct.Struct("<BI")
+_count = struct.Struct("<I")
+_point_xy = struct.Struct("<BIdd")
+_point_xyz = struct.Struct("<BIddd")
+
+
+class GeometryError(ValueError):
+    pass
+
+
+def point_wkb(x, y):
+    return _point_xy.pack(1, 1, x, y)
+
+
+def points_to_wkb(pairs):
+    """Bulk fast path for sequences of [x, y] pairs; invalid pairs give None."""
+    pack = _point_xy.pack
+    result = []
+    for pair in pairs:
+        try:
+            result.append(pack(1, 1, float(pair[0]), float(pair[1])))
+        except (TypeError, ValueError, IndexError):
+            result.append(None)
+    return result
+
+
+def _has_z(coordinates, depth):
+    # Look at the first position to decide between XY and XYZ
+    for _ in range(depth):
+        if not coordinates:
+            return False
+        coordinates = coordinates[0]
+    return len(coordinates) > 2
+
+
+def _pack_positions(positions, dims):
+    count = len(positions)
+    if dims == 3:
+        flat = [float(c) for p in positions for c in (p[0], p[1], p[2] if len(p) > 2 else 0.0)]
+    else:
+        flat = [float(c) for p in positions for c in (p[0], p[1])]
+    return _count.pack(count) + struct.pack(f"<{count * dims}d", *flat)
+
+
+def _check_line(positions, check):
+    if check and len(positions) < 2:
+        raise GeometryError("LineString needs at least 2 positions")
+
+
+def _check_ring(ring, check):
+    if check:
+        if len(ring) < 4:
+            raise GeometryError("Polygon ring needs at least 4 positions")
+        if list(ring[0][:2]) != list(ring[-1][:2]):
+            raise GeometryError("Polygon ring is not closed")
+
+
+def _pack_polygon(rings, dims, check):
+    parts = [_count.pack(len(rings))]
+    for ring in rings:
+        _check_ring(ring, check)
+        parts.append(_pack_positions(ring, dims))
+    return b"".join(parts)
+
+
+def _encode(geojson, check):
+    geom_type = geojson.get("type")
+    if geom_type == "GeometryCollection":
+        members = [_encode(g, check) for g in geojson.get("geometries") or []]
+        return _header.pack(1, 7) + _count.pack(len(members)) + b"".join(members)
+
+    coordinates = geojson.get("coordinates")
+    if geom_type not in WKB_TYPES or coordinates is None:
+        raise GeometryError(f"Unsupported GeoJSON geometry: {geom_type}")
+
+    depth = {"Point": 0, "LineString": 1, "MultiPoint": 1, "Polygon": 2, "MultiLineString": 2, "MultiPolygon": 3}[geom_type]
+    dims = 3 if _has_z(coordinates, depth) else 2
+    z = Z_OFFSET if dims == 3 else 0
+    wkb_type = WKB_TYPES[geom_type] + z
+
+    if geom_type == "Point":
+        if dims == 3:
+            return _point_xyz.pack(1, wkb_type, float(coordinates[0]), float(coordinates[1]), float(coordinates[2]))
+        return _point_xy.pack(1, wkb_type, float(coordinates[0]), float(coordinates[1]))
+
+    header = _header.pack(1, wkb_type)
+    if geom_type == "LineString":
+        _check_line(coordinates, check)
+        return header + _pack_positions(coordinates, dims)
+    if geom_type == "Polygon":
+        return header + _pack_polygon(coordinates, dims, check)
+
+    parts = [header, _count.pack(len(coordinates))]
+    if geom_type == "MultiPoint":
+        point_struct = _point_xyz if dims == 3 else _point_xy
+        for p in coordinates:
+            values = [float(c) for c in p[:dims]]
+            parts.append(point_struct.pack(1, 1 + z, *values))
+    elif geom_type == "MultiLineString":
+        for line in coordinates:
+            _check_line(line, check)
+            parts.append(_header.pack(1, 2 + z) + _pack_positions(line, dims))
+    else:
+        for polygon in coordinates:
+            parts.append(_header.pack(1, 3 + z) + _pack_polygon(polygon, dims, check))
+    return b"".join(parts)
+
+
+def geojson_to_wkb(geojson, check=False):
+    """Encode a GeoJSON geometry dict as little-endian ISO WKB.
+
+    With check=True rings and lines are checked for closure and vertex
+    count and a GeometryError is raised for malformed input.
+    """
+    try:
+        return _encode(geojson, check)
+    except GeometryError:
+        raise
+    except (TypeError, ValueError, IndexError, KeyError, AttributeError, struct.error) as e:
+        raise GeometryError(f"Malformed GeoJSON coordinates: {e}")
+
+
+def decode(raw_geom, check=False):
+    """Turn a Directus geometry value into ("wkb", bytes) or ("wkt", str).
+
+    Handles GeoJSON dicts, [lon, lat] pairs and WKT strings; returns None for
+    empty or unsupported values and raises GeometryError for malformed ones.
+    """
+    if raw_geom is None or raw_geom == "":
+        return None
+    if isinstance(raw_geom, dict) and "type" in raw_geom:
+        return "wkb", geojson_to_wkb(raw_geom, check)
+    if isinstance(raw_geom, (list, tuple)) and len(raw_geom) == 2:
+        try:
+            return "wkb", point_wkb(float(raw_geom[0]), float(raw_geom[1]))
+        except (TypeError, ValueError) as e:
+            raise GeometryError(f"Invalid coordinate pair: {e}")
+    if isinstance(raw_geom, str):
+        return "wkt", raw_geom
+    return None
+
+
+def count_positions(raw_geom):
+    """Rough number of coordinate positions in a geometry value, to estimate decoding cost."""
+    if isinstance(raw_geom, str):
+        return raw_geom.count(",") + 1
+    if isinstance(raw_geom, dict):
+        if raw_geom.get("type") == "GeometryCollection":
+            return sum(count_positions(g) for g in raw_geom.get("geometries") or [])
+        raw_geom = raw_geom.get("coordinates")
+    if not isinstance(raw_geom, (list, tuple)) or not raw_geom:
+        return 0
+    if not isinstance(raw_geom[0], (list, tuple)):
+        return 1
+    return sum(count_positions(part) for part in raw_geom)
+
+
+_wkt_token = re.compile(r"\s*(?:([A-Za-z]+)|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)|([(),]))")
+_wkt_names = {name.upper(): name for name in WKB_TYPES}
+
+
+class _WktParser:
+    # WKT -> GeoJSON-like dict, for the types geojson_to_wkb encodes; anything
+    # else (EMPTY, M values, curves, EWKT prefixes) raises GeometryError
+
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        text = text.rstrip()
+        while position < len(text):
+            match = _wkt_token.match(text, position)
+            if not match:
+                raise GeometryError("Unsupported WKT")
+            word, number, symbol = match.groups()
+            if word:
+                self.tokens.append(("word", word.upper()))
+            elif number:
+                self.tokens.append(("number", float(number)))
+            else:
+                self.tokens.append((symbol, symbol))
+            position = match.end()
+        self.cursor = 0
+
+    def next(self, expected=None):
+        if self.cursor >= len(self.tokens):
+            raise GeometryError("Truncated WKT")
+        kind, value = self.tokens[self.cursor]
+        if expected and kind != expected:
+            raise GeometryError(f"Expected {expected} in WKT")
+        self.cursor += 1
+        return value
+
+    def peek(self):
+        return self.tokens[self.cursor][0] if self.cursor < len(self.tokens) else None
+
+    def geometry(self):
+        geom_type = _wkt_names.get(self.next("word"))
+        if geom_type is None:
+            raise GeometryError("Unsupported WKT geometry type")
+        if self.peek() == "word":
+            if self.next() != "Z":
+                raise GeometryError("Only XY and XYZ WKT geometries are supported")
+        if geom_type == "GeometryCollection":
+            return {"type": geom_type, "geometries": self.sequence(self.geometry)}
+        reader = {
+            "Point": self.position_group,
+            "LineString": self.positions,
+            "Polygon": self.rings,
+            "MultiPoint": lambda: self.sequence(self.multipoint_member),
+            "MultiLineString": lambda: self.sequence(self.positions),
+            "MultiPolygon": lambda: self.sequence(self.rings),
+        }[geom_type]
+        return {"type": geom_type, "coordinates": reader()}
+
+    def sequence(self, item):
+        self.next("(")
+        items = [item()]
+        while self.peek() == ",":
+            self.next()
+            items.append(item())
+        self.next(")")
+        return items
+
+    def position(self):
+        values = [self.next("number")]
+        while self.peek() == "number":
+            values.append(self.next())
+        return values
+
+    def position_group(self):
+        self.next("(")
+        position = self.position()
+        self.next(")")
+        return position
+
+    def multipoint_member(self):
+        # MULTIPOINT ((1 2), (3 4)) and MULTIPOINT (1 2, 3 4) are both valid
+        return self.position_group() if self.peek() == "(" else self.position()
+
+    def positions(self):
+        return self.sequence(self.position)
+
+    def rings(self):
+        return self.sequence(self.positions)
+
+    def parse(self):
+        geometry = self.geometry()
+        if self.cursor != len(self.tokens):
+            raise GeometryError("Trailing characters in WKT")
+        return geometry
+
+
+def wkt_to_wkb(text, check=False):
+    """Encode a WKT string as ISO WKB without QGIS, for decoding in worker processes.
+
+    Raises GeometryError for what it cannot read; QGIS still parses those.
+    """
+    return geojson_to_wkb(_WktParser(text).parse(), check)
+
+
+def decode_points(raw_geoms):
+    """decode_many() for a column holding only [lon, lat] pairs or 2D GeoJSON points.
+
+    Returns None for any other column. Point columns are packed in one go by
+    points_to_wkb, without decode()'s dispatch on every value.
+    """
+    pairs = []
+    for raw_geom in raw_geoms:
+        if type(raw_geom) is dict:
+            if raw_geom.get("type") != "Point":
+                return None
+            raw_geom = raw_geom.get("coordinates")
+        if raw_geom is None or raw_geom == "":
+            pairs.append(None)
+        elif isinstance(raw_geom, (list, tuple)) and len(raw_geom) == 2:
+            pairs.append(raw_geom)
+        else:
+            return None
+    return [
+        None if pair is None else ("wkb", wkb) if wkb is not None else ("error", "Invalid coordinate pair")
+        for pair, wkb in zip(pairs, points_to_wkb(pairs))
+    ]
+
+
+def decode_many(raw_geoms, check=False):
+    """decode() over a chunk of values, run in worker processes by the parallel decode stage.
+
+    WKT strings are encoded to WKB as well when possible, so the caller only
+    has to wrap bytes. Errors come back as ("error", message) entries instead
+    of being raised, so one bad geometry does not fail the chunk.
+    """
+    results = decode_points(raw_geoms)
+    if results is not None:
+        return results
+    results = []
+    for raw_geom in raw_geoms:
+        try:
+            decoded = decode(raw_geom, check)
+            if decoded is not None and decoded[0] == "wkt":
+                try:
+                    decoded = "wkb", wkt_to_wkb(decoded[1], check)
+                except GeometryError:
+                    pass  # left to QgsGeometry.fromWkt
+            results.append(decoded)
+        except GeometryError as e:
+            results.append(("error", str(e)))
+    return results
@@ -0,0 +1,126 @@
+import email.utils
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import log
+
+try:
+    from requests.utils import DEFAULT_ACCEPT_ENCODING  # includes br/zstd when the decoders are installed
+except ImportError:
+    DEFAULT_ACCEPT_ENCODING = "gzip, deflate"
+
+
+DEFAULT_TIMEOUT = (10, 60)  # (connect, read) seconds
+POOL_SIZE = 32  # matches the highest "Parallel requests" value in the settings
+MAX_RETRIES = 5
+BACKOFF_FACTOR = 0.5  # seconds, doubled at every attempt
+MAX_BACKOFF = 60
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(base_url, token=""):
+    """Return the shared client for a Directus instance, creating it on first use."""
+    key = (base_url.rstrip("/"), token or "")
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = DirectusClient(base_url, token)
+            _clients[key] = client
+        return client
+
+
+def close_clients():
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def transfer_size(response):
+    # Bytes received for a response; len(response.content) is the size after decompression
+    length = response.headers.get("Content-Length", "")
+    if length.isdigit():
+        return int(length)
+    try:
+        return response.raw.tell() or len(response.content)  # bytes read from the socket by urllib3
+    except AttributeError:
+        return len(response.content)
+
+
+def retry_after_seconds(response):
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(when.timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class DirectusClient:
+    """Pooled, keep-alive HTTP session for one Directus instance.
+
+    Every request gets a timeout and is retried on its own with exponential
+    backoff on connection errors and transient statuses (429, 503, ...),
+    honoring Retry-After, so a failed page never restarts the whole import.
+    """
+
+    def __init__(self, base_url, token="", timeout=DEFAULT_TIMEOUT, max_retries=MAX_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept-Encoding"] = DEFAULT_ACCEPT_ENCODING
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def url(self, path):
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path, params=None, timeout=None, max_retries=None):
+        url = self.url(path)
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(f"{response.status_code} Server Error for url: {url}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt >= max_retries:
+                raise error
+            delay = retry_after_seconds(response)
+            if delay is None:
+                delay = BACKOFF_FACTOR * (2 ** attempt) * (1 + random.random() * 0.25)
+            log.warning(f"Request failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(min(delay, MAX_BACKOFF))
+            attempt += 1
+
+    def get_json(self, path, params=None, timeout=None, max_retries=None):
+        return self.get(path, params=params, timeout=timeout, max_retries=max_retries).json()
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,277 @@
+from qgis.PyQt.QtCore import QObject, QTimer
+from qgis.core import QgsApplication, QgsFeature, QgsFeatureRequest, QgsTask, QgsVectorDataProvider, QgsWkbTypes
+
+from .columns import ColumnPage
+from .engine import ClientFilter, attribute_columns, convert_row, geometry_family
+from .filters import translate_expression
+from .http_client import get_client
+from . import log
+
+# Provider capabilities needed to patch a layer in place
+REQUIRED_CAPABILITIES = (
+    QgsVectorDataProvider.AddFeatures
+    | QgsVectorDataProvider.DeleteFeatures
+    | QgsVectorDataProvider.ChangeAttributeValues
+    | QgsVectorDataProvider.ChangeGeometries
+)
+
+
+def unsupported_reason(job, import_layers):
+    # Why the layers of an import cannot be kept in sync, or None
+    primary_key, _ = job.get_primary_key()
+    if not primary_key:
+        return "the collection has no primary key"
+    if not job.get_sync_fields():
+        return "none of the change timestamp fields exist in the collection"
+    if not job.synced_to:
+        return "the rows have no change timestamps yet"
+    for layer, provider, _ in import_layers.layers.values():
+        if layer.fields().indexOf(primary_key) < 0:
+            return f"{layer.name()} has no {primary_key} column"
+        if (provider.capabilities() & REQUIRED_CAPABILITIES) != REQUIRED_CAPABILITIES:
+            return f"{layer.name()} cannot be edited in place"
+    return None
+
+
+class Changes:
+    """Rows changed on the server since the last poll, ready to be applied on the main thread."""
+
+    def __init__(self, parsed, removed, ids, since, at_cursor):
+        self.parsed = parsed  # ColumnPage of the rows to add or update, with their geometries
+        self.removed = removed  # keys of changed rows that no longer belong in the layers
+        self.ids = ids  # keys of every row on the server
+        self.since = since
+        self.at_cursor = at_cursor  # keys of the rows applied with a change timestamp equal to since
+
+
+class LiveSync(QObject):
+    """Keeps the layers of an import up to date by polling Directus for changes.
+
+    Every `interval` seconds the rows created or updated since the last poll
+    are read with the change timestamp cursor of the delta sync, and patched
+    into the existing layers by primary key, so styles, joins and selections
+    set up on them are kept. Deleted rows are found when the row count on the
+    server no longer matches the known ids.
+    """
+
+    def __init__(self, job, import_layers, interval, parent=None):
+        super().__init__(parent)
+        self.job = job
+        self.primary_key, self.key_type = job.get_primary_key()
+        self.sync_fields = job.get_sync_fields()
+        self.since = job.synced_to
+        self.at_cursor = set()  # keys of the rows already applied at the since timestamp
+        self.use_geometry = import_layers.use_geometry
+        self.mode = import_layers.mode
+        self.layers = {key: (layer, wkb_type) for key, (layer, _, wkb_type) in import_layers.layers.items()}
+        self.index = {}  # primary key as text -> (layer key, feature id)
+        self.server_ids = None  # keys of the rows on the server, read on the first poll
+        self.task = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(interval * 1000))
+        self.timer.timeout.connect(self.poll)
+
+    def start(self):
+        self.build_index()
+        self.timer.start()
+        log.info(f"{self.job.collection}: live sync every {self.timer.interval() // 1000}s")
+
+    def stop(self):
+        self.timer.stop()
+        if self.task is not None:
+            self.task.cancel()
+        self.layers = {}
+
+    def layer_ids(self):
+        return [layer.id() for layer, _ in self.layers.values()]
+
+    def remove_layers(self, layer_ids):
+        # Layers removed from the project are no longer patched; returns False once none are left
+        for key, (layer, _) in list(self.layers.items()):
+            if layer.id() in layer_ids:
+                del self.layers[key]
+                self.index = {k: entry for k, entry in self.index.items() if entry[0] != key}
+        if not self.layers:
+            self.stop()
+        return bool(self.layers)
+
+    def build_index(self):
+        for key, (layer, _) in self.layers.items():
+            field_index = layer.fields().indexOf(self.primary_key)
+            request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([field_index])
+            for feature in layer.getFeatures(request):
+                value = feature.attribute(field_index)
+                if value is not None:
+                    self.index[str(value)] = (key, feature.id())
+
+    def poll(self):
+        if self.task is not None:
+            return  # the previous poll is still running
+        if any(layer.isEditable() for layer, _ in self.layers.values()):
+            return  # changes wait until the user's edit session is over
+        self.task = SyncTask(self)
+        QgsApplication.taskManager().addTask(self.task)
+
+    def fetch(self):
+        # Worker thread: reads the changes, applied later by apply() on the main thread
+        job = self.job
+        client = get_client(job.instance_url, job.token)
+        items_path = f"/items/{job.collection}"
+        _, fields_query, server_filter, _, _ = job.get_query(self.primary_key, self.sync_fields)
+        changes = job.fetch_changes(client, items_path, fields_query, self.since, self.sync_fields, server_filter)
+        page = ColumnPage.concat(list(changes))
+
+        # The cursor filter is _gte, so changes made within the cursor's timestamp are not
+        # missed; the rows already applied at that timestamp come back every time and are skipped
+        stamps = [max(filter(None, values), default=None) for values in
+                  zip(*[page.column(f) for f in self.sync_fields])]
+        keys = [str(k) for k in page.column(self.primary_key)]
+        fresh = [i for i, (k, stamp) in enumerate(zip(keys, stamps)) if stamp != self.since or k not in self.at_cursor]
+        if len(fresh) < len(page):
+            page = page.take(fresh)
+            keys = [keys[i] for i in fresh]
+            stamps = [stamps[i] for i in fresh]
+        since = max(filter(None, [self.since] + stamps), default=self.since)
+        at_cursor = {k for k, stamp in zip(keys, stamps) if stamp == since}
+        if since == self.since:
+            at_cursor |= self.at_cursor
+        changed_keys = set(keys)
+
+        # The ids are only read again when the count shows that rows were deleted
+        # (or left the filter); otherwise the changes are all there is to know
+        ids = None
+        total = job.fetch_total_count(client, items_path, server_filter)
+        known = None if self.server_ids is None else self.server_ids | changed_keys
+        if known is None or total is None or len(known) != total:
+            keys = job.fetch_ids(client, items_path, self.primary_key, self.key_type, total, server_filter)
+            ids = {str(k) for k in keys}
+
+        related = job.get_related_lookup()
+        if related.relations and len(page):
+            related.join(page, job.fetch_page, client)
+        parsed = job.parse_page(page, self.use_geometry)
+        if not translate_expression(job.filter_expression)[1]:
+            parsed = ClientFilter(job.filter_expression, job.field_schema, job.geom_field).apply(parsed)
+        kept = {str(k) for k in parsed.column(self.primary_key)}
+        return Changes(parsed, changed_keys - kept, ids if ids is not None else known, since, at_cursor)
+
+    def task_finished(self, task, changes):
+        self.task = None
+        if changes is None or not self.layers:
+            return
+        if any(layer.isEditable() for layer, _ in self.layers.values()):
+            return  # fetched again on the next poll
+        self.apply(changes)
+
+    def target(self, geom):
+        # Layer key a row goes to and the geometry it gets there, or None when no layer takes it
+        if not self.use_geometry:
+            return (None, None) if None in self.layers else None
+        if self.mode == "split":
+            key = geometry_family(geom)
+            return (key, geom) if key in self.layers else None
+        key, (_, wkb_type) = next(iter(self.layers.items()))
+        if geom is None or wkb_type is None:
+            return key, None
+        if QgsWkbTypes.geometryType(geom.wkbType()) != QgsWkbTypes.geometryType(wkb_type):
+            return key, None
+        if self.mode == "single" and geom.wkbType() != wkb_type:
+            return key, None
+        return key, geom
+
+    def apply(self, changes):
+        deletes = {}  # layer key -> feature ids
+        attributes = {}  # layer key -> {feature id: {field index: value}}
+        geometries = {}  # layer key -> {feature id: geometry}
+        additions = {}  # layer key -> [(primary key, values, geometry)]
+
+        removed = set(changes.removed) | {k for k in self.index if k not in changes.ids}
+        for k in removed:
+            entry = self.index.pop(k, None)
+            if entry:
+                deletes.setdefault(entry[0], []).append(entry[1])
+
+        columns = {}
+        skipped = 0
+        for row, geom in zip(changes.parsed, changes.parsed.geometries):
+            k = str(row.get(self.primary_key))
+            target = self.target(geom)
+            current = self.index.get(k)
+            if target is None:
+                skipped += 1
+                if current:
+                    deletes.setdefault(current[0], []).append(current[1])
+                    del self.index[k]
+                continue
+            key, geom = target
+            layer, wkb_type = self.layers[key]
+            if key not in columns:
+                columns[key] = attribute_columns(layer.fields().names(), self.job.field_schema)
+            values = convert_row(row, columns[key])
+            if geom is not None and QgsWkbTypes.isMultiType(wkb_type) and not geom.isMultipart():
+                geom.convertToMultiType()
+            if current and current[0] == key:
+                attributes.setdefault(key, {})[current[1]] = dict(enumerate(values))
+                if geom is not None:
+                    geometries.setdefault(key, {})[current[1]] = geom
+            else:
+                # New row, or its geometry moved it to the layer of another geometry family
+                if current:
+                    deletes.setdefault(current[0], []).append(current[1])
+                additions.setdefault(key, []).append((k, values, geom))
+
+        for key, (layer, _) in self.layers.items():
+            provider = layer.dataProvider()
+            if deletes.get(key):
+                provider.deleteFeatures(deletes[key])
+            if attributes.get(key):
+                provider.changeAttributeValues(attributes[key])
+            if geometries.get(key):
+                provider.changeGeometryValues(geometries[key])
+            if additions.get(key):
+                features = []
+                for _, values, geom in additions[key]:
+                    feature = QgsFeature(layer.fields())
+                    feature.setAttributes(values)
+                    if geom is not None:
+                        feature.setGeometry(geom)
+                    features.append(feature)
+                ok, added = provider.addFeatures(features)
+                if ok:
+                    for (k, _, _), feature in zip(additions[key], added):
+                        self.index[k] = (key, feature.id())
+            if key in deletes or key in attributes or key in geometries or key in additions:
+                layer.updateExtents()
+                layer.triggerRepaint()
+
+        self.since = changes.since
+        self.at_cursor = changes.at_cursor
+        self.server_ids = changes.ids
+        changed = sum(len(a) for a in attributes.values())
+        added = sum(len(a) for a in additions.values())
+        deleted = sum(len(d) for d in deletes.values())
+        if changed or added or deleted:
+            log.info(f"{self.job.collection}: live sync, {changed} updated, {added} added, {deleted} deleted")
+        if skipped:
+            log.debug(f"{self.job.collection}: live sync, {skipped} rows without a matching layer")
+
+
+class SyncTask(QgsTask):
+    def __init__(self, sync):
+        super().__init__(f"Directus live sync: {sync.job.collection}", QgsTask.CanCancel)
+        self.sync = sync
+        self.changes = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.changes = self.sync.fetch()
+        except Exception as e:
+            self.error = e
+            return False
+        return not self.isCanceled()
+
+    def finished(self, result):
+        if self.error is not None:
+            log.warning(f"{self.sync.job.collection}: live sync failed: {self.error}")
+        self.sync.task_finished(self, self.changes if result else None)
@@ -0,0 +1,66 @@
+import logging
+
+try:
+    from qgis.core import Qgis, QgsMessageLog
+except ImportError:  # used outside QGIS
+    QgsMessageLog = None
+
+TAG = "DirectusImporter"
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+
+_level = INFO
+_logger = logging.getLogger(TAG)
+_use_message_log = QgsMessageLog is not None
+
+
+def set_level(level):
+    global _level
+    _level = LEVELS.get(level, level) if isinstance(level, str) else level
+
+
+def use_python_logging():
+    # Headless runs (cli.py) have no log panel to show QgsMessageLog messages
+    global _use_message_log
+    _use_message_log = False
+
+
+def enabled(level):
+    # Lets callers skip building expensive messages that would be dropped anyway
+    return level >= _level
+
+
+def log(level, message):
+    if level < _level:
+        return
+    if not _use_message_log:
+        _logger.log(level, message)
+        return
+    # QgsMessageLog is thread safe, unlike printing to the Python console
+    if level >= ERROR:
+        qgis_level = Qgis.Critical
+    elif level >= WARNING:
+        qgis_level = Qgis.Warning
+    else:
+        qgis_level = Qgis.Info
+    QgsMessageLog.logMessage(message, TAG, qgis_level)
+
+
+def debug(message):
+    log(DEBUG, message)
+
+
+def info(message):
+    log(INFO, message)
+
+
+def warning(message):
+    log(WARNING, message)
+
+
+def error(message):
+    log(ERROR, message)
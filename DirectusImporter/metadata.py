@@ -0,0 +1,112 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from qgis.PyQt.QtCore import QObject, pyqtSignal
+
+from .engine import add_related_fields, field_schema_from
+from .http_client import get_client
+from . import log
+
+# Collections and field schemas shown by the settings dialog, loaded off the
+# GUI thread and kept for the QGIS session.
+
+METADATA_TTL = 600  # seconds a loaded collection list or field schema is reused
+METADATA_TIMEOUT = (3, 10)  # (connect, read) seconds per request
+METADATA_RETRIES = 1  # the dialog waits for these, so an unreachable server fails fast
+
+_cache = None
+
+
+def metadata_cache():
+    # Created on first use from the GUI thread, which then receives the results
+    global _cache
+    if _cache is None:
+        _cache = MetadataCache()
+    return _cache
+
+
+def close_metadata_cache():
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def load_collections(client):
+    collections = client.get_json("/collections", timeout=METADATA_TIMEOUT, max_retries=METADATA_RETRIES)
+    collections = collections.get("data", [])
+    return [c["collection"] for c in collections if not c["collection"].startswith("directus_")]
+
+
+def load_fields(client, collection):
+    # (fields, field schema, related field names) of a collection
+    fields = client.get_json(f"/fields/{collection}", timeout=METADATA_TIMEOUT, max_retries=METADATA_RETRIES)
+    fields = fields.get("data", [])
+    field_schema = field_schema_from(fields)
+    try:
+        related_fields = add_related_fields(
+            client, collection, field_schema, timeout=METADATA_TIMEOUT, max_retries=METADATA_RETRIES
+        )
+    except Exception as e:
+        related_fields = []
+        log.warning(f"Failed to load relations: {e}")
+    return fields, field_schema, related_fields
+
+
+class MetadataCache(QObject):
+    """Directus metadata requests run on worker threads, with results cached per instance.
+
+    Callbacks are always called on the GUI thread. Callers asking for a
+    result that is already being loaded share the request in flight.
+    """
+
+    loaded = pyqtSignal(object, object, object)  # key, result, error
+
+    def __init__(self, ttl=METADATA_TTL):
+        super().__init__()
+        self.ttl = ttl
+        self.entries = {}  # key -> (loaded_at, result)
+        self.pending = {}  # key -> callbacks waiting for the request in flight
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.loaded.connect(self.on_loaded)
+
+    def collections(self, url, token, callback, refresh=False):
+        self.get(url, token, ("collections",), load_collections, callback, refresh)
+
+    def fields(self, url, token, collection, callback, refresh=False):
+        self.get(url, token, ("fields", collection), lambda client: load_fields(client, collection), callback, refresh)
+
+    def get(self, url, token, name, loader, callback, refresh=False):
+        key = (url.rstrip("/"), token or "") + name
+        entry = self.entries.get(key)
+        if entry and not refresh and time.time() - entry[0] < self.ttl:
+            callback(entry[1], None)
+            return
+        callbacks = self.pending.get(key)
+        if callbacks is not None:
+            callbacks.append(callback)
+            return
+        self.pending[key] = [callback]
+        self.executor.submit(self.run, key, url, token, loader)
+
+    def run(self, key, url, token, loader):
+        # Worker thread: the result is passed back through a queued signal
+        try:
+            result = loader(get_client(url, token))
+        except Exception as e:
+            self.loaded.emit(key, None, e)
+            return
+        self.loaded.emit(key, result, None)
+
+    def on_loaded(self, key, result, error):
+        if error is None:
+            self.entries[key] = (time.time(), result)
+        for callback in self.pending.pop(key, []):
+            try:
+                callback(result, error)
+            except Exception as e:
+                log.warning(f"Metadata callback failed: {e}")
+
+    def close(self):
+        self.pending = {}
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,76 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Import phases, in pipeline order
+PHASES = (
+    "http_wait",
+    "cache_read",
+    "json_decode",
+    "geometry_decode",
+    "attribute_conversion",
+    "provider_insert",
+)
+
+
+class Profiler:
+    """Accumulates time and bytes per import phase.
+
+    Fetch phases run on several threads at once, so their summed time can
+    exceed the wall time of the import.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.started = time.time()
+        self.wall_start = time.perf_counter()
+        self.wall_seconds = None
+        self.rows = 0
+        self.phases = {phase: {"seconds": 0.0, "bytes": 0, "calls": 0} for phase in PHASES}
+        self.lock = threading.Lock()
+
+    def add(self, phase, seconds, nbytes=0):
+        with self.lock:
+            entry = self.phases.setdefault(phase, {"seconds": 0.0, "bytes": 0, "calls": 0})
+            entry["seconds"] += seconds
+            entry["bytes"] += nbytes
+            entry["calls"] += 1
+
+    @contextmanager
+    def phase(self, phase, nbytes=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start, nbytes)
+
+    def stop(self, rows=None):
+        self.wall_seconds = time.perf_counter() - self.wall_start
+        if rows is not None:
+            self.rows = rows
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started": self.started,
+            "wall_seconds": self.wall_seconds,
+            "rows": self.rows,
+            "phases": self.phases,
+        }
+
+    def summary(self):
+        wall = self.wall_seconds if self.wall_seconds is not None else time.perf_counter() - self.wall_start
+        rate = f", {self.rows / wall:.0f} rows/s" if wall > 0 and self.rows else ""
+        lines = [f"Import profile {self.name}: {self.rows} rows in {wall:.2f}s{rate}"]
+        for phase, entry in self.phases.items():
+            if not entry["calls"]:
+                continue
+            size = f", {entry['bytes'] / 1048576:.1f} MB" if entry["bytes"] else ""
+            lines.append(f"  {phase}: {entry['seconds']:.2f}s in {entry['calls']} calls{size}")
+        return "\n".join(lines)
+
+    def export_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,489 @@
+import copy
+import json
+import math
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from qgis.PyQt.QtCore import QSettings
+from qgis.core import (
+    QgsAbstractFeatureIterator,
+    QgsAbstractFeatureSource,
+    QgsApplication,
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsDataProvider,
+    QgsExpression,
+    QgsExpressionContext,
+    QgsFeature,
+    QgsFeatureIterator,
+    QgsFeatureRequest,
+    QgsField,
+    QgsFields,
+    QgsProviderMetadata,
+    QgsProviderRegistry,
+    QgsRectangle,
+    QgsVectorDataProvider,
+    QgsWkbTypes,
+)
+
+from .engine import (
+    attribute_columns, build_geometry, convert_row, field_schema_from, concurrent_chain, INTEGER_KEY_TYPES
+)
+from .cache_store import CacheStore, cache_key
+from .columns import ColumnPage
+from .filters import filter_query, translate_expression
+from .http_client import get_client
+from . import log
+
+# Live layers read features on demand for the extent QGIS asks for. Extents are
+# split into tiles of a power-of-two grid over EPSG:4326, each tile is fetched
+# with an _intersects_bbox filter and kept in the plugin's SQLite cache.
+
+PROVIDER_KEY = "directus"
+PAGE_SIZE = 500
+MAX_ZOOM = 16  # tiles of 360 / 2**16 degrees, about 600 m at the equator
+FID_BATCH = 100
+
+WKB_TYPE_NAMES = {
+    "Point": QgsWkbTypes.MultiPoint,
+    "MultiPoint": QgsWkbTypes.MultiPoint,
+    "LineString": QgsWkbTypes.MultiLineString,
+    "MultiLineString": QgsWkbTypes.MultiLineString,
+    "Polygon": QgsWkbTypes.MultiPolygon,
+    "MultiPolygon": QgsWkbTypes.MultiPolygon,
+}
+
+
+def layer_uri(instance_url, collection, geom_field, fields, filter_expression=""):
+    params = {"url": instance_url, "collection": collection, "geometry": geom_field, "fields": ",".join(fields)}
+    if filter_expression:
+        params["filter"] = filter_expression
+    return urlencode(params)
+
+
+def register_provider():
+    registry = QgsProviderRegistry.instance()
+    if PROVIDER_KEY in registry.providerList():
+        return True
+    metadata = QgsProviderMetadata(
+        DirectusProvider.providerKey(), DirectusProvider.description(), DirectusProvider.createProvider
+    )
+    return registry.registerProvider(metadata)
+
+
+def tiles_for(rect):
+    # Smallest zoom whose tiles are at least as large as the rectangle, so a view
+    # never needs more than 2 x 2 tiles
+    size = max(rect.width(), rect.height(), 1e-9)
+    zoom = max(0, min(MAX_ZOOM, int(math.floor(math.log2(360.0 / size)))))
+    step = 360.0 / 2 ** zoom
+    x0 = int(math.floor((max(rect.xMinimum(), -180.0) + 180.0) / step))
+    x1 = int(math.floor((min(rect.xMaximum(), 180.0) + 180.0) / step))
+    y0 = int(math.floor((max(rect.yMinimum(), -90.0) + 90.0) / step))
+    y1 = int(math.floor((min(rect.yMaximum(), 90.0) + 90.0) / step))
+    x1, y1 = min(x1, 2 ** zoom - 1), min(y1, int(math.ceil(180.0 / step)) - 1)
+    return [(zoom, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def tile_bbox(tile):
+    zoom, x, y = tile
+    step = 360.0 / 2 ** zoom
+    xmin, ymin = -180.0 + x * step, -90.0 + y * step
+    xmax, ymax = xmin + step, min(ymin + step, 90.0)
+    return {
+        "type": "Polygon",
+        "coordinates": [[[xmin, ymin], [xmax, ymin], [xmax, ymax], [xmin, ymax], [xmin, ymin]]],
+    }
+
+
+class DirectusFeatureIterator(QgsAbstractFeatureIterator):
+    def __init__(self, source, request):
+        super().__init__(request)
+        self._request = request if request is not None else QgsFeatureRequest()
+        self._source = source
+        self._transform = QgsCoordinateTransform()
+        self._empty = False
+        self._seen = set()
+        if self._request.destinationCrs().isValid() and self._request.destinationCrs() != source.crs:
+            self._transform = QgsCoordinateTransform(
+                source.crs, self._request.destinationCrs(), self._request.transformContext()
+            )
+        try:
+            self._filter_rect = self.filterRectToSourceCrs(self._transform)
+        except QgsCsException:
+            # The requested extent does not exist in EPSG:4326: nothing to return
+            self._empty = True
+            self._rows = iter(())
+            return
+        if self._filter_rect is not None and self._filter_rect.isNull():
+            self._filter_rect = None
+
+        self._expression = None
+        self._server_filter = None
+        if self._request.filterType() == QgsFeatureRequest.FilterExpression:
+            self._expression = self._request.filterExpression()
+            self._expression.prepare(self._request.expressionContext())
+            try:
+                self._server_filter, _ = translate_expression(self._expression.expression())
+            except ValueError:
+                self._server_filter = None
+        # Part of the layer filter Directus could not evaluate
+        self._layer_filter = None
+        if not source.exact:
+            self._layer_filter = QgsExpression(source.filter_expression)
+            self._layer_context = QgsExpressionContext()
+            self._layer_context.setFields(source.fields)
+            self._layer_filter.prepare(self._layer_context)
+
+        no_geometry = bool(self._request.flags() & QgsFeatureRequest.NoGeometry)
+        self._need_geometry = bool(source.geom_field) and (
+            not no_geometry or self._filter_rect is not None or self._expression is not None
+            or self._layer_filter is not None
+        )
+        self._rows = self._iter_rows()
+
+    def _iter_rows(self):
+        source = self._source
+        if self._empty:
+            return
+        if self._request.filterType() == QgsFeatureRequest.FilterFid:
+            yield from source.rows_by_fid([self._request.filterFid()])
+        elif self._request.filterType() == QgsFeatureRequest.FilterFids:
+            yield from source.rows_by_fid(sorted(self._request.filterFids()))
+        elif self._filter_rect is not None and source.geom_field:
+            for page in source.tile_pages(tiles_for(self._filter_rect), self._server_filter):
+                yield from page
+        else:
+            for page in source.pages(self._server_filter):
+                yield from page
+
+    def fetchFeature(self, f):
+        source = self._source
+        for row in self._rows:
+            fid = source.fid(row)
+            if fid in self._seen:
+                # Features crossing tile borders come with every tile they touch
+                continue
+            geom = None
+            if self._need_geometry:
+                geom = source.geometry(row)
+                if self._filter_rect is not None:
+                    if geom is None or not geom.boundingBox().intersects(self._filter_rect):
+                        continue
+                    if self._request.flags() & QgsFeatureRequest.ExactIntersect and not geom.intersects(self._filter_rect):
+                        continue
+
+            f.setFields(source.fields)
+            f.setValid(True)
+            f.setId(fid)
+            f.setAttributes(convert_row(row, source.columns))
+            if geom is not None:
+                f.setGeometry(geom)
+                self.geometryToDestinationCrs(f, self._transform)
+            else:
+                f.clearGeometry()
+
+            if self._layer_filter is not None:
+                self._layer_context.setFeature(f)
+                if not self._layer_filter.evaluate(self._layer_context):
+                    continue
+            if self._expression is not None:
+                self._request.expressionContext().setFeature(f)
+                if not self._expression.evaluate(self._request.expressionContext()):
+                    continue
+            self._seen.add(fid)
+            return True
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        feature = QgsFeature()
+        if not self.nextFeature(feature):
+            raise StopIteration
+        return feature
+
+    def rewind(self):
+        self.close()
+        self._seen = set()
+        self._rows = self._iter_rows()
+        return True
+
+    def close(self):
+        if hasattr(self._rows, "close"):
+            self._rows.close()
+        return True
+
+
+class FeatureIds:
+    """Feature ids of the rows of a live layer, shared by its provider and feature sources.
+
+    Integer primary keys are the feature ids. Other keys get generated ids,
+    remembered so features can be requested again by id; with integer keys
+    the generated ids are negative so they never clash with a key. Rows
+    without a key get a new id every time they are read.
+    """
+
+    def __init__(self, integer_key):
+        self.integer_key = integer_key
+        self.lock = threading.Lock()
+        self.fids = {}  # pk -> generated fid
+        self.pks = {}  # generated fid -> pk
+        self.generated = 0
+
+    def fid(self, pk):
+        if self.integer_key and pk is not None:
+            try:
+                return int(pk)
+            except (TypeError, ValueError):
+                pass
+        with self.lock:
+            fid = self.fids.get(pk) if pk is not None else None
+            if fid is None:
+                self.generated += 1
+                fid = -self.generated if self.integer_key else self.generated
+                if pk is not None:
+                    self.fids[pk] = fid
+                    self.pks[fid] = pk
+            return fid
+
+    def keys(self, fids):
+        # Primary keys of feature ids, in the same order; ids of unkeyed rows are left out
+        with self.lock:
+            return [
+                self.pks[fid] if fid in self.pks else fid for fid in fids
+                if fid in self.pks or (self.integer_key and fid >= 0)
+            ]
+
+
+class DirectusFeatureSource(QgsAbstractFeatureSource):
+    """Snapshot of the provider state that iterators read from, possibly on
+    rendering threads. Everything a request needs is copied from the provider,
+    so iterators keep working after the provider is deleted or reloaded."""
+
+    def __init__(self, provider):
+        super().__init__()
+        self.crs = provider.crs()
+        self.fields = QgsFields(provider.fields())
+        self.wkb_type = provider.wkbType()
+        self.columns = list(provider.columns)
+        self.geom_field = provider.geom_field
+        self.filter_expression = provider.filter_expression
+        self.exact = provider.exact
+        self.instance_url = provider.instance_url
+        self.collection = provider.collection
+        self.client = provider.client
+        self.items_path = provider.items_path
+        self.primary_key = provider.primary_key
+        self.fields_query = provider.fields_query
+        self.request_fields = list(provider.request_fields)
+        self.base_filter = copy.deepcopy(provider.base_filter)
+        self.cache_store = provider.cache_store
+        self.cache_ttl = provider.cache_ttl
+        self.ids = provider.ids
+
+    def getFeatures(self, request):
+        return QgsFeatureIterator(DirectusFeatureIterator(self, request))
+
+    def fid(self, row):
+        return self.ids.fid(row.get(self.primary_key))
+
+    def geometry(self, row):
+        geom = build_geometry(row.get(self.geom_field))
+        if geom is None:
+            return None
+        if QgsWkbTypes.geometryType(geom.wkbType()) != QgsWkbTypes.geometryType(self.wkb_type):
+            return None
+        if not geom.isMultipart():
+            geom.convertToMultiType()
+        return geom
+
+    def fetch_pages(self, extra_filter=None):
+        # Keyset paging on the primary key; pages are requested as the caller iterates
+        last_key = None
+        while True:
+            after = {self.primary_key: {"_gt": last_key}} if last_key is not None else None
+            url = f"{self.items_path}?limit={PAGE_SIZE}&sort={self.primary_key}{self.fields_query}"
+            url += filter_query(self.base_filter, extra_filter, after)
+            page_data = self.client.get_json(url).get("data", [])
+            if not page_data:
+                return
+            yield page_data
+            last_key = page_data[-1].get(self.primary_key)
+
+    def pages(self, extra_filter=None):
+        return self.fetch_pages(extra_filter)
+
+    def rows_by_fid(self, fids):
+        pks = self.ids.keys(fids)
+        for i in range(0, len(pks), FID_BATCH):
+            for page in self.fetch_pages({self.primary_key: {"_in": pks[i:i + FID_BATCH]}}):
+                yield from page
+
+    def tile_rows(self, tile, extra_filter):
+        tile_filter = {self.geom_field: {"_intersects_bbox": tile_bbox(tile)}}
+        combined = [c for c in (self.base_filter, extra_filter, tile_filter) if c]
+        key = cache_key(self.instance_url, self.collection, self.request_fields, json.dumps(combined, sort_keys=True))
+        entry = self.cache_store.entry(key)
+        if entry and time.time() - entry["fetched_at"] < self.cache_ttl:
+            yield from self.cache_store.iter_rows(key)
+            return
+
+        writer = self.cache_store.writer(
+            key, self.instance_url, self.collection, self.request_fields, json.dumps(combined), self.primary_key
+        )
+        try:
+            for page_data in self.fetch_pages({"_and": [extra_filter, tile_filter]} if extra_filter else tile_filter):
+                page = ColumnPage.from_rows(page_data)
+                writer.write(page)
+                yield page
+        except BaseException:
+            writer.abort()
+            raise
+        writer.finish(None)
+
+    def tile_pages(self, tiles, extra_filter=None):
+        generators = [self.tile_rows(tile, extra_filter) for tile in tiles]
+        if len(generators) == 1:
+            return generators[0]
+        return concurrent_chain(generators)
+
+
+class DirectusProvider(QgsVectorDataProvider):
+    @classmethod
+    def providerKey(cls):
+        return PROVIDER_KEY
+
+    @classmethod
+    def description(cls):
+        return "Directus live layer"
+
+    @classmethod
+    def createProvider(cls, uri, providerOptions, flags=QgsDataProvider.ReadFlags()):
+        return DirectusProvider(uri, providerOptions, flags)
+
+    def __init__(self, uri="", providerOptions=QgsDataProvider.ProviderOptions(), flags=QgsDataProvider.ReadFlags()):
+        super().__init__(uri)
+        self._uri = uri
+        self._valid = False
+        self._fields = QgsFields()
+        self._wkb_type = QgsWkbTypes.NoGeometry
+        self._crs = QgsCoordinateReferenceSystem("EPSG:4326")
+        self._count = None
+        self.columns = []
+        self.exact = True
+        # Set for valid layers, by load_schema and below
+        self.client = self.cache_store = None
+        self.items_path = self.fields_query = ""
+        self.request_fields = []
+        self.primary_key = "id"
+        self.base_filter = None
+        self.cache_ttl = 0
+        self.ids = FeatureIds(False)
+
+        params = dict(parse_qsl(uri))
+        self.instance_url = params.get("url", "")
+        self.collection = params.get("collection", "")
+        self.geom_field = params.get("geometry", "")
+        self.filter_expression = params.get("filter", "")
+        if not self.instance_url or not self.collection:
+            return
+
+        settings = QSettings()
+        # The token is not stored in the layer source (and so in project files)
+        token = ""
+        if settings.value("DirectusImporter/instance_url", "").rstrip("/") == self.instance_url.rstrip("/"):
+            token = settings.value("DirectusImporter/token", "")
+        self.client = get_client(self.instance_url, token)
+        self.items_path = f"/items/{self.collection}"
+        self.cache_ttl = int(settings.value("DirectusImporter/cache_ttl", 3600))
+        cache_path = os.path.join(QgsApplication.qgisSettingsDirPath(), "DirectusImporter", "cache.sqlite")
+        self.cache_store = CacheStore(cache_path, int(settings.value("DirectusImporter/cache_size_mb", 500)) * 1024 * 1024)
+
+        try:
+            self.load_schema([f for f in params.get("fields", "").split(",") if f])
+            self.base_filter, self.exact = translate_expression(self.filter_expression)
+        except Exception as e:
+            log.warning(f"Could not open live layer for {self.collection}: {e}")
+            return
+        self._valid = True
+
+    def load_schema(self, names):
+        field_schema = field_schema_from(self.client.get_json(f"/fields/{self.collection}").get("data", []))
+
+        self.primary_key = next((n for n, info in field_schema.items() if info["primary_key"]), "id")
+        self.ids = FeatureIds((field_schema.get(self.primary_key) or {}).get("type") in INTEGER_KEY_TYPES)
+        names = [n for n in names or field_schema if n in field_schema and n != self.geom_field]
+        self.columns = attribute_columns(names, field_schema)
+        for name, qvariant_type, _ in self.columns:
+            self._fields.append(QgsField(name, qvariant_type))
+        request_fields = names + [f for f in (self.primary_key, self.geom_field) if f and f not in names]
+        self.fields_query = f"&fields={','.join(request_fields)}"
+        self.request_fields = request_fields
+
+        if self.geom_field in field_schema:
+            self._wkb_type = self.detect_wkb_type(field_schema[self.geom_field]["type"] or "")
+        else:
+            self.geom_field = ""
+
+    def detect_wkb_type(self, directus_type):
+        # Typed geometry fields ("geometry.Point", ...) tell the type; otherwise look at one row
+        name = directus_type.split(".", 1)[1] if "." in directus_type else None
+        if name not in WKB_TYPE_NAMES:
+            not_null = {self.geom_field: {"_nnull": True}}
+            url = f"{self.items_path}?limit=1&fields={self.geom_field}{filter_query(not_null)}"
+            rows = self.client.get_json(url).get("data", [])
+            geom = build_geometry(rows[0].get(self.geom_field)) if rows else None
+            name = QgsWkbTypes.displayString(QgsWkbTypes.flatType(geom.wkbType())) if geom else None
+        return WKB_TYPE_NAMES.get(name, QgsWkbTypes.MultiPolygon)
+
+    def featureSource(self):
+        return DirectusFeatureSource(self)
+
+    def dataSourceUri(self, expandAuthConfig=True):
+        return self._uri
+
+    def storageType(self):
+        return "Directus REST API"
+
+    def getFeatures(self, request=QgsFeatureRequest()):
+        return QgsFeatureIterator(DirectusFeatureIterator(DirectusFeatureSource(self), request))
+
+    def wkbType(self):
+        return self._wkb_type
+
+    def featureCount(self):
+        if self._count is None:
+            try:
+                data = self.client.get_json(f"{self.items_path}?limit=0&meta=filter_count{filter_query(self.base_filter)}")
+                self._count = int(data.get("meta", {}).get("filter_count"))
+            except Exception as e:
+                log.warning(f"Could not read row count of {self.collection}: {e}")
+                return -1
+        return self._count
+
+    def fields(self):
+        return self._fields
+
+    def capabilities(self):
+        return QgsVectorDataProvider.SelectAtId
+
+    def crs(self):
+        return self._crs
+
+    def extent(self):
+        # The real extent would need the whole collection; Directus geometries are in EPSG:4326
+        return QgsRectangle(-180, -90, 180, 90)
+
+    def updateExtents(self):
+        pass
+
+    def isValid(self):
+        return self._valid
+
+    def name(self):
+        return self.providerKey()
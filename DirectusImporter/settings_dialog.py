@@ -1,16 +1,28 @@
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QGroupBox,
     QLabel, QLineEdit, QComboBox,
-    QListWidget, QListWidgetItem, QPushButton
+    QListWidget, QListWidgetItem, QPushButton, QSpinBox, QCheckBox, QFileDialog, QInputDialog
 )
 from PyQt5.QtCore import Qt, QRegExp
 from PyQt5.QtGui import QRegExpValidator
-import requests
+from qgis.core import QgsVectorLayer, QgsField
+from qgis.gui import QgsExpressionBuilderDialog
 import json
 
+from .filters import translate_expression
+from .engine import attribute_columns
+from .metadata import metadata_cache
+from . import log
+
 
 class SettingsDialog(QDialog):
-    def __init__(self, url, collection, token, selected_fields_json, geom_field, parent=None):
+    def __init__(self, url, collection, token, selected_fields_json, geom_field,
+                 page_size=0, max_workers=0, keyset_pagination=True, field_schema_json="{}",
+                 cache_ttl=3600, sync_fields="date_updated,date_created", cache_size_mb=500,
+                 debug_dump=False, geometry_validation="basic", geometry_mode="split", log_level="info",
+                 export_profile=False, filter_expression="", output_format="memory", output_folder="",
+                 profiles_json="[]", live_sync_interval=0, detail_levels=False,
+                 preview_rows=200, confirm_size_mb=100, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Directus Geo Importer Settings")
 
@@ -19,6 +31,8 @@ class SettingsDialog(QDialog):
         self.token = token
         self.selected_fields = json.loads(selected_fields_json or "[]")
         self.geom_field = geom_field
+        self.field_schema = json.loads(field_schema_json or "{}")
+        self.profiles = json.loads(profiles_json or "[]")
 
         main_layout = QVBoxLayout()
 
@@ -81,15 +95,29 @@ class SettingsDialog(QDialog):
         geom_field_layout.addWidget(self.geom_field_dropdown)
         geom_fields_layout.addLayout(geom_field_layout)
 
+        # Mixed geometry handling
+        geometry_mode_layout = QHBoxLayout()
+        geometry_mode_label = QLabel("Mixed geometry types:")
+        self.geometry_mode_dropdown = QComboBox()
+        self.geometry_mode_dropdown.addItem("One layer per geometry family", "split")
+        self.geometry_mode_dropdown.addItem("Single layer promoted to Multi type", "promote")
+        self.geometry_mode_dropdown.addItem("Single layer, type of the first geometry", "single")
+        idx = self.geometry_mode_dropdown.findData(geometry_mode)
+        self.geometry_mode_dropdown.setCurrentIndex(idx if idx >= 0 else 0)
+        self.geometry_mode_dropdown.setToolTip("How collections holding several geometry types are loaded")
+        geometry_mode_layout.addWidget(geometry_mode_label)
+        geometry_mode_layout.addWidget(self.geometry_mode_dropdown)
+        geom_fields_layout.addLayout(geometry_mode_layout)
+
         # Fields checklist label
         geom_fields_layout.addWidget(QLabel("Select fields to import:"))
 
         # Select/Deselect buttons layout
         select_buttons_layout = QHBoxLayout()
-        btn_select_all = QPushButton("Select All")
-        btn_deselect_all = QPushButton("Deselect All")
-        select_buttons_layout.addWidget(btn_select_all)
-        select_buttons_layout.addWidget(btn_deselect_all)
+        self.btn_select_all = QPushButton("Select All")
+        self.btn_deselect_all = QPushButton("Deselect All")
+        select_buttons_layout.addWidget(self.btn_select_all)
+        select_buttons_layout.addWidget(self.btn_deselect_all)
         geom_fields_layout.addLayout(select_buttons_layout)
 
         # Fields checklist
@@ -108,38 +136,308 @@ class SettingsDialog(QDialog):
         geom_fields_group.setLayout(geom_fields_layout)
         main_layout.addWidget(geom_fields_group)
 
+        # === Filter group ===
+        filter_group = QGroupBox("Filter")
+        filter_layout = QVBoxLayout()
+
+        filter_input_layout = QHBoxLayout()
+        filter_label = QLabel("Expression:")
+        self.filter_input = QLineEdit(filter_expression or "")
+        self.filter_input.setPlaceholderText("e.g. \"year\" >= 2000 AND \"status\" = 'published'")
+        self.filter_input.setToolTip(
+            "QGIS expression selecting the rows to import. Comparisons, IN, LIKE and IS NULL "
+            "are sent to Directus; anything else is evaluated in QGIS after download"
+        )
+        self.btn_filter_builder = QPushButton("…")
+        self.btn_filter_builder.setToolTip("Open the expression builder")
+        filter_input_layout.addWidget(filter_label)
+        filter_input_layout.addWidget(self.filter_input)
+        filter_input_layout.addWidget(self.btn_filter_builder)
+        filter_layout.addLayout(filter_input_layout)
+
+        self.filter_status_label = QLabel("")
+        filter_layout.addWidget(self.filter_status_label)
+
+        filter_group.setLayout(filter_layout)
+        main_layout.addWidget(filter_group)
+
+        # === Saved imports group ===
+        profiles_group = QGroupBox("Saved Imports")
+        profiles_layout = QVBoxLayout()
+
+        # Collection, geometry field, fields and filter saved under a name, for "Import all"
+        self.profiles_list = QListWidget()
+        self.profiles_list.setMaximumHeight(100)
+        self.profiles_list.setToolTip("Imported together by \"Import all saved imports\"")
+        profiles_layout.addWidget(self.profiles_list)
+
+        profile_buttons_layout = QHBoxLayout()
+        self.btn_save_profile = QPushButton("Save Current…")
+        self.btn_save_profile.setToolTip("Save the collection, fields, geometry field and filter above")
+        self.btn_load_profile = QPushButton("Load")
+        self.btn_remove_profile = QPushButton("Remove")
+        profile_buttons_layout.addWidget(self.btn_save_profile)
+        profile_buttons_layout.addWidget(self.btn_load_profile)
+        profile_buttons_layout.addWidget(self.btn_remove_profile)
+        profiles_layout.addLayout(profile_buttons_layout)
+
+        profiles_group.setLayout(profiles_layout)
+        main_layout.addWidget(profiles_group)
+        self.refresh_profiles_list()
+
+        # === Performance group ===
+        performance_group = QGroupBox("Performance")
+        performance_layout = QVBoxLayout()
+
+        # Page size (0 = auto)
+        page_size_layout = QHBoxLayout()
+        page_size_label = QLabel("Page size:")
+        self.page_size_input = QSpinBox()
+        self.page_size_input.setRange(0, 100000)
+        self.page_size_input.setSingleStep(100)
+        self.page_size_input.setSpecialValueText("Auto")
+        self.page_size_input.setValue(int(page_size or 0))
+        self.page_size_input.setToolTip("Items requested per page; Auto derives it from the collection size")
+        page_size_layout.addWidget(page_size_label)
+        page_size_layout.addWidget(self.page_size_input)
+        performance_layout.addLayout(page_size_layout)
+
+        # Parallel requests (0 = auto)
+        max_workers_layout = QHBoxLayout()
+        max_workers_label = QLabel("Parallel requests:")
+        self.max_workers_input = QSpinBox()
+        self.max_workers_input.setRange(0, 32)
+        self.max_workers_input.setSpecialValueText("Auto")
+        self.max_workers_input.setValue(int(max_workers or 0))
+        self.max_workers_input.setToolTip("Pages fetched at the same time; Auto picks a value from the number of pages")
+        max_workers_layout.addWidget(max_workers_label)
+        max_workers_layout.addWidget(self.max_workers_input)
+        performance_layout.addLayout(max_workers_layout)
+
+        # Geometry validation
+        validation_layout = QHBoxLayout()
+        validation_label = QLabel("Geometry validation:")
+        self.validation_dropdown = QComboBox()
+        self.validation_dropdown.addItem("None (fastest)", "none")
+        self.validation_dropdown.addItem("Basic (closed rings, vertex counts)", "basic")
+        self.validation_dropdown.addItem("Full GEOS validity (slowest)", "geos")
+        idx = self.validation_dropdown.findData(geometry_validation)
+        self.validation_dropdown.setCurrentIndex(idx if idx >= 0 else 1)
+        self.validation_dropdown.setToolTip("Geometries failing the check are imported without geometry")
+        validation_layout.addWidget(validation_label)
+        validation_layout.addWidget(self.validation_dropdown)
+        performance_layout.addLayout(validation_layout)
+
+        # Preview import
+        preview_rows_layout = QHBoxLayout()
+        preview_rows_label = QLabel("Preview rows:")
+        self.preview_rows_input = QSpinBox()
+        self.preview_rows_input.setRange(1, 10000)
+        self.preview_rows_input.setValue(int(preview_rows or 200))
+        self.preview_rows_input.setToolTip(
+            "Rows imported by Preview import, in one request; the same request estimates the full import"
+        )
+        preview_rows_layout.addWidget(preview_rows_label)
+        preview_rows_layout.addWidget(self.preview_rows_input)
+        performance_layout.addLayout(preview_rows_layout)
+
+        # Confirmation of large downloads (0 = never)
+        confirm_size_layout = QHBoxLayout()
+        confirm_size_label = QLabel("Confirm downloads larger than (MB):")
+        self.confirm_size_input = QSpinBox()
+        self.confirm_size_input.setRange(0, 100000)
+        self.confirm_size_input.setSpecialValueText("Never")
+        self.confirm_size_input.setValue(int(confirm_size_mb or 0))
+        self.confirm_size_input.setToolTip(
+            "Imports are estimated from the row count and a sampled page first, and ask before "
+            "downloading more than this; imports served from the cache are not estimated"
+        )
+        confirm_size_layout.addWidget(confirm_size_label)
+        confirm_size_layout.addWidget(self.confirm_size_input)
+        performance_layout.addLayout(confirm_size_layout)
+
+        # Keyset pagination
+        self.keyset_checkbox = QCheckBox("Keyset pagination when the collection has a sortable primary key")
+        self.keyset_checkbox.setChecked(bool(keyset_pagination))
+        self.keyset_checkbox.setToolTip("Page by primary key instead of offset; keeps deep pages fast on large collections")
+        performance_layout.addWidget(self.keyset_checkbox)
+
+        performance_group.setLayout(performance_layout)
+        main_layout.addWidget(performance_group)
+
+        # === Output group ===
+        output_group = QGroupBox("Output")
+        output_layout = QVBoxLayout()
+
+        output_format_layout = QHBoxLayout()
+        output_format_label = QLabel("Import into:")
+        self.output_format_dropdown = QComboBox()
+        self.output_format_dropdown.addItem("Memory layer (temporary)", "memory")
+        self.output_format_dropdown.addItem("GeoPackage file", "gpkg")
+        self.output_format_dropdown.addItem("FlatGeobuf file", "fgb")
+        idx = self.output_format_dropdown.findData(output_format)
+        self.output_format_dropdown.setCurrentIndex(idx if idx >= 0 else 0)
+        self.output_format_dropdown.setToolTip(
+            "Files are spatially indexed and kept between sessions: the next import reopens them, "
+            "and a GeoPackage is updated in place with the rows changed since"
+        )
+        output_format_layout.addWidget(output_format_label)
+        output_format_layout.addWidget(self.output_format_dropdown)
+        output_layout.addLayout(output_format_layout)
+
+        output_folder_layout = QHBoxLayout()
+        output_folder_label = QLabel("Folder:")
+        self.output_folder_input = QLineEdit(output_folder or "")
+        self.output_folder_input.setPlaceholderText("QGIS profile folder")
+        self.btn_output_folder = QPushButton("…")
+        output_folder_layout.addWidget(output_folder_label)
+        output_folder_layout.addWidget(self.output_folder_input)
+        output_folder_layout.addWidget(self.btn_output_folder)
+        output_layout.addLayout(output_folder_layout)
+
+        self.detail_levels_checkbox = QCheckBox("Simplified copies of large line and polygon layers for overview scales")
+        self.detail_levels_checkbox.setChecked(bool(detail_levels))
+        self.detail_levels_checkbox.setToolTip(
+            "Layers with many vertices get simplified copies drawn when zoomed out; "
+            "the full resolution layer is drawn when zoomed in, for identify and editing"
+        )
+        output_layout.addWidget(self.detail_levels_checkbox)
+
+        output_group.setLayout(output_layout)
+        main_layout.addWidget(output_group)
+
+        # === Cache group ===
+        cache_group = QGroupBox("Cache")
+        cache_layout = QVBoxLayout()
+
+        # Cache lifetime, in minutes (0 = always check the server)
+        cache_ttl_layout = QHBoxLayout()
+        cache_ttl_label = QLabel("Cache lifetime (minutes):")
+        self.cache_ttl_input = QSpinBox()
+        self.cache_ttl_input.setRange(0, 60 * 24 * 30)
+        self.cache_ttl_input.setValue(int(cache_ttl or 0) // 60)
+        self.cache_ttl_input.setToolTip("Imports within this time reuse the cached data without contacting the server")
+        cache_ttl_layout.addWidget(cache_ttl_label)
+        cache_ttl_layout.addWidget(self.cache_ttl_input)
+        cache_layout.addLayout(cache_ttl_layout)
+
+        # Timestamp fields for delta sync
+        sync_fields_layout = QHBoxLayout()
+        sync_fields_label = QLabel("Change timestamp fields:")
+        self.sync_fields_input = QLineEdit(sync_fields)
+        self.sync_fields_input.setToolTip(
+            "Comma-separated timestamp fields; when the cache is stale only rows changed after the last import are downloaded"
+        )
+        sync_fields_layout.addWidget(sync_fields_label)
+        sync_fields_layout.addWidget(self.sync_fields_input)
+        cache_layout.addLayout(sync_fields_layout)
+
+        # Live sync polling interval, in seconds (0 = off)
+        live_sync_layout = QHBoxLayout()
+        live_sync_label = QLabel("Live sync every (seconds):")
+        self.live_sync_input = QSpinBox()
+        self.live_sync_input.setRange(0, 24 * 3600)
+        self.live_sync_input.setSpecialValueText("Off")
+        self.live_sync_input.setValue(int(live_sync_interval or 0))
+        self.live_sync_input.setToolTip(
+            "Imported layers are updated in place with the rows changed on the server, "
+            "found through the change timestamp fields"
+        )
+        live_sync_layout.addWidget(live_sync_label)
+        live_sync_layout.addWidget(self.live_sync_input)
+        cache_layout.addLayout(live_sync_layout)
+
+        # Cache size limit
+        cache_size_layout = QHBoxLayout()
+        cache_size_label = QLabel("Cache size limit (MB):")
+        self.cache_size_input = QSpinBox()
+        self.cache_size_input.setRange(10, 100000)
+        self.cache_size_input.setSingleStep(100)
+        self.cache_size_input.setValue(int(cache_size_mb))
+        self.cache_size_input.setToolTip("Least recently used imports are removed from the cache above this size")
+        cache_size_layout.addWidget(cache_size_label)
+        cache_size_layout.addWidget(self.cache_size_input)
+        cache_layout.addLayout(cache_size_layout)
+
+        # Debug dump
+        self.debug_dump_checkbox = QCheckBox("Write api_debug_dump.json after each download")
+        self.debug_dump_checkbox.setChecked(bool(debug_dump))
+        self.debug_dump_checkbox.setToolTip("Pretty-printed copy of the downloaded data in the plugin folder, for debugging")
+        cache_layout.addWidget(self.debug_dump_checkbox)
+
+        cache_group.setLayout(cache_layout)
+        main_layout.addWidget(cache_group)
+
+        # === Diagnostics group ===
+        diagnostics_group = QGroupBox("Diagnostics")
+        diagnostics_layout = QVBoxLayout()
+
+        # Log level for the DirectusImporter tab of the QGIS log panel
+        log_level_layout = QHBoxLayout()
+        log_level_label = QLabel("Log level:")
+        self.log_level_dropdown = QComboBox()
+        self.log_level_dropdown.addItem("Debug", "debug")
+        self.log_level_dropdown.addItem("Info", "info")
+        self.log_level_dropdown.addItem("Warning", "warning")
+        idx = self.log_level_dropdown.findData(log_level)
+        self.log_level_dropdown.setCurrentIndex(idx if idx >= 0 else 1)
+        self.log_level_dropdown.setToolTip("Messages below this level are not written to the log panel")
+        log_level_layout.addWidget(log_level_label)
+        log_level_layout.addWidget(self.log_level_dropdown)
+        diagnostics_layout.addLayout(log_level_layout)
+
+        # Import profile export
+        self.export_profile_checkbox = QCheckBox("Save import timings as JSON")
+        self.export_profile_checkbox.setChecked(bool(export_profile))
+        self.export_profile_checkbox.setToolTip(
+            "Time and bytes per import phase are always logged; this also saves them in the QGIS profile folder"
+        )
+        diagnostics_layout.addWidget(self.export_profile_checkbox)
+
+        diagnostics_group.setLayout(diagnostics_layout)
+        main_layout.addWidget(diagnostics_group)
+
         # OK and Cancel buttons
         buttons_layout = QHBoxLayout()
-        btn_ok = QPushButton("OK")
-        btn_ok.setDefault(True)
+        self.btn_ok = QPushButton("OK")
+        self.btn_ok.setDefault(True)
         btn_cancel = QPushButton("Cancel")
-        buttons_layout.addWidget(btn_ok)
+        buttons_layout.addWidget(self.btn_ok)
         buttons_layout.addWidget(btn_cancel)
         main_layout.addLayout(buttons_layout)
 
         self.setLayout(main_layout)
 
         # Connect signals
-        self.btn_refresh_collections.clicked.connect(self.load_collections)
-        self.btn_refresh_fields.clicked.connect(self.load_fields)
+        self.btn_refresh_collections.clicked.connect(self.refresh_collections)
+        self.btn_refresh_fields.clicked.connect(self.refresh_fields)
         self.collection_dropdown.currentTextChanged.connect(self.load_fields)
-        btn_ok.clicked.connect(self.accept)
+        self.btn_ok.clicked.connect(self.accept)
         btn_cancel.clicked.connect(self.reject)
         self.url_input.textChanged.connect(self.validate_inputs)
         self.collection_dropdown.currentTextChanged.connect(self.validate_inputs)
-        btn_select_all.clicked.connect(self.select_all_fields)
-        btn_deselect_all.clicked.connect(self.deselect_all_fields)
-
-        # Initial population
+        self.btn_select_all.clicked.connect(self.select_all_fields)
+        self.btn_deselect_all.clicked.connect(self.deselect_all_fields)
+        self.filter_input.textChanged.connect(self.update_filter_status)
+        self.btn_filter_builder.clicked.connect(self.open_expression_builder)
+        self.btn_output_folder.clicked.connect(self.choose_output_folder)
+        self.btn_save_profile.clicked.connect(self.save_profile)
+        self.btn_load_profile.clicked.connect(self.load_profile)
+        self.btn_remove_profile.clicked.connect(self.remove_profile)
+        self.output_format_dropdown.currentIndexChanged.connect(self.update_output_inputs)
+
+        # Initial population: the saved collection is shown (and its fields loaded) right
+        # away, while the collection list loads; cached metadata is used when still fresh
+        self.collections_request = None
+        self.fields_request = (None, None, None)
+        if self.collection:
+            self.collection_dropdown.addItem(self.collection)
         if self.url:
             self.load_collections()
-        if self.collection:
-            idx = self.collection_dropdown.findText(self.collection)
-            if idx >= 0:
-                self.collection_dropdown.setCurrentIndex(idx)
-                self.load_fields()
 
         self.validate_inputs()
+        self.update_filter_status()
+        self.update_output_inputs()
 
     def validate_inputs(self):
         url_valid = self.url_input.hasAcceptableInput()
@@ -148,72 +446,128 @@ class SettingsDialog(QDialog):
         self.btn_refresh_collections.setEnabled(url_valid)
 
     def load_collections(self):
-        self.collection_dropdown.clear()
-        self.coll_status_label.setText("Loading collections...")
+        self.request_collections(refresh=False)
+
+    def refresh_collections(self):
+        self.request_collections(refresh=True)
+
+    def request_collections(self, refresh):
         url = self.url_input.text().strip()
         token = self.token_input.text().strip()
         if not url:
             self.coll_status_label.setText("Please enter a valid URL.")
             return
-        headers = {"Authorization": f"Bearer {token}"} if token else {}
-        try:
-            resp = requests.get(f"{url.rstrip('/')}/collections", headers=headers, timeout=10)
-            resp.raise_for_status()
-            collections = resp.json().get('data', [])
-            user_collections = [c for c in collections if not c['collection'].startswith('directus_')]
-            for c in user_collections:
-                self.collection_dropdown.addItem(c['collection'])
-            self.coll_status_label.setText(f"Loaded {len(user_collections)} collections")
-
-            # Clear fields and statuses when collections reload
-            self.fields_list.clear()
-            self.geom_field_dropdown.clear()
-            self.fields_status_label.setText("")
-
-        except Exception as e:
-            self.coll_status_label.setText(f"Failed to load collections")
-            print(f"Failed to load collections: {e}")
+        self.coll_status_label.setText("Loading collections...")
+        self.collections_request = (url, token)
+        metadata_cache().collections(
+            url, token, lambda result, error: self.show_collections((url, token), result, error), refresh
+        )
+
+    def show_collections(self, request, collections, error):
+        if request != self.collections_request:
+            return  # URL or token changed while loading
+        if error is not None:
+            self.coll_status_label.setText("Failed to load collections")
+            log.warning(f"Failed to load collections: {error}")
+            return
+        # Refilled without signals, so the fields are loaded once, for the final selection
+        current = self.collection_dropdown.currentText() or self.collection
+        self.collection_dropdown.blockSignals(True)
+        self.collection_dropdown.clear()
+        self.collection_dropdown.addItems(collections)
+        idx = self.collection_dropdown.findText(current)
+        self.collection_dropdown.setCurrentIndex(idx if idx >= 0 else 0)
+        self.collection_dropdown.blockSignals(False)
+        self.coll_status_label.setText(f"Loaded {len(collections)} collections")
+        self.validate_inputs()
+        if self.collection_dropdown.currentText() != self.fields_request[2]:
+            self.load_fields()
 
     def load_fields(self):
+        self.request_fields(refresh=False)
+
+    def refresh_fields(self):
+        self.request_fields(refresh=True)
+
+    def request_fields(self, refresh):
+        # The schema belongs to the fields shown; OK waits for the new ones so a
+        # collection is never saved with the schema of the previous one
         self.fields_list.clear()
         self.geom_field_dropdown.clear()
-        self.fields_status_label.setText("Loading fields...")
+        self.set_field_controls_enabled(True)
+        self.field_schema = {}
         url = self.url_input.text().strip()
         token = self.token_input.text().strip()
         collection = self.collection_dropdown.currentText()
+        request = (url, token, collection)
+        self.fields_request = request
         if not url or not collection:
             self.fields_status_label.setText("Set URL and select a collection")
+            self.btn_ok.setEnabled(True)
             return
-        headers = {"Authorization": f"Bearer {token}"} if token else {}
-        try:
-            resp = requests.get(f"{url.rstrip('/')}/fields/{collection}", headers=headers, timeout=10)
-            resp.raise_for_status()
-            fields = resp.json().get('data', [])
-
-            for f in fields:
-                field_name = f['field']
-                item = QListWidgetItem(field_name)
-                item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
-                if field_name in self.selected_fields or not self.selected_fields:
+        self.btn_ok.setEnabled(False)
+        self.fields_status_label.setText("Loading fields...")
+        metadata_cache().fields(
+            url, token, collection, lambda result, error: self.show_fields(request, result, error), refresh
+        )
+
+    def show_fields(self, request, result, error):
+        if request != self.fields_request:
+            return  # another collection was selected while loading
+        self.btn_ok.setEnabled(True)
+        if error is not None:
+            # Saved without a schema, imports read it from the server themselves. The saved
+            # field choices of this collection are kept, but cannot be edited without the list.
+            _, _, collection = request
+            if collection == self.collection:
+                self.geom_field_dropdown.addItem(self.geom_field)
+                for field_name in self.selected_fields:
+                    item = QListWidgetItem(field_name)
+                    item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
                     item.setCheckState(Qt.Checked)
-                else:
-                    item.setCheckState(Qt.Unchecked)
-                self.fields_list.addItem(item)
-
-            for f in fields:
-                self.geom_field_dropdown.addItem(f['field'])
-
-            idx = self.geom_field_dropdown.findText(self.geom_field)
-            if idx >= 0:
-                self.geom_field_dropdown.setCurrentIndex(idx)
-            elif self.geom_field_dropdown.count() > 0:
-                self.geom_field_dropdown.setCurrentIndex(0)
-
-            self.fields_status_label.setText(f"Loaded {len(fields)} fields")
-
-        except Exception as e:
-            self.fields_status_label.setText("Failed to load fields")
-            print(f"Failed to load fields: {e}")
+                    self.fields_list.addItem(item)
+            self.set_field_controls_enabled(False)
+            self.fields_status_label.setText(f"Failed to load fields: {error}")
+            log.warning(f"Failed to load fields: {error}")
+            return
+        fields, field_schema, related_fields = result
+        self.field_schema = dict(field_schema)
+
+        for f in fields:
+            field_name = f['field']
+            item = QListWidgetItem(field_name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            if field_name in self.selected_fields or not self.selected_fields:
+                item.setCheckState(Qt.Checked)
+            else:
+                item.setCheckState(Qt.Unchecked)
+            self.fields_list.addItem(item)
+
+        # Fields of related items, joined on import; only checked when chosen explicitly
+        for field_name in related_fields:
+            item = QListWidgetItem(field_name)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if field_name in self.selected_fields else Qt.Unchecked)
+            item.setToolTip("Joined from the related collection")
+            self.fields_list.addItem(item)
+
+        for f in fields:
+            self.geom_field_dropdown.addItem(f['field'])
+
+        idx = self.geom_field_dropdown.findText(self.geom_field)
+        if idx >= 0:
+            self.geom_field_dropdown.setCurrentIndex(idx)
+        elif self.geom_field_dropdown.count() > 0:
+            self.geom_field_dropdown.setCurrentIndex(0)
+
+        status = f"Loaded {len(fields)} fields"
+        if related_fields:
+            status += f" and {len(related_fields)} related fields"
+        self.fields_status_label.setText(status)
+
+    def set_field_controls_enabled(self, enabled):
+        for widget in (self.geom_field_dropdown, self.fields_list, self.btn_select_all, self.btn_deselect_all):
+            widget.setEnabled(enabled)
 
     def get_selected_fields_json(self):
         selected = []
@@ -223,6 +577,99 @@ class SettingsDialog(QDialog):
                 selected.append(item.text())
         return json.dumps(selected)
 
+    def get_field_schema_json(self):
+        return json.dumps(self.field_schema)
+
+    def update_filter_status(self):
+        try:
+            server_filter, exact = translate_expression(self.filter_input.text())
+        except ValueError as e:
+            self.filter_status_label.setText(f"Invalid expression: {e}")
+            return
+        if not self.filter_input.text().strip():
+            self.filter_status_label.setText("")
+        elif exact:
+            self.filter_status_label.setText("Filtered by Directus")
+        elif server_filter:
+            self.filter_status_label.setText("Partly filtered by Directus, the rest in QGIS after download")
+        else:
+            self.filter_status_label.setText("Filtered in QGIS after download (all rows are fetched)")
+
+    def get_profiles_json(self):
+        return json.dumps(self.profiles)
+
+    def refresh_profiles_list(self):
+        self.profiles_list.clear()
+        for profile in self.profiles:
+            item = QListWidgetItem(profile["name"])
+            item.setToolTip(f"Collection: {profile['collection']}")
+            self.profiles_list.addItem(item)
+
+    def save_profile(self):
+        collection = self.collection_dropdown.currentText()
+        if not collection:
+            return
+        name, ok = QInputDialog.getText(self, "Save Import", "Name:", text=collection)
+        name = name.strip()
+        if not ok or not name:
+            return
+        profile = {
+            "name": name,
+            "collection": collection,
+            "geom_field": self.geom_field_dropdown.currentText(),
+            "selected_fields": json.loads(self.get_selected_fields_json()),
+            "field_schema": self.field_schema,
+            "filter_expression": self.filter_input.text().strip(),
+        }
+        self.profiles = [p for p in self.profiles if p["name"] != name] + [profile]
+        self.refresh_profiles_list()
+
+    def load_profile(self):
+        row = self.profiles_list.currentRow()
+        if row < 0:
+            return
+        profile = self.profiles[row]
+        # load_fields checks the saved fields and geometry field once the collection is set
+        self.selected_fields = profile["selected_fields"]
+        self.geom_field = profile["geom_field"]
+        self.filter_input.setText(profile.get("filter_expression", ""))
+        idx = self.collection_dropdown.findText(profile["collection"])
+        if idx < 0:
+            self.collection_dropdown.addItem(profile["collection"])
+            idx = self.collection_dropdown.count() - 1
+        if idx == self.collection_dropdown.currentIndex():
+            self.load_fields()
+        else:
+            self.collection_dropdown.setCurrentIndex(idx)
+
+    def remove_profile(self):
+        row = self.profiles_list.currentRow()
+        if row >= 0:
+            del self.profiles[row]
+            self.refresh_profiles_list()
+
+    def update_output_inputs(self):
+        to_file = self.output_format_dropdown.currentData() != "memory"
+        self.output_folder_input.setEnabled(to_file)
+        self.btn_output_folder.setEnabled(to_file)
+
+    def choose_output_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Output folder", self.output_folder_input.text())
+        if folder:
+            self.output_folder_input.setText(folder)
+
+    def open_expression_builder(self):
+        # Scratch layer with the collection's fields, so the builder can list them
+        layer = QgsVectorLayer("None", self.collection_dropdown.currentText() or "directus", "memory")
+        names = [name for name in self.field_schema if name != self.geom_field_dropdown.currentText()]
+        layer.dataProvider().addAttributes(
+            [QgsField(name, qvariant_type) for name, qvariant_type, _ in attribute_columns(names, self.field_schema)]
+        )
+        layer.updateFields()
+        dlg = QgsExpressionBuilderDialog(layer, self.filter_input.text(), self)
+        if dlg.exec_():
+            self.filter_input.setText(dlg.expressionText())
+
     def select_all_fields(self):
         for i in range(self.fields_list.count()):
             item = self.fields_list.item(i)
@@ -0,0 +1,418 @@
+"""Stand-in Directus server serving synthetic collections, for benchmarks.
+
+    python benchmarks/mock_directus.py --collection sites:100000:point --collection zones:5000:polygon
+
+Implements the parts of the API the plugin uses: /collections, /fields,
+/relations and /items with limit/offset/page, sort, fields, meta counts,
+aggregate[count|min|max] and filters (JSON or bracket style, including
+_intersects_bbox). Rows are generated on demand from their id, so large
+collections cost no memory. --latency and --error-rate make it behave like
+a slow or flaky instance.
+"""
+import argparse
+import gzip
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# Geometry kinds: what the geometry field holds, and its Directus field type
+KINDS = {
+    "point": "geometry.Point",  # GeoJSON Point
+    "lonlat": "json",  # [lon, lat] pairs
+    "polygon": "geometry.Polygon",  # GeoJSON polygons with many vertices and a hole
+    "wkt": "text",  # WKT points, lines and polygons
+    "mixed": "geometry",  # GeoJSON points, lines and polygons
+    "none": None,  # no geometry field
+}
+CREATED = "2024-01-01T00:00:00.000Z"
+
+
+class Collection:
+    def __init__(self, name, rows, kind, vertices=64, seed=0):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown geometry kind {kind!r}, expected one of {', '.join(KINDS)}")
+        self.name = name
+        self.rows = rows
+        self.kind = kind
+        self.vertices = vertices
+        self.seed = seed
+        self.counts = {}  # filter -> matching row count
+
+    def fields(self):
+        fields = [
+            ("id", "integer", True),
+            ("name", "string", False),
+            ("category", "string", False),
+            ("value", "float", False),
+            ("count", "integer", False),
+            ("active", "boolean", False),
+            ("date_created", "timestamp", False),
+            ("date_updated", "timestamp", False),
+        ]
+        if KINDS[self.kind]:
+            fields.append(("geometry", KINDS[self.kind], False))
+        return [
+            {"collection": self.name, "field": name, "type": kind, "schema": {"is_primary_key": pk}}
+            for name, kind, pk in fields
+        ]
+
+    def row(self, row_id):
+        rng = random.Random(self.seed * 1000003 + row_id)
+        lon, lat = rng.uniform(-180, 180), rng.uniform(-85, 85)
+        row = {
+            "id": row_id,
+            "name": f"{self.name} {row_id}",
+            "category": rng.choice(["a", "b", "c", "d"]),
+            "value": round(rng.uniform(0, 1000), 3),
+            "count": rng.randint(0, 10000),
+            "active": rng.random() < 0.5,
+            "date_created": CREATED,
+            "date_updated": None,
+        }
+        if KINDS[self.kind]:
+            row["geometry"] = self.geometry(rng, lon, lat)
+        return row
+
+    def geometry(self, rng, lon, lat):
+        kind = self.kind
+        if kind == "mixed" or kind == "wkt":
+            shape = rng.choice(["point", "line", "polygon"])
+        else:
+            shape = {"point": "point", "lonlat": "point", "polygon": "polygon"}[kind]
+
+        if shape == "point":
+            coordinates = [round(lon, 6), round(lat, 6)]
+        elif shape == "line":
+            coordinates = [[round(lon + i * 0.001, 6), round(lat + rng.uniform(-0.001, 0.001), 6)]
+                           for i in range(max(self.vertices // 4, 2))]
+        else:
+            hole = ring(rng, lon, lat, 0.004, max(self.vertices // 4, 4))
+            coordinates = [ring(rng, lon, lat, 0.01, self.vertices), hole]
+
+        if kind == "lonlat":
+            return coordinates
+        if kind == "wkt":
+            return to_wkt(shape, coordinates)
+        geojson_type = {"point": "Point", "line": "LineString", "polygon": "Polygon"}[shape]
+        return {"type": geojson_type, "coordinates": coordinates}
+
+
+def ring(rng, lon, lat, radius, vertices):
+    # Closed, irregular ring around (lon, lat)
+    points = []
+    for i in range(vertices):
+        angle = 2 * math.pi * i / vertices
+        r = radius * rng.uniform(0.7, 1.0)
+        points.append([round(lon + r * math.cos(angle), 6), round(lat + r * math.sin(angle), 6)])
+    return points + [points[0]]
+
+
+def to_wkt(shape, coordinates):
+    def pairs(points):
+        return ", ".join(f"{x} {y}" for x, y in points)
+    if shape == "point":
+        return f"POINT ({coordinates[0]} {coordinates[1]})"
+    if shape == "line":
+        return f"LINESTRING ({pairs(coordinates)})"
+    return "POLYGON (" + ", ".join(f"({pairs(r)})" for r in coordinates) + ")"
+
+
+def geometry_bbox(value):
+    # (xmin, ymin, xmax, ymax) of a GeoJSON, [lon, lat] or WKT value
+    if isinstance(value, str):
+        numbers = [float(n) for n in value.replace("(", " ").replace(")", " ").replace(",", " ").split()[1:]]
+        xs, ys = numbers[0::2], numbers[1::2]
+    else:
+        xs, ys = [], []
+
+        def walk(coords):
+            if coords and isinstance(coords[0], (int, float)):
+                xs.append(coords[0])
+                ys.append(coords[1])
+            else:
+                for c in coords:
+                    walk(c)
+        walk(value["coordinates"] if isinstance(value, dict) else value)
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def compare(value, op, arg):
+    if op == "_null":
+        return (value is None) == bool(arg)
+    if op == "_nnull":
+        return (value is not None) == bool(arg)
+    if op == "_in":
+        return value in arg
+    if op == "_nin":
+        return value not in arg
+    if op == "_intersects_bbox":
+        if value is None:
+            return False
+        a, b = geometry_bbox(value), geometry_bbox(arg)
+        return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+    if value is None:
+        return op == "_neq"
+    if op in ("_contains", "_ncontains", "_icontains", "_nicontains", "_starts_with", "_ends_with"):
+        text, arg = str(value), str(arg)
+        if "icontains" in op:
+            text, arg = text.lower(), arg.lower()
+        if op.endswith("contains"):
+            return (arg in text) != op.startswith(("_n", "_ni"))
+        return text.startswith(arg) if op == "_starts_with" else text.endswith(arg)
+    if op in ("_between", "_nbetween"):
+        inside = coerce(arg[0], value) <= value <= coerce(arg[1], value)
+        return inside if op == "_between" else not inside
+    arg = coerce(arg, value)
+    return {
+        "_eq": lambda: value == arg,
+        "_neq": lambda: value != arg,
+        "_lt": lambda: value < arg,
+        "_lte": lambda: value <= arg,
+        "_gt": lambda: value > arg,
+        "_gte": lambda: value >= arg,
+    }[op]()
+
+
+def coerce(arg, value):
+    # Bracket-style filters arrive as strings
+    if isinstance(value, bool) and isinstance(arg, str):
+        return arg == "true"
+    if isinstance(value, (int, float)) and isinstance(arg, str):
+        return float(arg)
+    return arg
+
+
+def matches(row, condition):
+    if not condition:
+        return True
+    if "_and" in condition:
+        return all(matches(row, c) for c in condition["_and"])
+    if "_or" in condition:
+        return any(matches(row, c) for c in condition["_or"])
+    for field, ops in condition.items():
+        for op, arg in ops.items():
+            if not compare(row.get(field), op, arg):
+                return False
+    return True
+
+
+def id_range(condition, rows):
+    # Bounds on the primary key implied by top-level conditions, so keyset pages are not full scans
+    low, high = 1, rows
+    terms = condition.get("_and", [condition]) if condition else []
+    for term in terms:
+        for op, arg in (term.get("id") or {}).items():
+            try:
+                arg = float(arg)
+            except (TypeError, ValueError):
+                continue
+            if op == "_gt":
+                low = max(low, math.floor(arg) + 1)
+            elif op == "_gte":
+                low = max(low, math.ceil(arg))
+            elif op == "_lt":
+                high = min(high, math.ceil(arg) - 1)
+            elif op == "_lte":
+                high = min(high, math.floor(arg))
+            elif op == "_eq":
+                low, high = max(low, math.ceil(arg)), min(high, math.floor(arg))
+    return low, high
+
+
+def parse_filter(params):
+    # JSON (filter={...}) or bracket style (filter[field][_op]=value)
+    conditions = []
+    for key, value in params:
+        if key == "filter":
+            conditions.append(json.loads(value))
+        elif key.startswith("filter["):
+            parts = key[len("filter["):-1].split("][")
+            condition = value
+            for part in reversed(parts):
+                condition = {part: condition}
+            conditions.append(condition)
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"_and": conditions}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like Directus behind a reverse proxy
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(max(random.gauss(server.latency, server.latency * server.jitter), 0) / 1000)
+        if server.error_rate and random.random() < server.error_rate:
+            self.send_json({"errors": [{"message": "Injected failure"}]}, 503, {"Retry-After": "0"})
+            return
+
+        url = urlparse(self.path)
+        params = parse_qsl(url.query, keep_blank_values=True)
+        parts = [p for p in url.path.split("/") if p]
+        try:
+            if parts == ["collections"]:
+                body = {"data": [{"collection": name} for name in server.collections]}
+            elif len(parts) == 2 and parts[0] in ("fields", "relations", "items"):
+                collection = server.collections.get(parts[1])
+                if collection is None:
+                    self.send_json({"errors": [{"message": "Forbidden"}]}, 403)
+                    return
+                if parts[0] == "fields":
+                    body = {"data": collection.fields()}
+                elif parts[0] == "relations":
+                    body = {"data": []}
+                else:
+                    body = self.items(collection, params)
+            else:
+                self.send_json({"errors": [{"message": "Route not found"}]}, 404)
+                return
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json({"errors": [{"message": f"Invalid query: {e}"}]}, 400)
+            return
+        self.send_json(body)
+
+    def items(self, collection, params):
+        query = dict(params)
+        condition = parse_filter(params)
+
+        aggregate = {k[len("aggregate["):-1]: v for k, v in params if k.startswith("aggregate[")}
+        if aggregate:
+            result = {}
+            for function, field in aggregate.items():
+                if function == "count":
+                    result["count"] = self.count(collection, condition)
+                elif function in ("min", "max"):
+                    rows = self.scan(collection, condition, descending=function == "max")
+                    first = next(rows, None)
+                    result[function] = {field: first.get(field) if first else None}
+            return {"data": [result]}
+
+        limit = int(query.get("limit", 100))
+        offset = int(query.get("offset", 0))
+        if "page" in query:
+            offset = (int(query["page"]) - 1) * max(limit, 0)
+        sort = query.get("sort", "")
+        fields = [f for f in query.get("fields", "").split(",") if f and f != "*"]
+
+        data = []
+        if limit != 0:
+            if sort in ("", "id", "-id"):
+                rows = self.scan(collection, condition, descending=sort == "-id")
+            else:
+                field = sort.lstrip("-")
+                rows = sorted(self.scan(collection, condition), key=lambda r: (r.get(field) is None, r.get(field)),
+                              reverse=sort.startswith("-"))
+                rows = iter(rows)
+            for i, row in enumerate(rows):
+                if i < offset:
+                    continue
+                data.append({f: row.get(f) for f in fields} if fields else row)
+                if limit > 0 and len(data) >= limit:
+                    break
+
+        body = {"data": data}
+        meta = query.get("meta", "")
+        if meta:
+            body["meta"] = {}
+            if meta in ("*", "filter_count"):
+                body["meta"]["filter_count"] = self.count(collection, condition)
+            if meta in ("*", "total_count"):
+                body["meta"]["total_count"] = collection.rows
+        return body
+
+    def scan(self, collection, condition, descending=False):
+        low, high = id_range(condition, collection.rows)
+        ids = range(high, low - 1, -1) if descending else range(low, high + 1)
+        for row_id in ids:
+            row = collection.row(row_id)
+            if matches(row, condition):
+                yield row
+
+    def count(self, collection, condition):
+        if not condition:
+            return collection.rows
+        key = json.dumps(condition, sort_keys=True)
+        if key not in collection.counts:
+            collection.counts[key] = sum(1 for _ in self.scan(collection, condition))
+        return collection.counts[key]
+
+    def send_json(self, body, status=200, headers=None):
+        data = json.dumps(body, separators=(",", ":")).encode("utf-8")
+        gzipped = self.server.compress and "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            data = gzip.compress(data, compresslevel=5)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class MockDirectus(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, collections, port=0, latency=0, jitter=0.2, error_rate=0, compress=True, verbose=False):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.collections = {c.name: c for c in collections}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.compress = compress
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def parse_collection(spec, vertices):
+    # name:rows:kind
+    name, rows, kind = (spec.split(":") + ["point"])[:3]
+    return Collection(name, int(rows), kind, vertices, seed=len(name))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Directus server with synthetic collections")
+    parser.add_argument("--collection", action="append", default=[],
+                        help=f"name:rows:kind, kind one of {', '.join(KINDS)} (repeatable)")
+    parser.add_argument("--port", type=int, default=8055, help="0 picks a free port")
+    parser.add_argument("--vertices", type=int, default=64, help="vertices per polygon ring")
+    parser.add_argument("--latency", type=float, default=0, help="mean added latency per request, in ms")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency standard deviation, relative to the mean")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests failing with 503")
+    parser.add_argument("--no-compression", action="store_true", help="never gzip responses")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    collections = [parse_collection(spec, args.vertices) for spec in args.collection or ["points:10000:point"]]
+    server = MockDirectus(collections, args.port, args.latency, args.jitter, args.error_rate,
+                          not args.no_compression, args.verbose)
+    # The first line is read by run.py to find the port
+    print(f"Serving on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
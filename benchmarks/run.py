@@ -0,0 +1,302 @@
+"""Import benchmarks against the mock Directus server.
+
+    python benchmarks/run.py --rows 50000 --save benchmarks/results/$(git rev-parse --short HEAD).json
+    python benchmarks/run.py --compare benchmarks/results/a1b2c3d.json benchmarks/results/e4f5a6b.json
+    python benchmarks/run.py --scenarios keyset,offset --latency 200 --rows 3000 --page-size 50 --kinds point
+
+Starts mock_directus.py in its own process (so the server does not share the
+GIL with the importer), then runs the plugin's fetch and layer building paths
+headlessly through ImportJob, once per scenario and geometry kind. Reports
+rows/s, peak memory and the import profiler's per-phase timings; saved
+results of several versions can be compared side by side. The keyset and
+offset scenarios compare the two paging modes; with latency on, keyset
+paging should be about as fast as offset paging, never close to one request
+after the other.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+SCENARIOS = {
+    "fetch": "download pages only (ImportJob.fetch_data)",
+    "memory": "download and build memory layers",
+    "cached": "build memory layers from a fresh local cache",
+    "gpkg": "download and write a GeoPackage",
+    "fgb": "download and write a FlatGeobuf file",
+    "keyset": "download pages only, keyset pagination (compare with offset, with --latency)",
+    "offset": "download pages only, offset pagination",
+}
+FETCH_SCENARIOS = ("fetch", "keyset", "offset")
+KEYSET_SLOWDOWN = 1.5  # keyset paging slower than offset paging by more than this is reported
+KINDS = ["point", "lonlat", "polygon", "wkt"]
+PHASE_COLUMNS = ["http_wait", "cache_read", "json_decode", "geometry_decode", "attribute_conversion",
+                 "provider_insert"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark DirectusImporter imports against a mock server")
+    parser.add_argument("--rows", type=int, default=20000, help="rows per collection")
+    parser.add_argument("--kinds", default=",".join(KINDS), help="geometry kinds, one collection each")
+    parser.add_argument("--scenarios", default="fetch,memory,cached,gpkg",
+                        help=f"comma separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--vertices", type=int, default=64, help="vertices per polygon ring")
+    parser.add_argument("--latency", type=float, default=0, help="mean added server latency per request, in ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests failing with 503")
+    parser.add_argument("--page-size", type=int, default=0, help="rows per request (default: auto)")
+    parser.add_argument("--max-workers", type=int, default=0, help="parallel requests (default: auto)")
+    parser.add_argument("--offset-pagination", action="store_true", help="disable keyset pagination")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario; the median is reported")
+    parser.add_argument("--label", default=None, help="name of this run in saved results (default: git revision)")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS", help="compare saved result files and exit")
+    return parser.parse_args(argv)
+
+
+def git_label():
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], cwd=HERE, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class PeakMemory:
+    """Samples the resident set size while a scenario runs.
+
+    Covers the memory held by QGIS and GDAL as well as by Python objects.
+    Falls back to the process-wide peak where /proc is not available.
+    """
+
+    INTERVAL = 0.01
+
+    def __init__(self):
+        self.page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self.baseline = self.peak = self.rss()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def rss(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self.page_size
+        except OSError:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def sample(self):
+        while not self.stop_event.wait(self.INTERVAL):
+            self.peak = max(self.peak, self.rss())
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+        self.peak = max(self.peak, self.rss())
+
+    @property
+    def growth_mb(self):
+        return (self.peak - self.baseline) / 1048576
+
+
+def start_server(args, collections):
+    command = [
+        sys.executable, os.path.join(HERE, "mock_directus.py"), "--port", "0",
+        "--vertices", str(args.vertices), "--latency", str(args.latency), "--error-rate", str(args.error_rate),
+    ]
+    for spec in collections:
+        command += ["--collection", spec]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline()
+    if not line.startswith("Serving on "):
+        server.kill()
+        raise RuntimeError("Mock server did not start")
+    return server, line.split()[-1]
+
+
+def make_job(args, url, collection, cache_store, scenario, folder):
+    from DirectusImporter.engine import ImportJob, field_schema_from
+    from DirectusImporter.http_client import get_client
+
+    fields = get_client(url).get_json(f"/fields/{collection}").get("data", [])
+    field_schema = field_schema_from(fields)
+    return ImportJob(
+        url,
+        collection,
+        cache_store,
+        selected_fields=list(field_schema),
+        field_schema=field_schema,
+        page_size=args.page_size,
+        max_workers=args.max_workers,
+        keyset_pagination=scenario == "keyset" or (scenario != "offset" and not args.offset_pagination),
+        cache_timeout_seconds=3600 if scenario == "cached" else 0,
+        output_format=scenario if scenario in ("gpkg", "fgb") else "memory",
+        output_folder=folder,
+    )
+
+
+def run_scenario(args, url, collection, scenario, folder):
+    from DirectusImporter.cache_store import CacheStore
+    from DirectusImporter.profiler import Profiler
+
+    cache_store = CacheStore(os.path.join(folder, "cache.sqlite"))
+    job = make_job(args, url, collection, cache_store, scenario, folder)
+    if scenario == "cached":
+        job.build_layers(force_refresh=True)  # fills the cache; not measured
+
+    layers = None
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        if scenario in FETCH_SCENARIOS:
+            job.profiler = Profiler(collection)
+            rows = sum(len(page) for page in job.fetch_data(force_refresh=True))
+            job.profiler.stop(rows)
+        else:
+            layers = job.build_layers(force_refresh=scenario != "cached")
+            rows = job.profiler.rows
+        seconds = time.perf_counter() - start
+    del layers
+
+    phases = {name: entry["seconds"] for name, entry in job.profiler.phases.items() if entry["calls"]}
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds else 0,
+            "peak_mb": memory.growth_mb, "phases": phases}
+
+
+def median_result(runs):
+    keys = ("rows", "seconds", "rows_per_second", "peak_mb")
+    result = {key: statistics.median(run[key] for run in runs) for key in keys}
+    names = {name for run in runs for name in run["phases"]}
+    result["phases"] = {name: statistics.median(run["phases"].get(name, 0) for run in runs) for name in names}
+    return result
+
+
+def print_results(results):
+    header = f"{'scenario':<8} {'kind':<8} {'rows':>8} {'seconds':>8} {'rows/s':>9} {'peak MB':>8}  phases (s)"
+    print(header)
+    print("-" * len(header))
+    for entry in results:
+        phases = ", ".join(f"{name} {entry['phases'][name]:.2f}" for name in PHASE_COLUMNS if name in entry["phases"])
+        print(f"{entry['scenario']:<8} {entry['kind']:<8} {entry['rows']:>8.0f} {entry['seconds']:>8.2f} "
+              f"{entry['rows_per_second']:>9.0f} {entry['peak_mb']:>8.1f}  {phases}")
+
+
+def check_paging(results):
+    # Keyset ranges are fetched in parallel, so with latency they must not fall behind offset paging
+    for entry in results:
+        if entry["scenario"] != "keyset":
+            continue
+        offset = next((e for e in results if e["scenario"] == "offset" and e["kind"] == entry["kind"]), None)
+        if offset and entry["seconds"] > offset["seconds"] * KEYSET_SLOWDOWN:
+            print(f"Keyset paging of {entry['kind']} took {entry['seconds']:.1f}s, offset paging "
+                  f"{offset['seconds']:.1f}s: keyset ranges are not fetched in parallel", file=sys.stderr)
+
+
+def compare(paths):
+    runs = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            runs.append(json.load(f))
+    labels = [run["label"] for run in runs]
+    keys = []
+    for run in runs:
+        for entry in run["results"]:
+            if (entry["scenario"], entry["kind"]) not in keys:
+                keys.append((entry["scenario"], entry["kind"]))
+
+    # Rows/s of every version, and the change relative to the first one
+    print(f"{'scenario':<8} {'kind':<8} " + " ".join(f"{label[:16]:>16}" for label in labels))
+    for scenario, kind in keys:
+        cells = []
+        base = None
+        for run in runs:
+            entry = next((e for e in run["results"] if (e["scenario"], e["kind"]) == (scenario, kind)), None)
+            if entry is None:
+                cells.append(f"{'-':>16}")
+                continue
+            rate = entry["rows_per_second"]
+            if base is None:
+                base = rate
+                cells.append(f"{rate:>16.0f}")
+            else:
+                change = f"{100 * (rate - base) / base:+.0f}%" if base else ""
+                cells.append(f"{f'{rate:.0f} {change}':>16}")
+        print(f"{scenario:<8} {kind:<8} " + " ".join(cells))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        compare(args.compare)
+        return 0
+
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    kinds = [k for k in args.kinds.split(",") if k]
+    collections = {kind: f"bench_{kind}" for kind in kinds}
+
+    from qgis.core import Qgis, QgsApplication
+    from DirectusImporter import log
+    from DirectusImporter.http_client import close_clients
+
+    logging.basicConfig(format="%(levelname)s %(message)s")
+    log.use_python_logging()
+    log.set_level("warning")
+
+    app = QgsApplication([], False)
+    app.initQgis()
+    server, url = start_server(args, [f"{name}:{args.rows}:{kind}" for kind, name in collections.items()])
+    results = []
+    try:
+        for scenario in scenarios:
+            for kind, collection in collections.items():
+                runs = []
+                for _ in range(args.repeat):
+                    with tempfile.TemporaryDirectory() as folder:
+                        runs.append(run_scenario(args, url, collection, scenario, folder))
+                result = median_result(runs)
+                result.update(scenario=scenario, kind=kind)
+                results.append(result)
+                print(f"{scenario} {kind}: {result['rows_per_second']:.0f} rows/s", file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait()
+        close_clients()
+
+    print_results(results)
+    check_paging(results)
+    if args.save:
+        report = {
+            "label": args.label or git_label(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "qgis": Qgis.QGIS_VERSION,
+            "settings": {key: value for key, value in vars(args).items() if key not in ("save", "compare", "label")},
+            "results": results,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    app.exitQgis()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())